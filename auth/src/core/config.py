@@ -27,6 +27,10 @@ class Settings(BaseSettings):
     # Redis
     AUTH_REDIS_HOST: str = Field(default="auth.cache")
     AUTH_REDIS_PORT: int = Field(default="9998")
+    # Digests of revoked access tokens (sorted set scored by the token exp
+    # time) and the channel other services get new revocations from
+    REVOKED_TOKENS_KEY: str = "tokens:revoked"
+    REVOKED_TOKENS_CHANNEL: str = "tokens:revoked"
 
     # Swagger-docs config
     URL_PREFIX: str = "/api/v1"
@@ -9,3 +9,7 @@ class BaseCacheStorage(ABC):
     @abstractmethod
     async def get_from_cache(self, *args, **kwargs):
         raise NotImplementedError
+
+    @abstractmethod
+    async def revoke_token(self, *args, **kwargs):
+        raise NotImplementedError
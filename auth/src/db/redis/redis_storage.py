@@ -1,9 +1,11 @@
 from functools import lru_cache
+from time import time
 from typing import Annotated
 
 from fastapi import Depends
 from redis.asyncio import Redis
 
+from core.config import get_settings
 from db.redis.cache_storage import BaseCacheStorage
 from db.redis.redis import get_redis
 
@@ -21,6 +23,21 @@ class RedisStorage(BaseCacheStorage):
         data = await self.redis.get(name=key)
         return data
 
+    async def revoke_token(self, digest: str, expires: float) -> None:
+        """Publish a revoked token digest for other services.
+
+        The digest is kept in a sorted set until the token expires, so a
+        subscriber can load the revocations it missed, and is sent to the
+        subscribers of the revocation channel."""
+        settings = get_settings()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(settings.REVOKED_TOKENS_KEY, {digest: expires})
+            pipe.zremrangebyscore(settings.REVOKED_TOKENS_KEY, "-inf", time())
+            pipe.publish(
+                settings.REVOKED_TOKENS_CHANNEL, f"{digest} {expires}"
+            )
+            await pipe.execute()
+
 
 @lru_cache()
 def get_redis_storage(
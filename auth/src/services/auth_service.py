@@ -207,6 +207,10 @@ class AuthService:
             await self.cache.put_to_cache(
                 access_token, "deleted", self.token_lifetime
             )
+            await self.cache.revoke_token(
+                digest=get_jwt_helper().token_digest(access_token),
+                expires=float(access_token_payload.exp),
+            )
         except (ValueError, binascii.Error):
             raise InvalidToken
 
@@ -1,4 +1,5 @@
 import base64
+import hashlib
 import json
 from datetime import datetime, timezone
 from functools import lru_cache
@@ -70,6 +71,13 @@ class JWTHelper:
         if float(payload.exp) < now:
             raise ExpireToken
 
+    @staticmethod
+    def token_digest(token: str) -> str:
+        """Token digest that identifies a revoked token in other services.
+
+        Must match the digest computed by the movies API."""
+        return hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+
     def encode_basemodel(self, model: BaseModel) -> str:
         """Helper incapsulates pydantic serialization logic."""
         serialized_str = str(model.model_dump_json())
@@ -0,0 +1,267 @@
+"""Бенчмарк синхронизации изменения одной персоны или жанра.
+
+Сравнивает путь IncrementalETL (_resolve_targets и _sync_tables: выборка
+измененной строки таблицы, поиск зависимых фильмов по индексу зависимостей
+и их пересборка по id) с прежним путем - агрегацией SQL_REQUEST_FILMWORKS
+по всем фильмам с фильтром по вычисленному modified. Postgres и
+Elasticsearch заменены объектами в памяти: выборка изменений отдает только
+строки после контрольной точки (как индекс по modified), агрегация
+проходит все связи каталога, как GROUP BY в прежнем запросе. Время пути
+IncrementalETL не должно расти с размером каталога при изменении персоны
+и растет только с числом фильмов жанра при изменении жанра.
+
+Запуск из папки etl:
+    python -m benchmarks.dependency_index --films 10000 100000 1000000
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+
+GENRES = 30
+PERSONS_PER_FILM = 5
+REPEATS = 100
+
+LOADED = datetime(2024, 1, 1, tzinfo=timezone.utc)
+CHANGED = LOADED + timedelta(hours=1)
+
+
+def load_etl_module():
+    """
+    Модуль load_data, импортированный во временной папке: пакет services
+    при импорте открывает хранилище состояний и логи ETL в текущей папке.
+    """
+    etl_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if etl_dir not in sys.path:
+        sys.path.insert(0, etl_dir)
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    os.makedirs("logs")
+    try:
+        import load_data
+        from services.storage import JsonFileStorage, State
+
+        load_data.states = State(
+            JsonFileStorage(os.path.join(workdir, "states.json"))
+        )
+    finally:
+        os.chdir(cwd)
+    return load_data
+
+
+load_data = load_etl_module()
+# Журнал каждой обработанной пачки искажает замер.
+logging.disable(logging.INFO)
+
+
+class Catalogue:
+    """Случайный каталог: фильмы, жанры, персоны и связи между ними."""
+
+    def __init__(self, films: int) -> None:
+        self.genres = [str(uuid.uuid4()) for _ in range(GENRES)]
+        self.persons = [str(uuid.uuid4()) for _ in range(films)]
+        self.modified = dict.fromkeys(self.genres + self.persons, LOADED)
+        self.films = {}
+        for _ in range(films):
+            film_id = str(uuid.uuid4())
+            self.modified[film_id] = LOADED
+            self.films[film_id] = (
+                [random.choice(self.genres)],
+                random.sample(self.persons, PERSONS_PER_FILM),
+            )
+
+    def film_document(self, film_id: str) -> dict:
+        genre_ids, person_ids = self.films[film_id]
+        return {
+            "uuid": film_id,
+            "genre": [{"uuid": genre_id} for genre_id in genre_ids],
+            "actors": [{"uuid": person_id} for person_id in person_ids],
+            "writers": [],
+            "directors": [],
+        }
+
+    def change(self, table: str, entity_id: str) -> list[tuple]:
+        """Изменение строки таблицы: строки, видимые выборке изменений."""
+        self.modified[entity_id] = CHANGED
+        return [(table, entity_id, CHANGED)]
+
+
+class Row(list):
+    """Строка выборки, доступная и по индексу, и по имени столбца."""
+
+    def __init__(self, columns: dict) -> None:
+        super().__init__(columns.values())
+        self.columns = columns
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.columns[key]
+        return super().__getitem__(key)
+
+
+class ChangesConnection:
+    """Выборка изменений таблиц: только строки после контрольной точки."""
+
+    def __init__(self) -> None:
+        self.changed = []
+        self.rows = []
+        self.connection = self
+
+    def cursor(self, name: str | None = None):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    def commit(self) -> None:
+        pass
+
+    def execute(self, sql: str, params: dict) -> None:
+        after = datetime.fromisoformat(params["last_modified"])
+        self.rows = [
+            Row(
+                {
+                    "uuid": entity_id,
+                    "modified": modified,
+                    "entity_id": entity_id,
+                    "related_id": None,
+                }
+            )
+            for table, entity_id, modified in self.changed
+            if load_data.SQL_CHANGED_ROWS[table] in sql and modified > after
+        ]
+
+    def fetchall(self) -> list:
+        return self.rows
+
+
+class CatalogueExtractor:
+    """Выборка документов индексов по id из каталога в памяти."""
+
+    def __init__(self, catalogue: Catalogue) -> None:
+        self.catalogue = catalogue
+
+    def extract_by_ids(self, sql_request: str, ids: list[str]):
+        if sql_request == load_data.SQL_REQUEST_FILMWORKS:
+            yield [self.catalogue.film_document(film_id) for film_id in ids]
+        else:
+            yield [{"uuid": entity_id} for entity_id in ids]
+
+
+class PassTransformer:
+    def transform(self, rows: list, model) -> list[dict]:
+        return rows
+
+
+class NullLoader:
+    def load_stream(self, index_name: str, batches):
+        for _, checkpoint in batches:
+            yield checkpoint
+
+    def delete(self, index_name: str, ids) -> None:
+        pass
+
+
+def aggregate_films(catalogue: Catalogue, after: datetime) -> list[dict]:
+    """
+    Прежний путь: агрегация всех фильмов со связями (GROUP BY в
+    SQL_REQUEST_FILMWORKS) и отбор документов с modified после
+    контрольной точки.
+    """
+    modified = catalogue.modified
+    documents = []
+    for film_id, (genre_ids, person_ids) in catalogue.films.items():
+        latest = max(
+            modified[film_id],
+            max(modified[genre_id] for genre_id in genre_ids),
+            max(modified[person_id] for person_id in person_ids),
+        )
+        if latest > after:
+            documents.append(catalogue.film_document(film_id))
+    return documents
+
+
+def create_etl(catalogue: Catalogue):
+    """IncrementalETL с построенным индексом зависимостей каталога."""
+    etl = load_data.IncrementalETL(
+        extractor=CatalogueExtractor(catalogue),
+        transformer=PassTransformer(),
+        loader=NullLoader(),
+    )
+    etl.changes = ChangesConnection()
+    for film_id, (genre_ids, person_ids) in catalogue.films.items():
+        for genre_id in genre_ids:
+            etl.dependencies.add_genre_link(film_id, genre_id)
+        for person_id in person_ids:
+            etl.dependencies.add_person_link(film_id, person_id)
+    return etl
+
+
+def measure(func, *args, repeats: int = REPEATS, before=None) -> float:
+    """Среднее время вызова в миллисекундах без подготовки before."""
+    elapsed = 0.0
+    for _ in range(repeats):
+        if before is not None:
+            before()
+        started = perf_counter()
+        func(*args)
+        elapsed += perf_counter() - started
+    return elapsed / repeats * 1e3
+
+
+def bench_change(
+    etl, catalogue: Catalogue, table: str, entity_id: str
+) -> tuple:
+    """Время разбора, синхронизации и агрегации для изменения строки."""
+    etl.changes.changed = catalogue.change(table, entity_id)
+
+    def reset() -> None:
+        load_data.states.save_checkpoint(
+            load_data.tables_checkpoint(str(LOADED))
+        )
+
+    scan_repeats = max(1, REPEATS * 10_000 // len(catalogue.films))
+    result = (
+        measure(etl._resolve_targets, [(table, entity_id, None)]),
+        measure(etl._sync_tables, before=reset),
+        measure(aggregate_films, catalogue, LOADED, repeats=scan_repeats),
+    )
+    catalogue.modified[entity_id] = LOADED
+    return result
+
+
+def bench(films: int) -> None:
+    catalogue = Catalogue(films)
+    etl = create_etl(catalogue)
+    for table, entity_id in (
+        ("person", random.choice(catalogue.persons)),
+        ("genre", catalogue.genres[0]),
+    ):
+        resolve, sync, aggregate = bench_change(
+            etl, catalogue, table, entity_id
+        )
+        print(
+            f"{films:>9} фильмов, {table:<6}: "
+            f"_resolve_targets {resolve:8.4f} мс, "
+            f"_sync_tables {sync:8.3f} мс, "
+            f"агрегация фильмов {aggregate:9.2f} мс"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--films", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    args = parser.parse_args()
+    for films in args.films:
+        bench(films)
@@ -0,0 +1,97 @@
+"""Бенчмарк хранилищ состояний ETL.
+
+Имитирует продвижение контрольной точки пачками по CHUNK_SIZE строк и
+выводит стоимость одной строки на каждом отрезке, чтобы было видно, растёт
+ли она с объёмом уже проиндексированных данных.
+
+Запуск из папки etl:
+    python -m benchmarks.state_storage --rows 1000000
+"""
+import argparse
+import importlib.util
+import os
+import tempfile
+import uuid
+from time import perf_counter
+
+from settings import CHUNK_SIZE, STATE_COMPACT_MIN_BYTES
+
+
+def load_storage_module():
+    """
+    Модуль хранилищ состояний без пакета services: services/__init__.py
+    при импорте открывает рабочее хранилище и логи ETL в текущей папке.
+    """
+    path = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "services",
+        "storage.py",
+    )
+    spec = importlib.util.spec_from_file_location("state_storage", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+storage_module = load_storage_module()
+AppendOnlyLogStorage = storage_module.AppendOnlyLogStorage
+JsonFileStorage = storage_module.JsonFileStorage
+State = storage_module.State
+
+IDS_KEY = "movies_ids"
+
+
+def bench_log_storage(rows: int, segment: int, directory: str) -> None:
+    """Журнал с дозаписью: extend_state + commit на каждую пачку."""
+    storage = AppendOnlyLogStorage(
+        os.path.join(directory, "states.log"), STATE_COMPACT_MIN_BYTES
+    )
+    states = State(storage)
+    states.set_state(IDS_KEY, [])
+    states.commit()
+    started = perf_counter()
+    for done in range(CHUNK_SIZE, rows + 1, CHUNK_SIZE):
+        states.extend_state(
+            IDS_KEY, [str(uuid.uuid4()) for _ in range(CHUNK_SIZE)]
+        )
+        states.commit()
+        if done % segment == 0:
+            elapsed = perf_counter() - started
+            print(
+                f"log  {done:>9} строк: "
+                f"{elapsed / segment * 1e6:8.2f} мкс/строка"
+            )
+            started = perf_counter()
+
+
+def bench_json_storage(rows: int, segment: int, directory: str) -> None:
+    """Прежняя схема: перезапись JSON-файла на каждую строку."""
+    states = State(JsonFileStorage(os.path.join(directory, "states.json")))
+    states.set_state(IDS_KEY, [])
+    states.commit()
+    started = perf_counter()
+    for done in range(1, rows + 1):
+        ids_list = states.get_state(IDS_KEY)
+        ids_list.append(str(uuid.uuid4()))
+        states.set_state(IDS_KEY, ids_list)
+        states.commit()
+        if done % segment == 0:
+            elapsed = perf_counter() - started
+            print(
+                f"json {done:>9} строк: "
+                f"{elapsed / segment * 1e6:8.2f} мкс/строка"
+            )
+            started = perf_counter()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--segment", type=int, default=100_000)
+    parser.add_argument("--json-rows", type=int, default=5_000)
+    parser.add_argument("--json-segment", type=int, default=1_000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        bench_log_storage(args.rows, args.segment, directory)
+        if args.json_rows:
+            bench_json_storage(args.json_rows, args.json_segment, directory)
@@ -0,0 +1,171 @@
+"""Бенчмарк преобразования строк выборки в документы Elasticsearch.
+
+"before" - прежняя схема: вложенные списки склеиваются в SQL в строку,
+разбираются json.loads, по каждой строке создается pydantic-модель с
+вложенными моделями и затем вызывается model_dump.
+"after" - текущая схема: вложенные списки приходят как json (их разбор
+драйвером psycopg2 учтен в замере), пачка проверяется одним вызовом
+TypeAdapter со схемой TypedDict.
+
+Запуск из папки etl:
+    python -m benchmarks.transform --rows 100000
+"""
+import argparse
+import json
+import os
+import uuid
+from time import perf_counter
+from uuid import UUID
+
+from pydantic import BaseModel
+
+os.makedirs("logs", exist_ok=True)
+
+from models import Filmwork, documents_adapter  # noqa: E402
+from settings import CHUNK_SIZE  # noqa: E402
+
+PERSONS_PER_ROLE = 5
+GENRES_PER_FILM = 3
+
+
+class LegacyPersonShort(BaseModel):
+    uuid: UUID
+    full_name: str
+
+
+class LegacyGenreShort(BaseModel):
+    uuid: UUID
+    name: str | None
+
+
+class LegacyFilmwork(BaseModel):
+    uuid: UUID
+    imdb_rating: float | None = 0
+    genre: list[LegacyGenreShort] | None = []
+    title: str | None
+    description: str | None
+    subscribers_only: bool | None = False
+    actors: list[LegacyPersonShort] | None = []
+    writers: list[LegacyPersonShort] | None = []
+    directors: list[LegacyPersonShort] | None = []
+
+    @classmethod
+    def transform_from_input(cls, data):
+        (
+            uuid,
+            imdb_rating,
+            genres_data,
+            title,
+            description,
+            subscribers_only,
+            actors_data,
+            writers_data,
+            directors_data,
+            modified,
+        ) = data
+        return cls(
+            uuid=UUID(uuid),
+            imdb_rating=float(imdb_rating) if imdb_rating else None,
+            genre=[
+                LegacyGenreShort(uuid=UUID(genre_id), name=name)
+                for genre_id, name in genres_data.items()
+            ],
+            title=title,
+            description=description,
+            subscribers_only=subscribers_only,
+            actors=cls._persons(actors_data),
+            writers=cls._persons(writers_data),
+            directors=cls._persons(directors_data),
+        )
+
+    @staticmethod
+    def _persons(data):
+        return [
+            LegacyPersonShort(
+                uuid=UUID(person["uuid"]), full_name=person["full_name"]
+            )
+            for person in json.loads(data)
+        ]
+
+
+def make_persons() -> list[dict]:
+    return [
+        {"uuid": str(uuid.uuid4()), "full_name": f"Person {i}"}
+        for i in range(PERSONS_PER_ROLE)
+    ]
+
+
+def make_rows(rows: int) -> tuple[list, list]:
+    """Одинаковые фильмы в прежнем и текущем формате выборки."""
+    legacy, native = [], []
+    for i in range(rows):
+        film_id = str(uuid.uuid4())
+        genres = {str(uuid.uuid4()): f"Genre {j}" for j in range(3)}
+        persons = [make_persons() for _ in range(3)]
+        legacy.append(
+            (
+                film_id,
+                7.5,
+                genres,
+                f"Film {i}",
+                "Description",
+                False,
+                *(json.dumps(role) for role in persons),
+                "2024-01-01 00:00:00",
+            )
+        )
+        native.append(
+            {
+                "uuid": film_id,
+                "imdb_rating": 7.5,
+                "genre": json.dumps(
+                    [{"uuid": k, "name": v} for k, v in genres.items()]
+                ),
+                "title": f"Film {i}",
+                "description": "Description",
+                "subscribers_only": False,
+                "actors": json.dumps(persons[0]),
+                "writers": json.dumps(persons[1]),
+                "directors": json.dumps(persons[2]),
+                "modified": "2024-01-01 00:00:00",
+            }
+        )
+    return legacy, native
+
+
+def bench_before(rows: list) -> None:
+    for start in range(0, len(rows), CHUNK_SIZE):
+        [
+            LegacyFilmwork.transform_from_input(row).model_dump()
+            for row in rows[start : start + CHUNK_SIZE]
+        ]
+
+
+def bench_after(rows: list) -> None:
+    adapter = documents_adapter(Filmwork)
+    json_fields = ("genre", "actors", "writers", "directors")
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = []
+        for row in rows[start : start + CHUNK_SIZE]:
+            # Разбор json-колонок, который выполняет psycopg2.
+            row = dict(row)
+            for field in json_fields:
+                row[field] = json.loads(row[field])
+            chunk.append(row)
+        adapter.validate_python(chunk)
+
+
+def measure(name: str, func, rows: list) -> None:
+    started = perf_counter()
+    func(rows)
+    elapsed = perf_counter() - started
+    print(f"{name:>6}: {len(rows) / elapsed:10.0f} строк/с")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+    legacy, native = make_rows(args.rows)
+    measure("before", bench_before, legacy)
+    measure("after", bench_after, native)
@@ -1,57 +1,148 @@
-import datetime
 import logging
-from time import sleep
-from typing import Iterator
+import queue
+import select
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from itertools import islice
+from time import perf_counter, sleep
+from typing import Any, Iterable, Iterator
 
 import psycopg2
+import redis
 from elasticsearch import Elasticsearch, helpers
 from psycopg2.extras import DictCursor
 from pydantic import ValidationError
 
-from models import Filmwork, Genre, IndexName, Person
-from services import backoff, states
+from models import Filmwork, Genre, IndexName, Person, documents_adapter
+from services import backoff, metrics, states
+from services.batching import AdaptiveChunkSize
+from services.changes import ChangePublisher
+from services.dependencies import DependencyIndex
+from services.metrics import profile
 from settings import (
+    BULK_INITIAL_BACKOFF,
+    BULK_MAX_CHUNK_BYTES,
+    BULK_MAX_CHUNK_SIZE,
+    BULK_MAX_RETRIES,
+    BULK_MIN_CHUNK_SIZE,
+    BULK_TARGET_CHUNK_BYTES,
+    BULK_TARGET_LATENCY,
+    CACHE_INVALIDATION,
+    CDC_CHANNEL,
+    CHANGES_BATCH_SIZE,
     CHUNK_SIZE,
     DSL,
+    ETL_MODE,
+    ETL_PROFILE,
+    ETL_PROFILE_FILE,
+    ETL_RUN_ONCE,
+    ETL_WORKERS,
     ES_HOST,
     ES_PORT,
+    ETL_FULL_REINDEX,
+    INDEX_FORCEMERGE_TIMEOUT,
     INDEX_GENRES_MAPPINGS,
     INDEX_MOVIES_MAPPINGS,
     INDEX_PERSONS_MAPPINGS,
+    INDEX_REBUILD_SETTINGS,
+    INDEX_REPLICAS,
     INDEX_SETTINGS,
+    LOADER_MODE,
+    METRICS_FILE,
+    METRICS_PORT,
+    PARTIAL_UPDATE_BY_QUERY_THRESHOLD,
+    PARTIAL_UPDATE_SCRIPT,
+    PARTIAL_UPDATE_SCRIPT_ID,
+    PIPELINE_QUEUE_SIZE,
+    REDIS_HOST,
+    REDIS_PORT,
     REPEAT_TIME,
+    SQL_CDC_DELETE,
+    SQL_CDC_FETCH,
+    SQL_CDC_SETUP,
+    SQL_CHANGED_ROWS,
+    SQL_CHANGES_PAGE,
+    SQL_DEPENDENCIES_GENRES,
+    SQL_DEPENDENCIES_PERSONS,
+    SQL_IDS_WRAPPER,
+    SQL_KEYSET_WRAPPER,
+    SQL_NOW,
     SQL_REQUEST_FILMWORKS,
     SQL_REQUEST_GENRES,
     SQL_REQUEST_PERSONS,
+    START_SYNC_TIME,
+    START_SYNC_UUID,
 )
 
 logger = logging.getLogger(__name__)
 
+# Схема каждого индекса.
+INDEX_MAPPINGS = {
+    IndexName.movies.value: INDEX_MOVIES_MAPPINGS,
+    IndexName.genres.value: INDEX_GENRES_MAPPINGS,
+    IndexName.persons.value: INDEX_PERSONS_MAPPINGS,
+}
+
+# Отметка в _meta схемы версии индекса, пересборка которой не завершена.
+REBUILD_META = "rebuilding"
+
+# Запрос и модель, из которых строятся документы каждого индекса.
+INDEX_SOURCES = {
+    IndexName.movies.value: (SQL_REQUEST_FILMWORKS, Filmwork),
+    IndexName.genres.value: (SQL_REQUEST_GENRES, Genre),
+    IndexName.persons.value: (SQL_REQUEST_PERSONS, Person),
+}
+
+# Вложенные копии документов индекса: индекс с копиями, вложенные поля с
+# копиями и копируемые поля документа.
+NESTED_COPIES = {
+    IndexName.movies.value: (
+        IndexName.persons.value,
+        ("films",),
+        ("title", "imdb_rating"),
+    ),
+    IndexName.genres.value: (IndexName.movies.value, ("genre",), ("name",)),
+    IndexName.persons.value: (
+        IndexName.movies.value,
+        ("actors", "writers", "directors"),
+        ("full_name",),
+    ),
+}
+
 
 class PostgresConnect:
-    """Класс для поюключения к Postgres."""
+    """
+    Класс для поюключения к Postgres. Каждый поток получает собственное
+    подключение.
+    """
 
     def __init__(self) -> None:
-        self._connection = None
+        self._local = threading.local()
 
     @property
     def connection(self):
         """Подключение/переподключение к БД Postgres."""
-        if not self._connection or self._connection.closed:
+        connection = getattr(self._local, "connection", None)
+        if not connection or connection.closed:
             try:
-                self._connection = psycopg2.connect(**DSL)
+                connection = psycopg2.connect(**DSL)
             except psycopg2.Error as e:
                 logger.error(f"Ошибка подключения к PostgreSQL: {e}")
                 raise
-        return self._connection
+            self._local.connection = connection
+        return connection
 
     def close(self):
         """Закрытие подключения к Postgres."""
-        if self._connection and not self._connection.closed:
-            self._connection.close()
+        connection = getattr(self._local, "connection", None)
+        if connection and not connection.closed:
+            connection.close()
 
-    def cursor(self):
-        return self.connection.cursor(cursor_factory=DictCursor)
+    def cursor(self, name: str | None = None):
+        """Курсор БД. Если задано имя - курсор на стороне сервера."""
+        return self.connection.cursor(name=name, cursor_factory=DictCursor)
 
 
 class PostgresExtractor:
@@ -65,73 +156,115 @@ class PostgresExtractor:
     def extract_data(
         self,
         sql_request: str,
-        last_indexed_modified_at: datetime.datetime,
-        start_time: datetime.datetime,
-        exclude_ids: list,
-        ids_list_key: str,
-        model,
-    ) -> Iterator[dict | None]:
-        """Получение данных пачками c исключением индексированных данных."""
-        with self.connection.cursor() as cursor:
+        checkpoint_key: str,
+    ) -> Iterator[tuple[list, dict[str, str]]]:
+        """
+        Получение данных пачками через именованный (серверный) курсор.
+        Выборка упорядочена по (modified, uuid) и продолжается с ключа
+        последней загруженной пачки, сохраненного в состоянии. Вместе с
+        пачкой возвращается ее контрольная точка, которую нужно сохранить
+        после загрузки пачки.
+        """
+        modified_key = f"{checkpoint_key}_modified_at"
+        uuid_key = f"{checkpoint_key}_uuid"
+        with self.connection.cursor(name=f"{checkpoint_key}_cursor") as cursor:
             try:
-                if exclude_ids:
-                    sql_request += """
-                    AND (uuid not in %(exclude_ids)s OR modified >
-                    %(start_time)s)
-                    """
-                sql_request += """ORDER BY modified DESC;"""
+                cursor.itersize = self.chunk_size
                 cursor.execute(
-                    sql_request,
+                    SQL_KEYSET_WRAPPER.format(sql_request=sql_request),
                     {
-                        "exclude_ids": tuple(exclude_ids),
-                        "last_indexed_modified_at": last_indexed_modified_at,
-                        "start_time": start_time,
+                        "last_modified": states.get_state(modified_key)
+                        or START_SYNC_TIME,
+                        "last_uuid": states.get_state(uuid_key)
+                        or START_SYNC_UUID,
                     },
                 )
 
                 while rows := cursor.fetchmany(self.chunk_size):
-                    try:
-                        yield [model.transform_from_input(row) for row in rows]
-                    except ValidationError as e:
-                        logger.error(
-                            f"Pydantic ошибка валидации в модели {model}: {e}"
-                        )
-                        continue
-                    for data in rows:
-                        ids_list = states.get_state(ids_list_key)
-                        ids_list.append(data["uuid"])
-                        states.set_state(ids_list_key, ids_list)
+                    yield (
+                        rows,
+                        {
+                            modified_key: str(rows[-1]["modified"]),
+                            uuid_key: str(rows[-1]["uuid"]),
+                        },
+                    )
             except psycopg2.Error as e:
                 logger.error(f"Ошибка выполнения SQL запроса: {e}")
                 raise
             finally:
                 self.connection.close()
 
+    @backoff()
+    def database_time(self) -> str:
+        """Текущее время БД."""
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute(SQL_NOW)
+                return str(cursor.fetchone()[0])
+        except psycopg2.Error as e:
+            logger.error(f"Ошибка выполнения SQL запроса: {e}")
+            raise
+        finally:
+            self.connection.close()
+
+    def extract_by_ids(
+        self, sql_request: str, ids: list[str]
+    ) -> Iterator[list]:
+        """Получение данных пачками по списку id."""
+        try:
+            with self.connection.cursor() as cursor:
+                for start in range(0, len(ids), self.chunk_size):
+                    cursor.execute(
+                        SQL_IDS_WRAPPER.format(sql_request=sql_request),
+                        {"ids": ids[start : start + self.chunk_size]},
+                    )
+                    yield cursor.fetchall()
+        except psycopg2.Error as e:
+            logger.error(f"Ошибка выполнения SQL запроса: {e}")
+            raise
+        finally:
+            self.connection.close()
+
 
 class Transformer:
     """Преобразование выборки для загрузки в Elastiicsearch."""
 
-    def transform(self, data: list[dict]) -> list[dict]:
-        """Преобразование данных для Elasticsearch."""
-        return [row.model_dump() for row in data]
+    def transform(self, rows: list, model) -> list[dict]:
+        """
+        Преобразование строк выборки в документы для Elasticsearch. Пачка
+        проверяется целиком одним вызовом валидатора.
+        """
+        try:
+            return documents_adapter(model).validate_python(
+                [dict(row) for row in rows]
+            )
+        except ValidationError as e:
+            logger.error(f"Pydantic ошибка валидации в модели {model}: {e}")
+            return []
 
 
 class ElasticsearchLoader:
     """
     Класс-метод сохранения в БД Elasticsearch. При инициализации экземпляра
-    проверяет наличие/создает индексы.
+    проверяет наличие/создает индексы. Об изменениях индексов, читаемых
+    API, сообщает publisher.
     """
 
-    def __init__(self, client: Elasticsearch):
+    def __init__(
+        self,
+        client: Elasticsearch,
+        publisher: ChangePublisher | None = None,
+    ):
         self.client = client
-        if not self.chech_index_exist(IndexName.genres.value):
-            self.create_index(IndexName.genres.value, INDEX_GENRES_MAPPINGS)
-
-        if not self.chech_index_exist(IndexName.movies.value):
-            self.create_index(IndexName.movies.value, INDEX_MOVIES_MAPPINGS)
-
-        if not self.chech_index_exist(IndexName.persons.value):
-            self.create_index(IndexName.persons.value, INDEX_PERSONS_MAPPINGS)
+        self.publisher = publisher
+        # Данные загружаются и читаются API через псевдонимы, указывающие на
+        # версионированные индексы вида movies_v20240101120000.
+        for alias, mappings in INDEX_MAPPINGS.items():
+            if not self.chech_index_exist(alias):
+                index_name = self.create_index(
+                    self.versioned_name(alias), mappings
+                )
+                self.client.indices.put_alias(index=index_name, name=alias)
 
     def chech_index_exist(self, index_name: str):
         """Метод проверки существования индекса."""
@@ -140,18 +273,142 @@ class ElasticsearchLoader:
             return True
         return False
 
-    def create_index(self, index_name: str, mappings):
+    def create_index(
+        self, index_name: str, mappings, settings: dict | None = None
+    ) -> str:
         """Метод создания индекса."""
         self.client.indices.create(
             index=index_name,
             mappings=mappings,
-            settings=INDEX_SETTINGS,
+            settings={**INDEX_SETTINGS, **(settings or {})},
         )
         logger.info(f"Индекс {index_name} создан.")
+        return index_name
+
+    @staticmethod
+    def versioned_name(alias: str) -> str:
+        """Имя новой версии индекса для псевдонима."""
+        return f"{alias}_v{datetime.now():%Y%m%d%H%M%S}"
+
+    def needs_rebuild(self, alias: str) -> bool:
+        """
+        Нужна ли пересборка: индекс создан без псевдонима или его схема
+        отличается от заданной в настройках.
+        """
+        if not self.client.indices.exists_alias(name=alias):
+            logger.info(f"Индекс {alias} создан без псевдонима.")
+            return True
+        for index_name, mapping in self.client.indices.get_mapping(
+            index=alias
+        ).items():
+            if (
+                mapping["mappings"].get("properties")
+                != INDEX_MAPPINGS[alias]["properties"]
+            ):
+                logger.info(f"Схема индекса {index_name} устарела.")
+                return True
+        return False
+
+    def start_rebuild(self, alias: str) -> str:
+        """
+        Создание новой версии индекса для пересборки без обновлений поиска и
+        реплик. Версия отмечается в _meta как пересобираемая, и прерванная
+        пересборка продолжается в ней, если она новее индекса за
+        псевдонимом и ее схема не изменилась. Остальные версии, на которые
+        не указывает псевдоним, устарели и удаляются.
+        """
+        live = self._aliased_indices(alias)
+        unfinished, obsolete = [], []
+        for index_name, index in sorted(
+            self.client.indices.get(
+                index=f"{alias}_v*", expand_wildcards="open"
+            ).items()
+        ):
+            if index_name in live:
+                continue
+            mappings = index["mappings"]
+            if (
+                mappings.get("_meta", {}).get(REBUILD_META)
+                and mappings.get("properties")
+                == INDEX_MAPPINGS[alias]["properties"]
+                and all(index_name > live_name for live_name in live)
+            ):
+                unfinished.append(index_name)
+            else:
+                obsolete.append(index_name)
+        if obsolete := obsolete + unfinished[:-1]:
+            logger.info(f"Удаление устаревших версий индекса: {obsolete}.")
+            self.client.indices.delete(index=",".join(obsolete))
+        if unfinished:
+            logger.info(f"Продолжение пересборки в индекс {unfinished[-1]}.")
+            return unfinished[-1]
+        return self.create_index(
+            self.versioned_name(alias),
+            {**INDEX_MAPPINGS[alias], "_meta": {REBUILD_META: True}},
+            INDEX_REBUILD_SETTINGS,
+        )
+
+    def finish_rebuild(self, alias: str, index_name: str) -> None:
+        """
+        Восстановление настроек, слияние сегментов и атомарное
+        переключение псевдонима на новую версию индекса. Отметка
+        пересборки снимается после переключения, прежние версии удаляются.
+        """
+        self.client.indices.put_settings(
+            index=index_name,
+            settings={
+                "refresh_interval": INDEX_SETTINGS["refresh_interval"],
+                "number_of_replicas": INDEX_REPLICAS,
+            },
+        )
+        self.client.indices.refresh(index=index_name)
+        self.client.options(
+            request_timeout=INDEX_FORCEMERGE_TIMEOUT
+        ).indices.forcemerge(index=index_name, max_num_segments=1)
+        live = self._aliased_indices(alias)
+        actions = [{"remove": {"index": old, "alias": alias}} for old in live]
+        if not live and self.client.indices.exists(index=alias):
+            # Индекс, созданный до перехода на псевдонимы, удаляется в той же
+            # операции, что и назначается псевдоним с его именем.
+            actions.append({"remove_index": {"index": alias}})
+        actions.append({"add": {"index": index_name, "alias": alias}})
+        self.client.indices.update_aliases(actions=actions)
+        logger.info(f"Псевдоним {alias} переключен на индекс {index_name}.")
+        self._publish(alias, None)
+        self.client.indices.put_mapping(
+            index=index_name, meta={REBUILD_META: False}
+        )
+        if live:
+            self.client.indices.delete(index=",".join(live))
+
+    def _aliased_indices(self, alias: str) -> list[str]:
+        """Индексы, на которые указывает псевдоним."""
+        if not self.client.indices.exists_alias(name=alias):
+            return []
+        return list(self.client.indices.get_alias(name=alias))
+
+    def _publishes(self, index_name: str) -> bool:
+        """Сообщается ли API об изменениях индекса (псевдонима)."""
+        return self.publisher is not None and index_name in INDEX_MAPPINGS
+
+    def _refresh(self, index_name: str) -> str | bool:
+        """
+        Параметр refresh загрузки. Загрузка в индекс, об изменениях
+        которого сообщается API, ждет обновления поиска: иначе API мог бы
+        снова закэшировать прежние результаты поиска.
+        """
+        return "wait_for" if self._publishes(index_name) else False
+
+    def _publish(self, index_name: str, ids: Iterable[str] | None) -> None:
+        """Сообщение API об измененных документах индекса."""
+        if self._publishes(index_name):
+            self.publisher.publish(index_name, ids)
 
     @backoff()
     def load(self, index_name: str, data: list[dict]) -> None:
         """Загрузка данных пачками в ElasticSearch."""
+        if not data:
+            return
         actions = [
             {
                 "_index": index_name,
@@ -161,8 +418,16 @@ class ElasticsearchLoader:
             for row in data
         ]
         try:
-            helpers.bulk(self.client, actions)
+            with metrics.time(
+                "etl_stage_seconds", {"index": index_name, "stage": "load"}
+            ):
+                helpers.bulk(
+                    self.client, actions, refresh=self._refresh(index_name)
+                )
         except helpers.BulkIndexError as e:
+            metrics.inc(
+                "etl_bulk_failures_total", {"index": index_name}, len(e.errors)
+            )
             for i, error in enumerate(e.errors):
                 if (
                     "index" in error
@@ -172,6 +437,289 @@ class ElasticsearchLoader:
                     logger.info(f"Ошибка индексации документа {i}: {error}")
 
             raise
+        metrics.inc(
+            "etl_documents_indexed_total", {"index": index_name}, len(actions)
+        )
+        self._publish(index_name, [row["uuid"] for row in data])
+
+    def load_stream(
+        self,
+        index_name: str,
+        batches: Iterable[tuple[list[dict], Any]],
+    ) -> Iterator[Any]:
+        """
+        Загрузка потока пачек (документы, контрольная точка). Возвращает
+        контрольные точки пачек по мере их загрузки.
+        """
+        for data, checkpoint in batches:
+            self.load(index_name, data)
+            yield checkpoint
+
+    @backoff()
+    def delete(self, index_name: str, ids: Iterable[str]) -> None:
+        """Удаление документов из индекса. Отсутствующие id пропускаются."""
+        ids = list(ids)
+        helpers.bulk(
+            self.client,
+            (
+                {"_op_type": "delete", "_index": index_name, "_id": uuid}
+                for uuid in ids
+            ),
+            raise_on_error=False,
+            refresh=self._refresh(index_name),
+        )
+        self._publish(index_name, ids)
+
+
+class StreamingElasticsearchLoader(ElasticsearchLoader):
+    """
+    Загрузчик на основе helpers.streaming_bulk. Документы берутся из
+    генератора и отправляются пачками, размер которых подстраивается под
+    время ответа Elasticsearch и целевой объем пачки в байтах. Повторно
+    отправляются только документы, отклоненные со статусом 429.
+    """
+
+    def __init__(
+        self,
+        client: Elasticsearch,
+        chunk_size: AdaptiveChunkSize | None = None,
+        publisher: ChangePublisher | None = None,
+    ):
+        super().__init__(client, publisher)
+        self.chunk_size = chunk_size or AdaptiveChunkSize(
+            initial=CHUNK_SIZE,
+            minimum=BULK_MIN_CHUNK_SIZE,
+            maximum=BULK_MAX_CHUNK_SIZE,
+            target_latency=BULK_TARGET_LATENCY,
+            target_bytes=BULK_TARGET_CHUNK_BYTES,
+        )
+
+    def load(self, index_name: str, data: Iterable[dict]) -> None:
+        """Загрузка документов в ElasticSearch."""
+        for _ in self.load_stream(index_name, [(data, None)]):
+            pass
+
+    def load_stream(
+        self,
+        index_name: str,
+        batches: Iterable[tuple[list[dict], Any]],
+    ) -> Iterator[Any]:
+        """
+        Потоковая загрузка пачек. Контрольная точка пачки возвращается,
+        когда все ее документы подтверждены Elasticsearch.
+        """
+        # Позиции последних документов пачек и их контрольные точки.
+        pending = deque()
+        position = 0
+
+        def actions():
+            nonlocal position
+            for data, checkpoint in batches:
+                for row in data:
+                    position += 1
+                    yield {
+                        "_index": index_name,
+                        "_id": row["uuid"],
+                        "_source": row,
+                    }
+                pending.append((position, checkpoint))
+
+        for sent in self._send_stream(index_name, actions()):
+            while pending and pending[0][0] <= sent:
+                yield pending.popleft()[1]
+        while pending:
+            yield pending.popleft()[1]
+
+    def _send_stream(
+        self,
+        index_name: str,
+        actions: Iterator[dict],
+        ignore_status: tuple[int, ...] = (),
+    ) -> Iterator[int]:
+        """
+        Отправка потока действий пачками адаптивного размера. После каждой
+        пачки возвращает число подтвержденных действий.
+        """
+        labels = {"index": index_name}
+        refresh = self._refresh(index_name)
+        sent = 0
+        while chunk := list(islice(actions, self.chunk_size.value)):
+            bulk, size = self._expand_actions(chunk)
+            started = perf_counter()
+            try:
+                self._send_chunk(bulk, ignore_status, refresh)
+            except helpers.BulkIndexError as e:
+                metrics.inc("etl_bulk_failures_total", labels, len(e.errors))
+                raise
+            latency = perf_counter() - started
+            self.chunk_size.update(len(chunk), latency, size)
+            metrics.observe(
+                "etl_stage_seconds", {**labels, "stage": "load"}, latency
+            )
+            metrics.inc("etl_documents_indexed_total", labels, len(chunk))
+            self._publish(index_name, [action["_id"] for action in chunk])
+            sent += len(chunk)
+            yield sent
+
+    def _expand_actions(
+        self, chunk: list[dict]
+    ) -> tuple[list[tuple[dict, bytes | None]], int]:
+        """
+        Строки запроса bulk для действий пачки и объем пачки в байтах.
+        Тела действий сериализуются здесь один раз, streaming_bulk
+        пересылает готовые байты.
+        """
+        serializer = self.client.transport.serializers.get_serializer(
+            "application/json"
+        )
+        bulk = []
+        size = 0
+        for action in chunk:
+            header, body = helpers.expand_action(action)
+            if body is not None:
+                body = serializer.dumps(body)
+                size += len(body) + 1
+            size += len(serializer.dumps(header)) + 1
+            bulk.append((header, body))
+        return bulk, size
+
+    @backoff()
+    def _send_chunk(
+        self,
+        chunk: list[tuple[dict, bytes | None]],
+        ignore_status: tuple[int, ...] = (),
+        refresh: str | bool = False,
+    ) -> None:
+        """
+        Отправка пачки строк запроса bulk с повтором документов,
+        отклоненных с 429. Ошибки со статусами из ignore_status
+        пропускаются.
+        """
+        errors = [
+            item
+            for ok, item in helpers.streaming_bulk(
+                self.client,
+                chunk,
+                chunk_size=len(chunk),
+                expand_action_callback=lambda action: action,
+                max_chunk_bytes=BULK_MAX_CHUNK_BYTES,
+                raise_on_error=False,
+                max_retries=BULK_MAX_RETRIES,
+                initial_backoff=BULK_INITIAL_BACKOFF,
+                yield_ok=False,
+                refresh=refresh,
+            )
+            if not ok
+            and next(iter(item.values())).get("status") not in ignore_status
+        ]
+        if errors:
+            for error in errors:
+                logger.info(f"Ошибка индексации документа: {error}")
+            raise helpers.BulkIndexError(
+                f"{len(errors)} документов не проиндексировано.", errors
+            )
+
+
+class PartialUpdateElasticsearchLoader(StreamingElasticsearchLoader):
+    """
+    Потоковый загрузчик, умеющий обновлять вложенные копии сущностей
+    (жанры и персоны в фильмах, фильмы в персонах) сохраненным
+    painless-скриптом. Вместо документов целиком пересылаются только id
+    документов и новые значения полей.
+    """
+
+    def __init__(
+        self,
+        client: Elasticsearch,
+        chunk_size: AdaptiveChunkSize | None = None,
+        publisher: ChangePublisher | None = None,
+    ):
+        super().__init__(client, chunk_size, publisher)
+        self.put_script()
+
+    @backoff()
+    def put_script(self) -> None:
+        """Сохранение скрипта обновления вложенных записей."""
+        self.client.put_script(
+            id=PARTIAL_UPDATE_SCRIPT_ID,
+            script={"lang": "painless", "source": PARTIAL_UPDATE_SCRIPT},
+        )
+
+    def patch_nested(
+        self,
+        index_name: str,
+        fields: Iterable[str],
+        patches: dict[str, dict[str, dict]],
+    ) -> None:
+        """
+        Обновление вложенных записей документов пачками update.
+        patches: id документа -> {uuid записи: {поле: новое значение}}.
+        Отсутствующие в индексе документы пропускаются.
+        """
+        fields = list(fields)
+        actions = (
+            {
+                "_op_type": "update",
+                "_index": index_name,
+                "_id": doc_id,
+                "script": {
+                    "id": PARTIAL_UPDATE_SCRIPT_ID,
+                    "params": {"fields": fields, "entities": entities},
+                },
+            }
+            for doc_id, entities in patches.items()
+        )
+        for _ in self._send_stream(index_name, actions, ignore_status=(404,)):
+            pass
+
+    @backoff()
+    def patch_nested_by_query(
+        self,
+        index_name: str,
+        fields: Iterable[str],
+        entities: dict[str, dict],
+    ) -> None:
+        """
+        Обновление вложенных записей во всех документах, где они есть, одним
+        update_by_query. entities: uuid записи -> {поле: новое значение}.
+        """
+        fields = list(fields)
+        # Документы, загруженные после последнего обновления индекса, иначе
+        # дали бы конфликт версий.
+        self.client.indices.refresh(index=index_name)
+        response = self.client.update_by_query(
+            index=index_name,
+            query={
+                "bool": {
+                    "should": [
+                        {
+                            "nested": {
+                                "path": field,
+                                "query": {
+                                    "terms": {f"{field}.uuid": list(entities)}
+                                },
+                            }
+                        }
+                        for field in fields
+                    ],
+                    "minimum_should_match": 1,
+                }
+            },
+            script={
+                "id": PARTIAL_UPDATE_SCRIPT_ID,
+                "params": {"fields": fields, "entities": entities},
+            },
+            conflicts="proceed",
+            slices="auto",
+            refresh=True,
+        )
+        if response["version_conflicts"]:
+            logger.warning(
+                f"Индекс {index_name}: пропущено документов из-за конфликта "
+                f"версий: {response['version_conflicts']}."
+            )
+        # Измененные документы неизвестны: кэш индекса сбрасывается целиком.
+        self._publish(index_name, None)
 
 
 class ETL:
@@ -185,77 +733,697 @@ class ETL:
         self.transformer = transformer
         self.loader = loader
 
+    def wait(self) -> None:
+        """Ожидание перед следующим запуском ETL."""
+        sleep(REPEAT_TIME)
+
     def run(self) -> None:
         """Пошаговая реализация ETL."""
         try:
             # Проверяем доступность Elasticsearch
             logger.info(self.loader.client.ping())
-            start_time = datetime.datetime.now()
             # Запускаем процесс ETL для каждого индекса
-            self._etl_movies(
-                index_name=IndexName.movies.value, start_time=start_time
-            )
-            self._etl_genres(
-                index_name=IndexName.genres.value, start_time=start_time
-            )
-            self._etl_persons(
-                index_name=IndexName.persons.value, start_time=start_time
-            )
+            self._etl_movies(index_name=IndexName.movies.value)
+            self._etl_genres(index_name=IndexName.genres.value)
+            self._etl_persons(index_name=IndexName.persons.value)
         except Exception as e:
             logger.error(f"Ошибка выполнения ETL: {e}")
 
+    def rebuild(self, aliases: Iterable[str] | None = None) -> None:
+        """
+        Полная пересборка индексов без простоя: данные загружаются в новую
+        версию индекса, после чего на нее атомарно переключается псевдоним,
+        через который читает API. Пересборка начинается с контрольной точки
+        новой версии, поэтому прерванная пересборка продолжается.
+        После пересборки всех индексов изменения таблиц отсчитываются от
+        времени ее начала: сделанные раньше уже вошли в индексы.
+        """
+        aliases = list(aliases or INDEX_SOURCES)
+        now = self.extractor.database_time()
+        started = []
+        for alias in aliases:
+            sql_request, model = INDEX_SOURCES[alias]
+            index_name = self.loader.start_rebuild(alias)
+            # Продолжаемая пересборка начата раньше.
+            started_key = f"rebuild_{index_name}_started_at"
+            if (started_at := states.get_state(started_key)) is None:
+                started_at = now
+                states.save_checkpoint({started_key: started_at})
+            started.append(started_at)
+            self._etl_index(index_name, sql_request, model)
+            self.loader.finish_rebuild(alias, index_name)
+            # Синхронизация псевдонима продолжается с того места, где
+            # закончилась пересборка.
+            states.save_checkpoint(
+                {
+                    f"last_{alias}_indexed_{suffix}": states.get_state(
+                        f"last_{index_name}_indexed_{suffix}"
+                    )
+                    or default
+                    for suffix, default in (
+                        ("modified_at", START_SYNC_TIME),
+                        ("uuid", START_SYNC_UUID),
+                    )
+                }
+            )
+        if set(aliases) >= set(INDEX_SOURCES):
+            states.save_checkpoint(
+                tables_checkpoint(min(started, key=datetime.fromisoformat))
+            )
+
     def _etl_index(
         self,
         index_name: str,
-        start_time,
         sql_request: str,
         model,
     ):
         """Загрузка данных в указанный индекс."""
-        exclude_ids = states.get_state(index_name + "_ids")
-        last_indexed_key = f"last_{index_name}_indexed_modified_at"
-        for batch in self.extractor.extract_data(
+        batches = (
+            (self._transform(index_name, rows, model), checkpoint)
+            for rows, checkpoint in self._extract(index_name, sql_request)
+        )
+        for checkpoint in self.loader.load_stream(index_name, batches):
+            self._save_checkpoint(index_name, checkpoint)
+
+    def _extract(
+        self, index_name: str, sql_request: str
+    ) -> Iterator[tuple[list, dict[str, str]]]:
+        """Выборка пачек индекса с замером времени запросов к Postgres."""
+        batches = self.extractor.extract_data(
             sql_request=sql_request,
-            last_indexed_modified_at=states.get_state(last_indexed_key),
-            start_time=start_time,
-            exclude_ids=exclude_ids,
-            ids_list_key=f"{index_name}_ids",
-            model=model,
+            checkpoint_key=f"last_{index_name}_indexed",
+        )
+        try:
+            while True:
+                started = perf_counter()
+                try:
+                    rows, checkpoint = next(batches)
+                except StopIteration:
+                    return
+                record_extract(index_name, rows, perf_counter() - started)
+                yield rows, checkpoint
+        finally:
+            batches.close()
+
+    def _transform(self, index_name: str, rows: list, model) -> list[dict]:
+        """Преобразование пачки с замером времени."""
+        with metrics.time(
+            "etl_stage_seconds", {"index": index_name, "stage": "transform"}
         ):
-            data = self.transformer.transform(batch)
-            self.loader.load(index_name, data)
+            return self.transformer.transform(rows, model)
 
-        states.set_state(f"{index_name}_ids", [])
-        states.set_state(last_indexed_key, str(start_time))
+    @staticmethod
+    def _save_checkpoint(index_name: str, checkpoint: dict) -> None:
+        """Сохранение контрольной точки и отставания индекса."""
+        states.save_checkpoint(checkpoint)
+        record_lag(
+            index_name, checkpoint[f"last_{index_name}_indexed_modified_at"]
+        )
 
-    def _etl_genres(self, index_name, start_time):
+    def _etl_genres(self, index_name):
         """Загрузка в индекс genres."""
         self._etl_index(
             index_name=index_name,
-            start_time=start_time,
             sql_request=SQL_REQUEST_GENRES,
             model=Genre,
         )
 
-    def _etl_movies(self, index_name, start_time):
+    def _etl_movies(self, index_name):
         """Загрузка в индекс movies."""
         self._etl_index(
             index_name=index_name,
-            start_time=start_time,
             sql_request=SQL_REQUEST_FILMWORKS,
             model=Filmwork,
         )
 
-    def _etl_persons(self, index_name, start_time):
+    def _etl_persons(self, index_name):
         """Загрузка в индекс persons."""
         self._etl_index(
             index_name=index_name,
-            start_time=start_time,
             sql_request=SQL_REQUEST_PERSONS,
             model=Person,
         )
 
 
+def tables_checkpoint(modified: str) -> dict[str, str]:
+    """Контрольные точки изменений всех таблиц на момент modified."""
+    checkpoint = {}
+    for table in SQL_CHANGED_ROWS:
+        checkpoint[f"last_{table}_changed_modified_at"] = modified
+        checkpoint[f"last_{table}_changed_uuid"] = START_SYNC_UUID
+    return checkpoint
+
+
+def record_extract(index_name: str, rows: list, seconds: float) -> None:
+    """Учет выборки пачки из Postgres в метриках."""
+    metrics.observe(
+        "etl_stage_seconds", {"index": index_name, "stage": "extract"}, seconds
+    )
+    metrics.inc("etl_rows_extracted_total", {"index": index_name}, len(rows))
+
+
+def record_lag(source: str, modified: str) -> None:
+    """Учет отставания загрузки от времени изменения строки в Postgres."""
+    modified_at = datetime.fromisoformat(modified)
+    if modified_at.tzinfo is None:
+        modified_at = modified_at.replace(tzinfo=timezone.utc)
+    lag = datetime.now(timezone.utc) - modified_at
+    metrics.set("etl_lag_seconds", {"source": source}, lag.total_seconds())
+
+
+class StageStats:
+    """Счетчик пропускной способности стадии конвейера ETL."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.rows = 0
+        self.seconds = 0.0
+
+    def add(self, rows: int, seconds: float) -> None:
+        self.rows += rows
+        self.seconds += seconds
+
+    def __str__(self) -> str:
+        rate = self.rows / self.seconds if self.seconds else 0
+        return (
+            f"{self.name}: {self.rows} строк за {self.seconds:.2f} с "
+            f"({rate:.0f} строк/с)"
+        )
+
+
+_STOP = object()
+
+
+class PipelinedETL(ETL):
+    """
+    ETL с конвейером: выборка, преобразование и загрузка индекса работают в
+    отдельных потоках и обмениваются пачками через ограниченные очереди,
+    индексы синхронизируются параллельно в пуле потоков. Контрольная точка
+    пачки сохраняется только после ее загрузки в Elasticsearch.
+    """
+
+    def __init__(
+        self,
+        extractor: PostgresExtractor,
+        transformer: Transformer,
+        loader: ElasticsearchLoader,
+        workers: int = ETL_WORKERS,
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+    ) -> None:
+        super().__init__(extractor, transformer, loader)
+        self.workers = workers
+        self.queue_size = queue_size
+
+    def run(self) -> None:
+        """Параллельный запуск ETL для всех индексов."""
+        try:
+            # Проверяем доступность Elasticsearch
+            logger.info(self.loader.client.ping())
+            with ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="etl"
+            ) as pool:
+                futures = [
+                    pool.submit(self._etl_movies, IndexName.movies.value),
+                    pool.submit(self._etl_genres, IndexName.genres.value),
+                    pool.submit(self._etl_persons, IndexName.persons.value),
+                ]
+            for future in futures:
+                future.result()
+        except Exception as e:
+            logger.error(f"Ошибка выполнения ETL: {e}")
+
+    def _etl_index(
+        self,
+        index_name: str,
+        sql_request: str,
+        model,
+    ):
+        """Конвейерная загрузка данных в указанный индекс."""
+        stats = [StageStats(name) for name in ("extract", "transform", "load")]
+        to_transform = queue.Queue(maxsize=self.queue_size)
+        to_load = queue.Queue(maxsize=self.queue_size)
+        failed = threading.Event()
+        with ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix=f"etl-{index_name}"
+        ) as pool:
+            stages = [
+                pool.submit(
+                    self._run_stage,
+                    lambda item: (
+                        self._transform(index_name, item[0], model),
+                        item[1],
+                    ),
+                    to_transform,
+                    to_load,
+                    failed,
+                    stats[1],
+                ),
+                pool.submit(
+                    self._load_stage, index_name, to_load, failed, stats[2]
+                ),
+            ]
+            extract_error = None
+            try:
+                self._extract_stage(
+                    sql_request, index_name, to_transform, failed, stats[0]
+                )
+            except Exception as e:
+                extract_error = e
+        # Сначала поднимаем исключения стадий: ошибка выборки может быть
+        # лишь следствием остановки конвейера.
+        for stage in stages:
+            stage.result()
+        if extract_error:
+            raise extract_error
+        if stats[0].rows:
+            logger.info(f"Индекс {index_name}: " + "; ".join(map(str, stats)))
+
+    def _extract_stage(
+        self,
+        sql_request: str,
+        index_name: str,
+        sink: queue.Queue,
+        failed: threading.Event,
+        stats: StageStats,
+    ) -> None:
+        """Стадия выборки из Postgres."""
+        batches = self._extract(index_name, sql_request)
+        try:
+            while True:
+                started = perf_counter()
+                try:
+                    rows, checkpoint = next(batches)
+                except StopIteration:
+                    break
+                stats.add(len(rows), perf_counter() - started)
+                self._put(sink, (rows, checkpoint), failed)
+        except Exception:
+            failed.set()
+            raise
+        finally:
+            batches.close()
+        self._put(sink, _STOP, failed)
+
+    def _run_stage(
+        self,
+        handler,
+        source: queue.Queue,
+        sink: queue.Queue,
+        failed: threading.Event,
+        stats: StageStats,
+    ) -> None:
+        """Стадия конвейера: обработка пачек из очереди source в sink."""
+        try:
+            while (item := self._get(source, failed)) is not _STOP:
+                started = perf_counter()
+                result = handler(item)
+                stats.add(len(item[0]), perf_counter() - started)
+                self._put(sink, result, failed)
+        except Exception:
+            failed.set()
+            raise
+        self._put(sink, _STOP, failed)
+
+    def _load_stage(
+        self,
+        index_name: str,
+        source: queue.Queue,
+        failed: threading.Event,
+        stats: StageStats,
+    ) -> None:
+        """
+        Стадия загрузки в Elasticsearch. Очередь передается загрузчику как
+        поток пачек, контрольные точки сохраняются по мере загрузки.
+        """
+        waited = 0.0
+
+        def batches():
+            nonlocal waited
+            while True:
+                started = perf_counter()
+                item = self._get(source, failed)
+                waited += perf_counter() - started
+                if item is _STOP:
+                    return
+                stats.rows += len(item[0])
+                yield item
+
+        started = perf_counter()
+        try:
+            for checkpoint in self.loader.load_stream(index_name, batches()):
+                self._save_checkpoint(index_name, checkpoint)
+        except Exception:
+            failed.set()
+            raise
+        stats.seconds += perf_counter() - started - waited
+
+    @staticmethod
+    def _put(sink: queue.Queue, item: Any, failed: threading.Event) -> None:
+        """Помещение в очередь с остановкой при ошибке другой стадии."""
+        while not failed.is_set():
+            try:
+                sink.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise RuntimeError("Конвейер ETL остановлен из-за ошибки стадии.")
+
+    @staticmethod
+    def _get(source: queue.Queue, failed: threading.Event) -> Any:
+        """Получение из очереди с остановкой при ошибке другой стадии."""
+        while not failed.is_set():
+            try:
+                return source.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        raise RuntimeError("Конвейер ETL остановлен из-за ошибки стадии.")
+
+
+class IncrementalETL(ETL):
+    """
+    ETL, пересобирающий только измененные документы и зависящие от них.
+    Изменения ищутся по каждой таблице отдельно, без агрегации каталога,
+    а зависимые документы - по индексу зависимостей в памяти: при изменении
+    персоны или жанра пересобираются фильмы с ними, при изменении фильма -
+    его персоны. С загрузчиком PartialUpdateElasticsearchLoader зависимые
+    документы не пересобираются: в них обновляются только вложенные копии
+    измененных сущностей.
+    """
+
+    def __init__(
+        self,
+        extractor: PostgresExtractor,
+        transformer: Transformer,
+        loader: ElasticsearchLoader,
+        batch_size: int = CHANGES_BATCH_SIZE,
+        dependencies: DependencyIndex | None = None,
+    ) -> None:
+        super().__init__(extractor, transformer, loader)
+        self.batch_size = batch_size
+        self.dependencies = dependencies or DependencyIndex()
+        self.partial_updates = isinstance(
+            loader, PartialUpdateElasticsearchLoader
+        )
+        self.changes = PostgresConnect()
+        self._ready = False
+
+    def setup(self) -> None:
+        """
+        Построение индекса зависимостей по таблицам связей. При первом
+        запуске, пока контрольных точек таблиц нет, индексы пересобираются
+        целиком: иначе синхронизация прошла бы по всем строкам всех таблиц
+        с START_SYNC_TIME и пересобрала бы каждый документ по нескольку раз.
+        """
+        if any(
+            states.get_state(key) is None
+            for key in tables_checkpoint(START_SYNC_TIME)
+        ):
+            self.rebuild()
+        self.dependencies = DependencyIndex()
+        with self.changes.cursor(name="etl_dependencies") as cursor:
+            cursor.itersize = self.batch_size
+            cursor.execute(SQL_DEPENDENCIES_GENRES)
+            for film_id, genre_id in cursor:
+                self.dependencies.add_genre_link(film_id, genre_id)
+        with self.changes.cursor(name="etl_dependencies") as cursor:
+            cursor.itersize = self.batch_size
+            cursor.execute(SQL_DEPENDENCIES_PERSONS)
+            for film_id, person_id in cursor:
+                self.dependencies.add_person_link(film_id, person_id)
+        self.changes.connection.commit()
+        logger.info(
+            f"Индекс зависимостей построен: {len(self.dependencies)} фильмов."
+        )
+
+    def run(self) -> None:
+        """Пересборка документов, затронутых изменениями в таблицах."""
+        try:
+            if not self._ready:
+                self.setup()
+                self._ready = True
+            self._sync_tables()
+        except Exception as e:
+            logger.error(f"Ошибка выполнения ETL: {e}")
+
+    def _sync_tables(self) -> None:
+        """Обработка изменений во всех таблицах пачками по keyset."""
+        for table, sql_request in SQL_CHANGED_ROWS.items():
+            modified_key = f"last_{table}_changed_modified_at"
+            uuid_key = f"last_{table}_changed_uuid"
+            while True:
+                with self.changes.cursor() as cursor:
+                    cursor.execute(
+                        SQL_CHANGES_PAGE.format(sql_request=sql_request),
+                        {
+                            "last_modified": states.get_state(modified_key)
+                            or START_SYNC_TIME,
+                            "last_uuid": states.get_state(uuid_key)
+                            or START_SYNC_UUID,
+                            "limit": self.batch_size,
+                        },
+                    )
+                    rows = cursor.fetchall()
+                self.changes.connection.commit()
+                if not rows:
+                    break
+                self._reindex_targets(
+                    (table, entity_id, related_id)
+                    for _, _, entity_id, related_id in rows
+                )
+                states.save_checkpoint(
+                    {
+                        modified_key: str(rows[-1]["modified"]),
+                        uuid_key: str(rows[-1]["uuid"]),
+                    }
+                )
+                record_lag(table, str(rows[-1]["modified"]))
+                logger.info(f"Таблица {table}: обработано {len(rows)} строк.")
+
+    def _reindex_targets(self, changes: Iterable[tuple]) -> None:
+        """Пересборка документов, затронутых изменениями."""
+        changes = list(changes)
+        entities = self._changed_entities(changes)
+        targets = self._resolve_targets(changes)
+        # Фильмы пересобираются первыми: по ним обновляется индекс
+        # зависимостей.
+        for index_name, ids in targets.items():
+            if not ids:
+                continue
+            keep = entities[index_name] if self.partial_updates else set()
+            docs = self._reindex(index_name, ids, keep)
+            if docs:
+                self._patch_copies(index_name, docs, targets)
+
+    @staticmethod
+    def _changed_entities(changes: Iterable[tuple]) -> dict[str, set[str]]:
+        """Id измененных сущностей (не связей) по индексам."""
+        entities = {index.value: set() for index in IndexName}
+        indexes = {
+            "film_work": IndexName.movies.value,
+            "genre": IndexName.genres.value,
+            "person": IndexName.persons.value,
+        }
+        for entity, entity_id, _ in changes:
+            if entity in indexes:
+                entities[indexes[entity]].add(entity_id)
+        return entities
+
+    def _dependents(self, index_name: str, ids: Iterable[str]) -> set[str]:
+        """Документы, содержащие вложенные копии документов индекса."""
+        if index_name == IndexName.movies.value:
+            return self.dependencies.persons_for_films(ids)
+        if index_name == IndexName.genres.value:
+            return self.dependencies.films_for_genres(ids)
+        return self.dependencies.films_for_persons(ids)
+
+    def _resolve_targets(
+        self, changes: Iterable[tuple]
+    ) -> dict[str, set[str]]:
+        """
+        Определение документов, затронутых изменениями вида
+        (таблица, entity_id, related_id).
+        """
+        changes = list(changes)
+        entities = self._changed_entities(changes)
+        targets = {index: set(ids) for index, ids in entities.items()}
+        for entity, entity_id, related_id in changes:
+            if entity == "genre_film_work":
+                targets[IndexName.movies.value].add(entity_id)
+            elif entity == "person_film_work":
+                targets[IndexName.movies.value].add(entity_id)
+                targets[IndexName.persons.value].add(related_id)
+        if not self.partial_updates:
+            for index_name, ids in entities.items():
+                copies_index = NESTED_COPIES[index_name][0]
+                targets[copies_index] |= self._dependents(index_name, ids)
+        return {
+            index.value: targets[index.value]
+            for index in (
+                IndexName.movies,
+                IndexName.genres,
+                IndexName.persons,
+            )
+        }
+
+    def _reindex(
+        self, index_name: str, ids: set[str], keep: set[str] = frozenset()
+    ) -> list[dict]:
+        """
+        Пересборка документов по id и удаление исчезнувших. Возвращает
+        документы с id из keep.
+        """
+        sql_request, model = INDEX_SOURCES[index_name]
+        found = set()
+        kept = []
+
+        def batches():
+            extracted = self.extractor.extract_by_ids(sql_request, list(ids))
+            while True:
+                started = perf_counter()
+                if (rows := next(extracted, None)) is None:
+                    return
+                record_extract(index_name, rows, perf_counter() - started)
+                found.update(row["uuid"] for row in rows)
+                data = self._transform(index_name, rows, model)
+                if index_name == IndexName.movies.value:
+                    self.dependencies.update_from_documents(data)
+                kept.extend(doc for doc in data if str(doc["uuid"]) in keep)
+                yield data, None
+
+        for _ in self.loader.load_stream(index_name, batches()):
+            pass
+        if missing := ids - found:
+            self.loader.delete(index_name, missing)
+            if index_name == IndexName.movies.value:
+                for film_id in missing:
+                    self.dependencies.remove_film(film_id)
+        return kept
+
+    def _patch_copies(
+        self,
+        index_name: str,
+        docs: list[dict],
+        targets: dict[str, set[str]],
+    ) -> None:
+        """
+        Обновление вложенных копий документов индекса в зависимых
+        документах. Документы, пересобираемые целиком, пропускаются.
+        """
+        copies_index, fields, values = NESTED_COPIES[index_name]
+        entities = {}
+        patches = defaultdict(dict)
+        for doc in docs:
+            entity_id = str(doc["uuid"])
+            dependents = (
+                self._dependents(index_name, [entity_id])
+                - targets[copies_index]
+            )
+            if not dependents:
+                continue
+            entities[entity_id] = {field: doc[field] for field in values}
+            for doc_id in dependents:
+                patches[doc_id][entity_id] = entities[entity_id]
+        if not patches:
+            return
+        if len(patches) >= PARTIAL_UPDATE_BY_QUERY_THRESHOLD:
+            self.loader.patch_nested_by_query(copies_index, fields, entities)
+        else:
+            self.loader.patch_nested(copies_index, fields, patches)
+        logger.info(
+            f"Индекс {copies_index}: обновлены вложенные копии в "
+            f"{len(patches)} документах."
+        )
+
+
+class ChangeDataCaptureETL(IncrementalETL):
+    """
+    ETL на основе захвата изменений. Триггеры Postgres записывают id
+    измененных строк в очередь content.etl_changes и отправляют NOTIFY.
+    ETL пересобирает только затронутые и зависимые документы. Без изменений
+    ETL ждет уведомления и не нагружает БД.
+    """
+
+    def __init__(
+        self,
+        extractor: PostgresExtractor,
+        transformer: Transformer,
+        loader: ElasticsearchLoader,
+        batch_size: int = CHANGES_BATCH_SIZE,
+        dependencies: DependencyIndex | None = None,
+    ) -> None:
+        super().__init__(
+            extractor, transformer, loader, batch_size, dependencies
+        )
+        self.listener = PostgresConnect()
+
+    def setup(self) -> None:
+        """
+        Установка очереди и триггеров, построение индекса зависимостей и
+        догоняющая синхронизация изменений, сделанных до установки триггеров.
+        """
+        connection = self.changes.connection
+        with connection.cursor() as cursor:
+            cursor.execute(SQL_CDC_SETUP)
+        connection.commit()
+        self._listen()
+        super().setup()
+        self._sync_tables()
+        logger.info("Захват изменений Postgres включен.")
+
+    def run(self) -> None:
+        """Обработка накопленных изменений."""
+        try:
+            if not self._ready:
+                self.setup()
+                self._ready = True
+            while self._sync_changes():
+                pass
+        except Exception as e:
+            logger.error(f"Ошибка выполнения ETL: {e}")
+
+    @backoff()
+    def wait(self) -> None:
+        """Ожидание NOTIFY об изменениях, но не дольше REPEAT_TIME."""
+        connection = self._listen()
+        if select.select([connection], [], [], REPEAT_TIME) != ([], [], []):
+            connection.poll()
+            connection.notifies.clear()
+
+    def _listen(self):
+        """Подключение для LISTEN (переподписка после переподключения)."""
+        connection = self.listener.connection
+        if not connection.autocommit:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CDC_CHANNEL};")
+        return connection
+
+    def _sync_changes(self) -> bool:
+        """
+        Переиндексация документов по очередной пачке изменений. Изменения
+        удаляются из очереди после загрузки. Возвращает False, если очередь
+        пуста.
+        """
+        connection = self.changes.connection
+        with connection.cursor() as cursor:
+            cursor.execute(SQL_CDC_FETCH, {"limit": self.batch_size})
+            changes = cursor.fetchall()
+        connection.commit()
+        if not changes:
+            return False
+        self._reindex_targets(
+            (entity, entity_id, related_id)
+            for _, entity, entity_id, related_id in changes
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                SQL_CDC_DELETE, {"ids": [change[0] for change in changes]}
+            )
+        connection.commit()
+        logger.info(f"Обработано изменений: {len(changes)}.")
+        return True
+
+
 @backoff()
 def create_elasticsearch_client(host, port) -> Elasticsearch:
     """Создание и перезапуск соединения с elasticsearch."""
@@ -266,13 +1434,48 @@ def create_elasticsearch_client(host, port) -> Elasticsearch:
 
 if __name__ == "__main__":
     client = create_elasticsearch_client(host=ES_HOST, port=ES_PORT)
-    etl = ETL(
+    etl_class = {
+        "sequential": ETL,
+        "pipeline": PipelinedETL,
+        "incremental": IncrementalETL,
+        "cdc": ChangeDataCaptureETL,
+    }.get(ETL_MODE, PipelinedETL)
+    loader_class = {
+        "bulk": ElasticsearchLoader,
+        "streaming": StreamingElasticsearchLoader,
+        "partial": PartialUpdateElasticsearchLoader,
+    }.get(LOADER_MODE, StreamingElasticsearchLoader)
+    etl = etl_class(
         extractor=PostgresExtractor(chunk_size=CHUNK_SIZE),
         transformer=Transformer(),
-        loader=ElasticsearchLoader(
+        loader=loader_class(
             client=client,
+            publisher=ChangePublisher(
+                redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+            )
+            if CACHE_INVALIDATION
+            else None,
         ),
     )
+    if stale := [
+        alias
+        for alias in INDEX_SOURCES
+        if ETL_FULL_REINDEX or etl.loader.needs_rebuild(alias)
+    ]:
+        etl.rebuild(stale)
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
+    profile_cycle = ETL_PROFILE
     while True:
-        etl.run()
-        sleep(REPEAT_TIME)
+        started = perf_counter()
+        if profile_cycle:
+            profile(etl.run, ETL_PROFILE_FILE)
+            profile_cycle = False
+        else:
+            etl.run()
+        metrics.set("etl_cycle_seconds", {}, perf_counter() - started)
+        if METRICS_FILE:
+            metrics.write_textfile(METRICS_FILE)
+        if ETL_RUN_ONCE:
+            break
+        etl.wait()
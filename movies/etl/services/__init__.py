@@ -1,6 +1,8 @@
 from .backoff import backoff
 from .logging import setup_logging
+from .metrics import Metrics
 from .storage import get_states
 
 states = get_states()
+metrics = Metrics()
 setup_logging()
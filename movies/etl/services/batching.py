@@ -0,0 +1,45 @@
+"""Адаптивный размер пачек для загрузки в Elasticsearch."""
+
+
+class AdaptiveChunkSize:
+    """
+    Размер пачки, подстраивающийся под время ответа Elasticsearch и объем
+    пачки в байтах.
+
+    Если пачка обработана быстрее половины целевого времени - размер
+    увеличивается в полтора раза, если медленнее целевого времени -
+    уменьшается пропорционально превышению. Кроме того, число документов
+    не превышает целевого объема target_bytes при среднем размере
+    документа последней пачки: при крупных документах пачки короче.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        target_latency: float,
+        target_bytes: int | None = None,
+    ) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.target_bytes = target_bytes
+        self.value = min(max(initial, minimum), maximum)
+
+    def update(self, docs: int, latency: float, size: int = 0) -> int:
+        """
+        Пересчет размера пачки по результату загрузки очередной пачки из
+        docs документов объемом size байт.
+        """
+        # Неполная пачка (конец выборки) не показательна.
+        if docs < self.value:
+            return self.value
+        if latency > self.target_latency:
+            self.value = int(self.value * self.target_latency / latency)
+        elif latency < self.target_latency / 2:
+            self.value = int(self.value * 1.5) + 1
+        if self.target_bytes and size:
+            self.value = min(self.value, self.target_bytes * docs // size)
+        self.value = min(max(self.value, self.minimum), self.maximum)
+        return self.value
@@ -0,0 +1,42 @@
+"""Публикация изменений индексов для сброса кэша API."""
+
+import json
+import logging
+from typing import Iterable
+
+from redis import Redis
+from redis.exceptions import RedisError
+
+from services import metrics
+from settings import CACHE_INVALIDATION_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+
+class ChangePublisher:
+    """
+    Публикация id измененных документов в канал Redis, по которым API
+    сбрасывает кэш карточек и списков индекса. Ошибка публикации не
+    останавливает ETL: кэш API в этом случае устареет по времени.
+    """
+
+    def __init__(
+        self, client: Redis, channel: str = CACHE_INVALIDATION_CHANNEL
+    ) -> None:
+        self.client = client
+        self.channel = channel
+
+    def publish(self, index_name: str, ids: Iterable[str] | None) -> None:
+        """Публикация изменений индекса (None - изменен весь индекс)."""
+        message = json.dumps(
+            {"index": index_name, "ids": None if ids is None else list(ids)}
+        )
+        try:
+            self.client.publish(self.channel, message)
+        except RedisError as e:
+            metrics.inc(
+                "etl_cache_invalidation_failures_total", {"index": index_name}
+            )
+            logger.error(
+                f"Ошибка публикации изменений индекса {index_name}: {e}"
+            )
@@ -0,0 +1,93 @@
+"""Индекс зависимостей документов Elasticsearch от сущностей Postgres."""
+from collections import defaultdict
+from typing import Iterable
+
+
+class DependencyIndex:
+    """
+    Связи фильм-жанр и фильм-персона в памяти ETL.
+
+    Позволяет по измененным жанрам и персонам найти зависимые фильмы, а по
+    измененным фильмам - зависимые персоны, не агрегируя весь каталог в
+    Postgres. Стоимость поиска пропорциональна числу зависимых документов.
+    """
+
+    def __init__(self) -> None:
+        self.genres_by_film: dict[str, set[str]] = defaultdict(set)
+        self.persons_by_film: dict[str, set[str]] = defaultdict(set)
+        self.films_by_genre: dict[str, set[str]] = defaultdict(set)
+        self.films_by_person: dict[str, set[str]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self.genres_by_film.keys() | self.persons_by_film.keys())
+
+    def add_genre_link(self, film_id: str, genre_id: str) -> None:
+        """Добавление связи фильм-жанр."""
+        self.genres_by_film[film_id].add(genre_id)
+        self.films_by_genre[genre_id].add(film_id)
+
+    def add_person_link(self, film_id: str, person_id: str) -> None:
+        """Добавление связи фильм-персона."""
+        self.persons_by_film[film_id].add(person_id)
+        self.films_by_person[person_id].add(film_id)
+
+    def update_film(
+        self,
+        film_id: str,
+        genre_ids: Iterable[str],
+        person_ids: Iterable[str],
+    ) -> None:
+        """Замена всех связей фильма актуальными."""
+        self.remove_film(film_id)
+        for genre_id in genre_ids:
+            self.add_genre_link(film_id, genre_id)
+        for person_id in person_ids:
+            self.add_person_link(film_id, person_id)
+
+    def update_from_documents(self, documents: Iterable[dict]) -> None:
+        """Обновление связей по документам индекса movies."""
+        for doc in documents:
+            self.update_film(
+                str(doc["uuid"]),
+                (str(genre["uuid"]) for genre in doc["genre"] or []),
+                (
+                    str(person["uuid"])
+                    for role in ("actors", "writers", "directors")
+                    for person in doc[role] or []
+                ),
+            )
+
+    def remove_film(self, film_id: str) -> None:
+        """Удаление всех связей фильма."""
+        for genre_id in self.genres_by_film.pop(film_id, ()):
+            self._discard(self.films_by_genre, genre_id, film_id)
+        for person_id in self.persons_by_film.pop(film_id, ()):
+            self._discard(self.films_by_person, person_id, film_id)
+
+    def films_for_genres(self, genre_ids: Iterable[str]) -> set[str]:
+        """Фильмы с указанными жанрами."""
+        return self._collect(self.films_by_genre, genre_ids)
+
+    def films_for_persons(self, person_ids: Iterable[str]) -> set[str]:
+        """Фильмы с участием указанных персон."""
+        return self._collect(self.films_by_person, person_ids)
+
+    def persons_for_films(self, film_ids: Iterable[str]) -> set[str]:
+        """Персоны, участвовавшие в указанных фильмах."""
+        return self._collect(self.persons_by_film, film_ids)
+
+    @staticmethod
+    def _collect(mapping: dict[str, set[str]], ids: Iterable[str]) -> set[str]:
+        result = set()
+        for key in ids:
+            result |= mapping.get(key, set())
+        return result
+
+    @staticmethod
+    def _discard(mapping: dict[str, set[str]], key: str, value: str) -> None:
+        values = mapping.get(key)
+        if values is None:
+            return
+        values.discard(value)
+        if not values:
+            del mapping[key]
@@ -0,0 +1,196 @@
+"""Метрики ETL в текстовом формате Prometheus."""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+from settings import METRICS_BUCKETS, PROFILE_TOP
+
+logger = logging.getLogger(__name__)
+
+# Описание метрик: имя -> (тип, описание).
+METRICS = {
+    "etl_rows_extracted_total": (
+        "counter",
+        "Строк выбрано из Postgres.",
+    ),
+    "etl_documents_indexed_total": (
+        "counter",
+        "Документов загружено в Elasticsearch.",
+    ),
+    "etl_bulk_failures_total": (
+        "counter",
+        "Документов, отклоненных Elasticsearch при загрузке.",
+    ),
+    "etl_stage_seconds": (
+        "histogram",
+        "Время обработки пачки стадией ETL (extract, transform, load).",
+    ),
+    "etl_lag_seconds": (
+        "gauge",
+        "Отставание индекса: время загрузки минус modified последней строки.",
+    ),
+    "etl_cycle_seconds": (
+        "gauge",
+        "Длительность последнего цикла ETL.",
+    ),
+    "etl_cache_invalidation_failures_total": (
+        "counter",
+        "Неудачные публикации изменений индекса для сброса кэша API.",
+    ),
+}
+
+
+class Metrics:
+    """Потокобезопасный реестр счетчиков, гистограмм и значений."""
+
+    def __init__(self, buckets: tuple[float, ...] = METRICS_BUCKETS) -> None:
+        self.buckets = buckets
+        self._values: dict[tuple, float] = {}
+        self._histograms: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: dict[str, str]) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, labels: dict[str, str], value: float = 1) -> None:
+        """Увеличение счетчика."""
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name: str, labels: dict[str, str], value: float) -> None:
+        """Установка значения."""
+        with self._lock:
+            self._values[self._key(name, labels)] = value
+
+    def observe(self, name: str, labels: dict[str, str], value: float) -> None:
+        """Добавление наблюдения в гистограмму."""
+        key = self._key(name, labels)
+        with self._lock:
+            # Счетчики по корзинам, сумма и количество наблюдений.
+            histogram = self._histograms.setdefault(
+                key, [[0] * len(self.buckets), 0.0, 0]
+            )
+            position = bisect_left(self.buckets, value)
+            if position < len(self.buckets):
+                histogram[0][position] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextmanager
+    def time(self, name: str, labels: dict[str, str]):
+        """Замер времени блока в гистограмму."""
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, labels, perf_counter() - started)
+
+    def render(self) -> str:
+        """Метрики в текстовом формате Prometheus."""
+        lines = []
+        with self._lock:
+            for name, (kind, description) in METRICS.items():
+                lines += [
+                    f"# HELP {name} {description}",
+                    f"# TYPE {name} {kind}",
+                ]
+                for (metric, labels), value in sorted(self._values.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_labels(labels)} {value}")
+                for (metric, labels), histogram in sorted(
+                    self._histograms.items()
+                ):
+                    if metric == name:
+                        lines += self._render_histogram(
+                            name, labels, histogram
+                        )
+        return "\n".join(lines) + "\n"
+
+    def _render_histogram(
+        self, name: str, labels: tuple, histogram: list
+    ) -> list[str]:
+        counts, total, count = histogram
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(
+                f"{name}_bucket{_labels(labels, le=bound)} {cumulative}"
+            )
+        lines += [
+            f"{name}_bucket{_labels(labels, le='+Inf')} {count}",
+            f"{name}_sum{_labels(labels)} {total}",
+            f"{name}_count{_labels(labels)} {count}",
+        ]
+        return lines
+
+    def write_textfile(self, file_path: str) -> None:
+        """
+        Атомарная запись метрик в файл для textfile collector
+        node_exporter.
+        """
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, "w") as file:
+            file.write(self.render())
+        os.replace(tmp_path, file_path)
+
+    def serve(self, port: int) -> ThreadingHTTPServer:
+        """Запуск HTTP-сервера с метриками в отдельном потоке."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header(
+                    "Content-Type", "text/plain; version=0.0.4; charset=utf-8"
+                )
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        server = ThreadingHTTPServer(("", port), Handler)
+        threading.Thread(
+            target=server.serve_forever, name="metrics", daemon=True
+        ).start()
+        logger.info(f"Метрики доступны на порту {port}.")
+        return server
+
+
+def _labels(labels: tuple, **extra) -> str:
+    """Метки метрики в формате Prometheus."""
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+def profile(func, file_path: str) -> None:
+    """
+    Выполнение func под cProfile. Статистика сохраняется в file_path для
+    pstats/snakeviz, самые затратные вызовы выводятся в лог. cProfile видит
+    только текущий поток: потоки конвейера лучше смотреть через py-spy.
+    """
+    profiler = cProfile.Profile()
+    profiler.runcall(func)
+    profiler.dump_stats(file_path)
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(
+        PROFILE_TOP
+    )
+    logger.info(
+        f"Профиль цикла ETL сохранен в {file_path}:\n{stream.getvalue()}"
+    )
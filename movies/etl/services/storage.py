@@ -2,16 +2,69 @@
 import json
 import logging
 import os
+import threading
+from abc import ABC, abstractmethod
 from json import JSONDecodeError
 from typing import Any, Dict
 
 from models import IndexName
-from settings import START_SYNC_TIME, STATE_STORAGE_FILE
+from settings import (
+    START_SYNC_TIME,
+    START_SYNC_UUID,
+    STATE_COMPACT_MIN_BYTES,
+    STATE_STORAGE_BACKEND,
+    STATE_STORAGE_FILE,
+    STATE_STORAGE_LOG,
+)
 
 logger = logging.getLogger(__name__)
 
 
-class JsonFileStorage:
+class BaseStorage(ABC):
+    """Абстрактный класс-интерфейс для хранилищ состояний."""
+
+    @abstractmethod
+    def save_state(
+        self,
+        state: Dict[str, Any],
+        appends: Dict[str, list] | None = None,
+    ) -> None:
+        """Сохранить изменения состояния в хранилище.
+
+        :param state: ключи, значения которых нужно заменить
+        :param appends: ключи-списки и значения, дописываемые в их конец
+        """
+
+    @abstractmethod
+    def retrieve_state(self) -> Dict[str, Any]:
+        """Получить состояние из хранилища."""
+
+
+def _fsync_write(file_path: str, data: str) -> None:
+    """Атомарная запись файла: временный файл, fsync и переименование."""
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "w") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, file_path)
+
+
+def _apply_changes(
+    current_state: Dict[str, Any],
+    state: Dict[str, Any],
+    appends: Dict[str, list] | None,
+) -> Dict[str, Any]:
+    """Применение изменений к состоянию."""
+    current_state.update(state)
+    for key, values in (appends or {}).items():
+        if not isinstance(current_state.get(key), list):
+            current_state[key] = []
+        current_state[key].extend(values)
+    return current_state
+
+
+class JsonFileStorage(BaseStorage):
     """Реализация хранилища, использующего локальный файл.
     Формат хранения: JSON
     """
@@ -20,12 +73,16 @@ class JsonFileStorage:
         self.file_path = file_path
         # Проверяем наличие файла состояний, создаем его, если отсутствует.
         if not os.path.exists(file_path):
-            self.save_state({})
+            _fsync_write(file_path, json.dumps({}))
 
-    def save_state(self, state: Dict[str, Any]) -> None:
-        """Сохранить состояние в хранилище."""
-        with open(self.file_path, "w") as file:
-            json.dump(state, file)
+    def save_state(
+        self,
+        state: Dict[str, Any],
+        appends: Dict[str, list] | None = None,
+    ) -> None:
+        """Сохранить состояние в хранилище (перезапись всего файла)."""
+        current_state = _apply_changes(self.retrieve_state(), state, appends)
+        _fsync_write(self.file_path, json.dumps(current_state))
 
     def retrieve_state(self) -> Dict[str, Any]:
         """Получить состояние из хранилища."""
@@ -40,31 +97,165 @@ class JsonFileStorage:
         return json_object
 
 
+class AppendOnlyLogStorage(BaseStorage):
+    """Хранилище состояний в виде журнала, доступного только на дозапись.
+
+    Каждый коммит - одна строка JSON вида
+    {"set": {ключ: значение}, "append": {ключ: [значения]}}, записанная с
+    fsync, поэтому стоимость коммита зависит только от размера изменений.
+    Когда объём записей после последнего снимка превышает размер снимка
+    (но не меньше compact_min_bytes), журнал сжимается в одну строку с
+    полным состоянием - так сжатие обходится в O(1) на запись в среднем.
+    Недописанная последняя строка (падение процесса во время записи) при
+    чтении отбрасывается.
+    """
+
+    def __init__(self, file_path: str, compact_min_bytes: int) -> None:
+        self.file_path = file_path
+        self.compact_min_bytes = compact_min_bytes
+        self._state = self._replay()
+        self._snapshot_bytes = (
+            os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        )
+        self._log_bytes = 0
+        self._file = open(self.file_path, "a")
+
+    def _replay(self) -> Dict[str, Any]:
+        """Восстановление состояния проигрыванием журнала.
+
+        Повреждённый хвост журнала обрезается, чтобы новые записи не
+        склеивались с недописанной строкой.
+        """
+        state = {}
+        if not os.path.exists(self.file_path):
+            return state
+        valid_bytes = 0
+        with open(self.file_path, "rb") as file:
+            for line_number, line in enumerate(file, start=1):
+                try:
+                    record = json.loads(line)
+                except JSONDecodeError:
+                    logger.error(
+                        f"Повреждена запись {line_number} журнала "
+                        f"{self.file_path}, последующие записи пропущены."
+                    )
+                    break
+                _apply_changes(
+                    state, record.get("set", {}), record.get("append")
+                )
+                valid_bytes += len(line)
+        if valid_bytes < os.path.getsize(self.file_path):
+            os.truncate(self.file_path, valid_bytes)
+        return state
+
+    def save_state(
+        self,
+        state: Dict[str, Any],
+        appends: Dict[str, list] | None = None,
+    ) -> None:
+        """Дописать изменения состояния в журнал."""
+        record = {"set": state}
+        if appends:
+            record["append"] = appends
+        line = json.dumps(record) + "\n"
+        self._file.write(line)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        # Копия через JSON, чтобы не разделять списки с вызывающим кодом.
+        record = json.loads(line)
+        _apply_changes(self._state, record["set"], record.get("append"))
+        self._log_bytes += len(line)
+        if self._log_bytes >= max(
+            self._snapshot_bytes, self.compact_min_bytes
+        ):
+            self.compact()
+
+    def compact(self) -> None:
+        """Сжатие журнала до одной записи с полным состоянием."""
+        self._file.close()
+        snapshot = json.dumps({"set": self._state}) + "\n"
+        _fsync_write(self.file_path, snapshot)
+        self._file = open(self.file_path, "a")
+        self._snapshot_bytes = len(snapshot)
+        self._log_bytes = 0
+
+    def retrieve_state(self) -> Dict[str, Any]:
+        """Получить состояние из хранилища."""
+        return json.loads(json.dumps(self._state))
+
+
 class State:
-    """Класс для работы с состояниями."""
+    """Класс для работы с состояниями.
 
-    def __init__(self, storage: JsonFileStorage) -> None:
+    Состояние хранится в памяти, изменения копятся до вызова commit и
+    сохраняются в хранилище одной пачкой. Методы потокобезопасны.
+    """
+
+    def __init__(self, storage: BaseStorage) -> None:
         self.storage = storage
+        self._state = storage.retrieve_state()
+        self._pending = {}
+        self._pending_appends = {}
+        self._lock = threading.RLock()
 
     def set_state(self, key: str, value: Any) -> None:
         """Установить состояние для определённого ключа."""
-        current_state = self.storage.retrieve_state()
-        current_state[key] = value
-        self.storage.save_state(current_state)
+        with self._lock:
+            self._state[key] = value
+            self._pending[key] = value
+            self._pending_appends.pop(key, None)
+
+    def extend_state(self, key: str, values: list) -> None:
+        """Дописать значения в конец списка, хранящегося по ключу."""
+        with self._lock:
+            if not isinstance(self._state.get(key), list):
+                self.set_state(key, [])
+            self._state[key].extend(values)
+            # Список, заданный через set_state в этом коммите, уже лежит в
+            # _pending тем же объектом и будет сохранён целиком.
+            if key in self._pending:
+                return
+            self._pending_appends.setdefault(key, []).extend(values)
+
+    def save_checkpoint(self, values: Dict[str, Any]) -> None:
+        """Атомарно установить несколько ключей и сохранить изменения."""
+        with self._lock:
+            for key, value in values.items():
+                self.set_state(key, value)
+            self.commit()
 
     def get_state(self, key: str) -> Any:
         """Получить состояние по определённому ключу."""
-        current_state = self.storage.retrieve_state()
-        return current_state.get(key, None)
+        return self._state.get(key, None)
+
+    def commit(self) -> None:
+        """Сохранить накопленные изменения в хранилище."""
+        with self._lock:
+            if not self._pending and not self._pending_appends:
+                return
+            self.storage.save_state(self._pending, self._pending_appends)
+            self._pending = {}
+            self._pending_appends = {}
+
+
+def get_storage() -> BaseStorage:
+    """Выбор хранилища состояний согласно настройкам."""
+    if STATE_STORAGE_BACKEND == "json":
+        return JsonFileStorage(STATE_STORAGE_FILE)
+    return AppendOnlyLogStorage(STATE_STORAGE_LOG, STATE_COMPACT_MIN_BYTES)
 
 
 def get_states():
     """функция инициации хранилища."""
-    storage = JsonFileStorage(STATE_STORAGE_FILE)
-    states = State(storage)
+    states = State(get_storage())
     for index in IndexName:
-        states.set_state(
-            f"last_{index.value}_indexed_modified_at", START_SYNC_TIME
-        )
-        states.set_state(f"{index.value}_ids", [])
+        if states.get_state(f"last_{index.value}_indexed_modified_at") is None:
+            states.set_state(
+                f"last_{index.value}_indexed_modified_at", START_SYNC_TIME
+            )
+        if states.get_state(f"last_{index.value}_indexed_uuid") is None:
+            states.set_state(
+                f"last_{index.value}_indexed_uuid", START_SYNC_UUID
+            )
+    states.commit()
     return states
@@ -2,12 +2,35 @@
 
 import os
 
-# Время между опросами изменений.
+# Время между опросами изменений (в режиме "cdc" - максимальное время
+# ожидания уведомления).
 REPEAT_TIME = 30
 
+# Хранилище состояний: "log" - журнал с дозаписью, "json" - JSON-файл.
+STATE_STORAGE_BACKEND = os.environ.get("STATE_STORAGE_BACKEND", "log")
 # Файл состояний.
 STATE_STORAGE_FILE = "states.json"
+# Журнал состояний и минимальный объём записей до его сжатия, байт.
+STATE_STORAGE_LOG = "states.log"
+STATE_COMPACT_MIN_BYTES = 1024 * 1024
 START_SYNC_TIME = "1900-01-01 00:00:00.000000"
+START_SYNC_UUID = "00000000-0000-0000-0000-000000000000"
+
+# Метрики в формате Prometheus: файл для textfile collector node_exporter
+# (перезаписывается после каждого цикла, пустое значение - отключить) и
+# порт HTTP-эндпоинта (0 - отключить).
+METRICS_FILE = os.environ.get("METRICS_FILE", "metrics.prom")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+# Границы корзин гистограмм времени стадий, секунд.
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Профилирование: первый цикл выполняется под cProfile, статистика
+# сохраняется в ETL_PROFILE_FILE. ETL_RUN_ONCE завершает ETL после одного
+# цикла - удобно для py-spy record -- python load_data.py.
+ETL_PROFILE = os.environ.get("ETL_PROFILE", "false") == "true"
+ETL_PROFILE_FILE = os.environ.get("ETL_PROFILE_FILE", "etl.prof")
+ETL_RUN_ONCE = os.environ.get("ETL_RUN_ONCE", "false") == "true"
+PROFILE_TOP = 30  # Число строк профиля, выводимых в лог.
 
 # Параметры логгирования.
 LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
@@ -25,22 +48,22 @@ DSL = {
     "options": "-c search_path=content",
 }
 
+# Запросы возвращают строки в форме документов индексов: вложенные списки
+# собираются в Postgres как jsonb, а не склейкой строк.
 SQL_REQUEST_FILMWORKS = """
 SELECT fw.id AS uuid,
-fw.rating AS imdb_rating,
-json_object_agg(DISTINCT g.id, g.name) AS genres,
+NULLIF(fw.rating, 0) AS imdb_rating,
+COALESCE(jsonb_agg(DISTINCT jsonb_build_object('uuid', g.id, 'name', g.name))
+FILTER (WHERE g.id IS NOT NULL), '[]') AS genre,
 fw.title,
 fw.description,
 fw.subscribers_only,
-concat('[', string_agg(DISTINCT CASE WHEN pfw.role = 'actor' THEN
-json_build_object('uuid', p.id, 'full_name', p.full_name) #>> '{}' END, ','),
-']') AS actors,
-concat('[', string_agg(DISTINCT CASE WHEN pfw.role = 'writer' THEN
-json_build_object('uuid', p.id, 'full_name', p.full_name) #>> '{}' END, ','),
-']') AS writers,
-concat('[', string_agg(DISTINCT CASE WHEN pfw.role = 'director' THEN
-json_build_object('uuid', p.id, 'full_name', p.full_name) #>> '{}' END, ','),
-']') AS directors,
+COALESCE(jsonb_agg(DISTINCT jsonb_build_object('uuid', p.id, 'full_name',
+p.full_name)) FILTER (WHERE pfw.role = 'actor'), '[]') AS actors,
+COALESCE(jsonb_agg(DISTINCT jsonb_build_object('uuid', p.id, 'full_name',
+p.full_name)) FILTER (WHERE pfw.role = 'writer'), '[]') AS writers,
+COALESCE(jsonb_agg(DISTINCT jsonb_build_object('uuid', p.id, 'full_name',
+p.full_name)) FILTER (WHERE pfw.role = 'director'), '[]') AS directors,
 GREATEST(MAX(fw.modified), MAX(g.modified), MAX(p.modified)) AS modified
 FROM content.film_work as fw
 LEFT JOIN content.genre_film_work gfm ON fw.id = gfm.film_work_id
@@ -48,22 +71,21 @@ LEFT JOIN content.genre g ON gfm.genre_id = g.id
 LEFT JOIN content.person_film_work pfw ON fw.id = pfw.film_work_id
 LEFT JOIN content.person p ON pfw.person_id = p.id
 GROUP BY uuid
-HAVING GREATEST(MAX(fw.modified), MAX(g.modified), MAX(p.modified)) >
-%(last_indexed_modified_at)s
 """
 
 SQL_REQUEST_GENRES = """
-SELECT id AS uuid, name, description FROM content.genre
-GROUP BY uuid
-HAVING modified > %(last_indexed_modified_at)s
+SELECT id AS uuid, name, NULLIF(description, '') AS description, modified
+FROM content.genre
 """
 
+# Рейтинг в films считается тем же выражением, что и imdb_rating фильма:
+# частичное обновление копирует его из документа фильма.
 SQL_REQUEST_PERSONS = """
 SELECT p.id AS uuid, p.full_name AS full_name,
-GREATEST(MAX(fw.modified), MAX(p.modified))::TEXT as modified,
+GREATEST(MAX(fw.modified), MAX(p.modified)) as modified,
 COALESCE(json_agg(json_build_object('uuid', pfw.film_work_id, 'title',
-fw.title, 'imdb_rating', fw.rating, 'roles', replace(array_to_string(pfw.roles,
-','), ',', ', ')))::TEXT, '[]'::TEXT) AS films
+fw.title, 'imdb_rating', NULLIF(fw.rating, 0), 'roles',
+replace(array_to_string(pfw.roles, ','), ',', ', '))), '[]') AS films
 FROM content.person as p
 JOIN (SELECT person_id, film_work_id, array_remove(COALESCE(array_agg(DISTINCT
 role) FILTER (WHERE role IS NOT NULL), '{}'), NULL) AS roles FROM
@@ -71,16 +93,212 @@ content.person_film_work GROUP BY person_id, film_work_id) AS pfw
 LEFT JOIN content.film_work fw ON pfw.film_work_id = fw.id
 ON p.id = pfw.person_id
 GROUP BY p.id
-HAVING GREATEST(MAX(fw.modified), MAX(p.modified)) >
-%(last_indexed_modified_at)s
+"""
+
+# Обёртка для выборки с курсором на сервере и keyset-пагинацией по
+# (modified, uuid): продолжение с последнего сохранённого ключа вместо списка
+# уже проиндексированных id.
+SQL_KEYSET_WRAPPER = """
+SELECT * FROM ({sql_request}) AS src
+WHERE (src.modified, src.uuid) >
+(%(last_modified)s::timestamptz, %(last_uuid)s::uuid)
+ORDER BY src.modified, src.uuid
+"""
+
+# Текущее время БД: от него отсчитываются изменения таблиц после полной
+# пересборки индексов.
+SQL_NOW = "SELECT now()"
+
+# Обёртка для выборки документов по списку id.
+SQL_IDS_WRAPPER = """
+SELECT * FROM ({sql_request}) AS src
+WHERE src.uuid = ANY(%(ids)s::uuid[])
 """
 
 CHUNK_SIZE = 100  # Максимальное количество записей в пачке.
 
+# Режим ETL: "pipeline" - конвейер с параллельной загрузкой индексов,
+# "sequential" - последовательная загрузка, "incremental" - пересборка
+# только измененных и зависимых документов, "cdc" - то же по изменениям,
+# захваченным триггерами Postgres.
+ETL_MODE = os.environ.get("ETL_MODE", "pipeline")
+ETL_WORKERS = 3  # Количество индексов, загружаемых параллельно.
+# Полная пересборка индексов при запуске (blue/green через псевдонимы).
+# Пересборка выполняется и без флага, если индекс создан без псевдонима или
+# его схема отличается от заданной ниже.
+ETL_FULL_REINDEX = os.environ.get("ETL_FULL_REINDEX", "false") == "true"
+PIPELINE_QUEUE_SIZE = 4  # Максимум пачек в очереди между стадиями.
+CHANGES_BATCH_SIZE = 1000  # Максимум изменений, обрабатываемых за раз.
+
+# Захват изменений (ETL_MODE="cdc"): триггеры пишут id измененных строк в
+# очередь content.etl_changes и будят ETL через LISTEN/NOTIFY.
+CDC_CHANNEL = "etl_changes"
+CDC_TABLES = (
+    "film_work",
+    "genre",
+    "person",
+    "genre_film_work",
+    "person_film_work",
+)
+
+SQL_CDC_TRIGGER = """
+CREATE OR REPLACE TRIGGER etl_capture_change
+AFTER INSERT OR UPDATE OR DELETE ON content.{table}
+FOR EACH ROW EXECUTE FUNCTION content.etl_capture_change();
+"""
+
+# Для таблиц связей entity_id - id фильма, related_id - id жанра/персоны.
+SQL_CDC_SETUP = (
+    """
+CREATE TABLE IF NOT EXISTS content.etl_changes (
+    id bigserial PRIMARY KEY,
+    entity TEXT NOT NULL,
+    entity_id uuid NOT NULL,
+    related_id uuid,
+    changed_at timestamp with time zone NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION content.etl_capture_change() RETURNS trigger AS $$
+DECLARE
+    items jsonb[] := '{}';
+    item jsonb;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        items := array_append(items, to_jsonb(NEW));
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        items := array_append(items, to_jsonb(OLD));
+    END IF;
+    FOREACH item IN ARRAY items LOOP
+        INSERT INTO content.etl_changes (entity, entity_id, related_id)
+        VALUES (
+            TG_TABLE_NAME,
+            COALESCE(item ->> 'film_work_id', item ->> 'id')::uuid,
+            COALESCE(item ->> 'genre_id', item ->> 'person_id')::uuid
+        );
+    END LOOP;
+    PERFORM pg_notify('"""
+    + CDC_CHANNEL
+    + """', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+    + "".join(SQL_CDC_TRIGGER.format(table=table) for table in CDC_TABLES)
+)
+
+SQL_CDC_FETCH = """
+SELECT id, entity, entity_id, related_id FROM content.etl_changes
+ORDER BY id LIMIT %(limit)s
+"""
+
+SQL_CDC_DELETE = """
+DELETE FROM content.etl_changes WHERE id = ANY(%(ids)s)
+"""
+
+# Инкрементальная синхронизация (ETL_MODE="incremental"): изменения
+# ищутся по каждой таблице отдельно, зависимые документы - по индексу
+# зависимостей в памяти ETL. Для таблиц связей entity_id - id фильма,
+# related_id - id жанра/персоны.
+SQL_CHANGED_ROWS = {
+    "film_work": """
+SELECT id AS uuid, modified, id AS entity_id, NULL::uuid AS related_id
+FROM content.film_work
+""",
+    "genre": """
+SELECT id AS uuid, modified, id AS entity_id, NULL::uuid AS related_id
+FROM content.genre
+""",
+    "person": """
+SELECT id AS uuid, modified, id AS entity_id, NULL::uuid AS related_id
+FROM content.person
+""",
+    "genre_film_work": """
+SELECT id AS uuid, created AS modified, film_work_id AS entity_id,
+genre_id AS related_id
+FROM content.genre_film_work
+""",
+    "person_film_work": """
+SELECT id AS uuid, created AS modified, film_work_id AS entity_id,
+person_id AS related_id
+FROM content.person_film_work
+""",
+}
+
+SQL_CHANGES_PAGE = """
+SELECT uuid, modified, entity_id, related_id FROM ({sql_request}) AS src
+WHERE (src.modified, src.uuid) >
+(%(last_modified)s::timestamptz, %(last_uuid)s::uuid)
+ORDER BY src.modified, src.uuid
+LIMIT %(limit)s
+"""
+
+SQL_DEPENDENCIES_GENRES = """
+SELECT film_work_id, genre_id FROM content.genre_film_work
+"""
+
+SQL_DEPENDENCIES_PERSONS = """
+SELECT DISTINCT film_work_id, person_id FROM content.person_film_work
+"""
+
+# Режим загрузки: "streaming" - helpers.streaming_bulk с адаптивным
+# размером пачки, "bulk" - helpers.bulk пачками по CHUNK_SIZE, "partial" -
+# streaming_bulk, а вложенные копии измененных сущностей в режимах
+# incremental и cdc обновляются скриптом без пересылки документов целиком.
+LOADER_MODE = os.environ.get("LOADER_MODE", "streaming")
+BULK_MIN_CHUNK_SIZE = 50  # Минимальный размер пачки, документов.
+BULK_MAX_CHUNK_SIZE = 5000  # Максимальный размер пачки, документов.
+BULK_MAX_CHUNK_BYTES = 10 * 1024 * 1024  # Максимальный объем пачки, байт.
+BULK_TARGET_CHUNK_BYTES = 5 * 1024 * 1024  # Целевой объем пачки, байт.
+BULK_TARGET_LATENCY = 0.5  # Целевое время загрузки одной пачки, секунд.
+BULK_MAX_RETRIES = 5  # Повторы документов, отклоненных со статусом 429.
+BULK_INITIAL_BACKOFF = 1  # Начальная пауза перед повтором, секунд.
+
+# Частичное обновление вложенных копий сущностей (LOADER_MODE=partial).
+# Скрипт обходит перечисленные вложенные поля документа и заменяет значения
+# записей с uuid из params.entities. Если ничего не изменилось, документ не
+# переиндексируется.
+PARTIAL_UPDATE_SCRIPT_ID = "etl_patch_nested"
+PARTIAL_UPDATE_SCRIPT = """
+boolean changed = false;
+for (field in params.fields) {
+  def items = ctx._source[field];
+  if (items == null) { continue; }
+  for (item in items) {
+    def values = params.entities[item.uuid];
+    if (values == null) { continue; }
+    for (entry in values.entrySet()) {
+      if (item[entry.getKey()] != entry.getValue()) {
+        item[entry.getKey()] = entry.getValue();
+        changed = true;
+      }
+    }
+  }
+}
+if (!changed) { ctx.op = 'noop'; }
+"""
+# Начиная с этого числа зависимых документов вместо пачки update
+# выполняется один update_by_query на стороне Elasticsearch.
+PARTIAL_UPDATE_BY_QUERY_THRESHOLD = 500
+
 # Параметры подключения к Elasticsearch
 ES_HOST = os.environ.get("ES_HOST", "127.0.0.1")
 ES_PORT = int(os.environ.get("ES_PORT", "9200"))
 
+# Сброс кэша API: после загрузки пачки в индекс, читаемый API, id
+# измененных документов публикуются в канал Redis.
+CACHE_INVALIDATION = os.environ.get("CACHE_INVALIDATION", "true") == "true"
+CACHE_INVALIDATION_CHANNEL = "cache:invalidate"
+REDIS_HOST = os.environ.get("REDIS_HOST", "127.0.0.1")
+REDIS_PORT = int(os.environ.get("REDIS_PORT", "6379"))
+
+# Число реплик индекса, восстанавливаемое после пересборки.
+INDEX_REPLICAS = int(os.environ.get("ES_INDEX_REPLICAS", "1"))
+# Настройки на время пересборки: без обновлений поиска и реплик.
+INDEX_REBUILD_SETTINGS = {"refresh_interval": "-1", "number_of_replicas": 0}
+# Время ожидания слияния сегментов после пересборки, секунд.
+INDEX_FORCEMERGE_TIMEOUT = 60 * 60
+
 INDEX_SETTINGS = {
     "refresh_interval": "1s",
     "analysis": {
@@ -105,11 +323,24 @@ INDEX_SETTINGS = {
                     "russian_stop",
                     "russian_stemmer",
                 ],
-            }
+            },
+            # Подсказки по началу названия: без стемминга и стоп-слов.
+            "suggest": {"tokenizer": "standard", "filter": ["lowercase"]},
         },
     },
 }
 
+# Поле подсказок (completion) для /api/v1/suggest. Параметры указаны
+# полностью, как их возвращает Elasticsearch: иначе схема индекса всегда
+# отличалась бы от заданной и индекс пересобирался бы при каждом запуске.
+SUGGEST_FIELD = {
+    "type": "completion",
+    "analyzer": "suggest",
+    "preserve_separators": True,
+    "preserve_position_increments": True,
+    "max_input_length": 50,
+}
+
 INDEX_GENRES_MAPPINGS = {
     "dynamic": "strict",
     "properties": {
@@ -135,7 +366,7 @@ INDEX_MOVIES_MAPPINGS = {
         "title": {
             "type": "text",
             "analyzer": "ru_en",
-            "fields": {"raw": {"type": "keyword"}},
+            "fields": {"raw": {"type": "keyword"}, "suggest": SUGGEST_FIELD},
         },
         "description": {"type": "text", "analyzer": "ru_en"},
         "subscribers_only": {"type": "boolean"},
@@ -173,7 +404,7 @@ INDEX_PERSONS_MAPPINGS = {
         "full_name": {
             "type": "text",
             "analyzer": "ru_en",
-            "fields": {"raw": {"type": "keyword"}},
+            "fields": {"raw": {"type": "keyword"}, "suggest": SUGGEST_FIELD},
         },
         "films": {
             "type": "nested",
@@ -0,0 +1,302 @@
+"""Тесты первого запуска инкрементального ETL (ETL_MODE=incremental).
+
+Postgres, Elasticsearch и хранилище состояний заменены объектами в памяти.
+
+Запуск из папки etl:
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+ETL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ETL_DIR not in sys.path:
+    sys.path.insert(0, ETL_DIR)
+
+NOW = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+LOADED = NOW - timedelta(hours=1)
+GENRES = ["10000000-0000-0000-0000-00000000000%d" % i for i in range(3)]
+PERSONS = ["20000000-0000-0000-0000-00000000000%d" % i for i in range(4)]
+FILMS = ["30000000-0000-0000-0000-00000000000%d" % i for i in range(6)]
+GENRE_LINKS = [(film, GENRES[i % 3]) for i, film in enumerate(FILMS)]
+PERSON_LINKS = [(film, PERSONS[i % 4]) for i, film in enumerate(FILMS)]
+
+
+def setUpModule():
+    """
+    Импорт ETL во временной папке: пакет services при импорте открывает
+    хранилище состояний и логи в текущей папке.
+    """
+    global load_data, settings, State, JsonFileStorage
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    os.makedirs("logs")
+    try:
+        import load_data
+        import settings
+        from services.storage import JsonFileStorage, State
+    finally:
+        os.chdir(cwd)
+
+
+def parse_time(value: str) -> datetime:
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment
+
+
+class Row(list):
+    """Строка выборки, доступная и по индексу, и по имени столбца."""
+
+    def __init__(self, columns: dict) -> None:
+        super().__init__(columns.values())
+        self.columns = columns
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.columns[key]
+        return super().__getitem__(key)
+
+
+class FakeCursor:
+    """Курсор, выполняющий запросы ETL к таблицам в памяти."""
+
+    def __init__(self, database: "FakeDatabase") -> None:
+        self.database = database
+        self.rows = []
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def execute(self, sql: str, params: dict | None = None) -> None:
+        if sql == settings.SQL_DEPENDENCIES_GENRES:
+            self.rows = list(GENRE_LINKS)
+        elif sql == settings.SQL_DEPENDENCIES_PERSONS:
+            self.rows = list(PERSON_LINKS)
+        else:
+            self.rows = self.database.changed_rows(sql, params)
+
+    def fetchall(self) -> list:
+        return self.rows
+
+
+class FakeDatabase:
+    """Таблицы Postgres в виде строк (uuid, modified, entity_id, related_id)."""
+
+    def __init__(self) -> None:
+        self.tables = {
+            "film_work": [(film, LOADED, film, None) for film in FILMS],
+            "genre": [(genre, LOADED, genre, None) for genre in GENRES],
+            "person": [(person, LOADED, person, None) for person in PERSONS],
+            "genre_film_work": [
+                (
+                    f"4000000{i}-0000-0000-0000-000000000000",
+                    LOADED,
+                    film,
+                    genre,
+                )
+                for i, (film, genre) in enumerate(GENRE_LINKS)
+            ],
+            "person_film_work": [
+                (
+                    f"5000000{i}-0000-0000-0000-000000000000",
+                    LOADED,
+                    film,
+                    person,
+                )
+                for i, (film, person) in enumerate(PERSON_LINKS)
+            ],
+        }
+        self.connection = self
+
+    def cursor(self, name: str | None = None) -> FakeCursor:
+        return FakeCursor(self)
+
+    def commit(self) -> None:
+        pass
+
+    def changed_rows(self, sql: str, params: dict) -> list[Row]:
+        """Выполнение SQL_CHANGES_PAGE: строки таблицы после ключа."""
+        table = next(
+            table
+            for table, sql_request in settings.SQL_CHANGED_ROWS.items()
+            if sql_request in sql
+        )
+        after = (parse_time(params["last_modified"]), params["last_uuid"])
+        rows = sorted(
+            row for row in self.tables[table] if (row[1], row[0]) > after
+        )
+        return [
+            Row(
+                {
+                    "uuid": uuid,
+                    "modified": modified,
+                    "entity_id": entity_id,
+                    "related_id": related_id,
+                }
+            )
+            for uuid, modified, entity_id, related_id in rows
+        ][: params["limit"]]
+
+
+class FakeExtractor:
+    """Выборка документов индексов: полная загрузка и по списку id."""
+
+    def __init__(self) -> None:
+        self.by_ids = []
+
+    def database_time(self) -> str:
+        return str(NOW)
+
+    def extract_data(self, sql_request: str, checkpoint_key: str):
+        rows = self._documents(sql_request, None)
+        yield (
+            rows,
+            {
+                f"{checkpoint_key}_modified_at": str(LOADED),
+                f"{checkpoint_key}_uuid": rows[-1]["uuid"],
+            },
+        )
+
+    def extract_by_ids(self, sql_request: str, ids: list[str]):
+        self.by_ids.append((sql_request, set(ids)))
+        yield self._documents(sql_request, set(ids))
+
+    @staticmethod
+    def _documents(sql_request: str, ids: set[str] | None) -> list[dict]:
+        if sql_request == settings.SQL_REQUEST_GENRES:
+            uuids = GENRES
+        elif sql_request == settings.SQL_REQUEST_PERSONS:
+            uuids = PERSONS
+        else:
+            uuids = FILMS
+        return [
+            {
+                "uuid": uuid,
+                "genre": [
+                    {"uuid": genre}
+                    for film, genre in GENRE_LINKS
+                    if film == uuid
+                ],
+                "actors": [
+                    {"uuid": person}
+                    for film, person in PERSON_LINKS
+                    if film == uuid
+                ],
+                "writers": [],
+                "directors": [],
+            }
+            for uuid in uuids
+            if ids is None or uuid in ids
+        ]
+
+
+class FakeTransformer:
+    def transform(self, rows: list, model) -> list[dict]:
+        return rows
+
+
+class FakeLoader:
+    """Загрузчик, запоминающий пересобранные и загруженные индексы."""
+
+    def __init__(self) -> None:
+        self.rebuilt = []
+        self.loaded = []
+
+    def start_rebuild(self, alias: str) -> str:
+        return f"{alias}_v1"
+
+    def finish_rebuild(self, alias: str, index_name: str) -> None:
+        self.rebuilt.append(alias)
+
+    def load_stream(self, index_name: str, batches):
+        for data, checkpoint in batches:
+            self.loaded.append((index_name, len(data)))
+            yield checkpoint
+
+    def delete(self, index_name: str, ids) -> None:
+        pass
+
+
+class IncrementalFirstRunTest(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.states = State(
+            JsonFileStorage(os.path.join(directory.name, "states.json"))
+        )
+        self.original_states = load_data.states
+        load_data.states = self.states
+        self.addCleanup(setattr, load_data, "states", self.original_states)
+        self.database = FakeDatabase()
+        self.extractor = FakeExtractor()
+        self.loader = FakeLoader()
+        self.etl = load_data.IncrementalETL(
+            extractor=self.extractor,
+            transformer=FakeTransformer(),
+            loader=self.loader,
+        )
+        self.etl.changes = self.database
+
+    def test_fresh_run_reindexes_nothing(self):
+        """Первый запуск загружает индексы один раз и ничего не догоняет."""
+        self.etl.run()
+        self.etl.run()
+
+        self.assertCountEqual(
+            self.loader.rebuilt, list(load_data.INDEX_SOURCES)
+        )
+        self.assertEqual(self.extractor.by_ids, [])
+        for table in settings.SQL_CHANGED_ROWS:
+            self.assertEqual(
+                self.states.get_state(f"last_{table}_changed_modified_at"),
+                str(NOW),
+            )
+
+    def test_changes_after_rebuild_start_are_synced(self):
+        """Изменения, сделанные после начала пересборки, догоняются."""
+        genre = GENRES[0]
+        self.database.tables["genre"][0] = (
+            genre,
+            NOW + timedelta(seconds=1),
+            genre,
+            None,
+        )
+
+        self.etl.run()
+
+        reindexed = {
+            sql_request: ids for sql_request, ids in self.extractor.by_ids
+        }
+        self.assertEqual(reindexed[settings.SQL_REQUEST_GENRES], {genre})
+        self.assertEqual(
+            reindexed[settings.SQL_REQUEST_FILMWORKS],
+            {film for film, linked in GENRE_LINKS if linked == genre},
+        )
+        self.assertNotIn(settings.SQL_REQUEST_PERSONS, reindexed)
+
+    def test_resumed_rebuild_keeps_its_start_time(self):
+        """Продолжаемая пересборка отсчитывает изменения от своего начала."""
+        started = str(NOW - timedelta(minutes=30))
+        self.states.save_checkpoint({"rebuild_movies_v1_started_at": started})
+
+        self.etl.rebuild()
+
+        self.assertEqual(
+            self.states.get_state("last_genre_changed_modified_at"), started
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
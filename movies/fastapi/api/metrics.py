@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from core.metrics import metrics
+
+router = APIRouter()
+
+
+@router.get("", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics_view() -> str:
+    """Метрики процесса API в формате Prometheus."""
+    return metrics.render()
@@ -1,32 +1,58 @@
 from http import HTTPStatus
 from uuid import UUID
 
+from core.cache import add_request_tags, index_tags
+from core.catalogue import Catalogue, get_catalogue
 from core.config import settings
 from core.enum import (
     APICommonDescription,
+    APIFilmBatchDescription,
     APIFilmByUUIDDescription,
     APIFilmMainDescription,
     APIFilmSearchDescription,
     ErrorMessage,
+    IndexName,
 )
+from api.v1.pagination import get_page
+from core.es_queries import nested_terms_facet, range_facet, terms_facet
+from core.routing import CachedResponseRoute
 from core.service import CommonService
-from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request
-from models.film import Film, FilmShort
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Response
+from models.film import (
+    FacetBucket,
+    Film,
+    FilmFacetCounts,
+    FilmFacets,
+    FilmSearchPage,
+    FilmShort,
+    GenreFacetBucket,
+)
+from models.genre import GenreShort
+from schemas.batch import BatchRequest
+from schemas.token import AccessTokenPayload
 from services.film import get_film_service
+from services.genre import get_genre_service
 from util.JWT_helper import security_jwt
 
-router = APIRouter()
+router = APIRouter(route_class=CachedResponseRoute)
+
+# Агрегации фасетов поиска фильмов
+FILM_FACETS = {
+    "genre": nested_terms_facet("genre.uuid", settings.FACET_MAX_VALUES),
+    "rating": range_facet("imdb_rating", settings.FACET_RATING_BOUNDS),
+    "subscribers_only": terms_facet("subscribers_only", 2),
+}
 
 
 @router.get(
     "/search",
-    response_model=list[FilmShort],
+    response_model=list[FilmShort] | FilmSearchPage,
     summary=APIFilmSearchDescription.summary,
     description=APIFilmSearchDescription.description,
     response_description=APIFilmSearchDescription.response_description,
 )
 async def film_short_list(
-    request: Request,
+    response: Response,
     query: str = Query(None, description=APICommonDescription.query),
     page_number: int = Query(
         1, description=APICommonDescription.page_number, ge=1
@@ -36,29 +62,91 @@ async def film_short_list(
         description=APICommonDescription.page_size,
         ge=1,
     ),
+    genre_uuid: UUID = Query(
+        None, description=APICommonDescription.genre, alias="genre"
+    ),
+    facets: bool = Query(False, description=APICommonDescription.facets),
+    cursor: str = Query(None, description=APICommonDescription.cursor),
     service: CommonService = Depends(get_film_service),
-) -> list[FilmShort]:
+    genre_service: CommonService = Depends(get_genre_service),
+    catalogue: Catalogue = Depends(get_catalogue),
+) -> list[FilmShort] | FilmSearchPage:
     """
     Поиск кинопроизведений с использованием Elasticsearch (или кеша Redis).
 
     :param query: Строка запроса для поиска фильмов.
     :param page_number: Номер страницы (начиная с 1).
     :param page_size: Количество элементов на странице.
+    :param genre: Фильтр фильмов по id жанра.
+    :param facets: Вернуть страницу вместе с фасетами, посчитанными в том
+        же запросе к Elasticsearch.
+    :param cursor: Курсор страницы вместо ее номера.
     """
-    matches = {"title": query} if query else None
-    films = await service.get_list(
-        page_number=page_number,
-        page_size=page_size,
-        matches=matches,
-        bool_operator="must",
-        request=request,
-    )
+    params = {
+        "matches": {"title": query} if query else None,
+        "nested_matches": {"genre.uuid": genre_uuid} if genre_uuid else None,
+        "bool_operator": "must",
+        "model": FilmShort,
+    }
+    if facets and cursor is not None:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail=ErrorMessage.facets_with_cursor,
+        )
+    if facets:
+        films, counts = await service.get_faceted_list(
+            facets=FILM_FACETS,
+            facets_model=FilmFacetCounts,
+            page_number=page_number,
+            page_size=page_size,
+            **params,
+        )
+    else:
+        films = await get_page(
+            service,
+            response,
+            cursor=cursor,
+            page_number=page_number,
+            page_size=page_size,
+            **params,
+        )
     if not films:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
             detail=ErrorMessage.films_not_found,
         )
-    return films
+    if not facets:
+        return films
+    counts = counts or FilmFacetCounts()
+    # Имена жанров: ответ из кэша сбрасывается и при изменении жанров.
+    add_request_tags(index_tags(IndexName.genre.value))
+    genres = catalogue.genres
+    if genres is None and counts.genre:
+        genres = await genre_service.get_by_uuids(
+            uuids=[UUID(uuid) for uuid in counts.genre]
+        )
+    return FilmSearchPage(films=films, facets=film_facets(counts, genres))
+
+
+def film_facets(
+    counts: FilmFacetCounts, genres: list[GenreShort] | None
+) -> FilmFacets:
+    """Фасеты ответа с именами жанров в порядке значений агрегаций."""
+    names = {str(genre.uuid): genre.name for genre in genres or []}
+    return FilmFacets(
+        genre=[
+            GenreFacetBucket(uuid=uuid, name=names.get(uuid), count=count)
+            for uuid, count in counts.genre.items()
+        ],
+        rating=[
+            FacetBucket(key=key, count=count)
+            for key, count in counts.rating.items()
+        ],
+        subscribers_only=[
+            FacetBucket(key=key, count=count)
+            for key, count in counts.subscribers_only.items()
+        ],
+    )
 
 
 @router.get(
@@ -69,7 +157,6 @@ async def film_short_list(
     response_description=APIFilmByUUIDDescription.response_description,
 )
 async def film_details(
-    request: Request,
     uuid: UUID = Path(description="uuid кинопроизведения"),
     service: CommonService = Depends(get_film_service),
     token_payload=Depends(security_jwt),
@@ -78,14 +165,48 @@ async def film_details(
     Выдает информацию из elasticsearch (или из кэша redis) о кинопроизведении
     по uuid кинопроизведения.
     """
-    film: Film = await service.get_by_uuid(uuid=uuid, request=request)
+    film: Film = await service.get_by_uuid(uuid=uuid)
     if not film:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
             detail=ErrorMessage.film_not_found,
         )
+    check_subscription([film], token_payload)
+    return film
+
+
+@router.post(
+    "/batch",
+    response_model=list[Film],
+    summary=APIFilmBatchDescription.summary,
+    description=APIFilmBatchDescription.description,
+    response_description=APIFilmBatchDescription.response_description,
+)
+async def film_batch(
+    batch: BatchRequest,
+    service: CommonService = Depends(get_film_service),
+    token_payload=Depends(security_jwt),
+) -> list[Film]:
+    """
+    Выдает информацию из elasticsearch (или из кэша redis) о нескольких
+    кинопроизведениях в порядке их uuid. Ненайденные пропускаются.
+    """
+    films: list[Film] = await service.get_by_uuids(uuids=batch.ids)
+    if not films:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail=ErrorMessage.films_not_found,
+        )
+    check_subscription(films, token_payload)
+    return films
+
+
+def check_subscription(
+    films: list[Film], token_payload: AccessTokenPayload
+) -> None:
+    """Проверка доступа пользователя к фильмам только для подписчиков."""
     if (
-        film.subscribers_only
+        any(film.subscribers_only for film in films)
         and ("subscriber" not in token_payload.roles)
         and (token_payload.sub != "superuser")
     ):
@@ -93,7 +214,6 @@ async def film_details(
             status_code=HTTPStatus.PAYMENT_REQUIRED,
             detail="This filmwork is for subscribers only",
         )
-    return film
 
 
 @router.get(
@@ -104,7 +224,7 @@ async def film_details(
     response_description=APIFilmMainDescription.response_description,
 )
 async def film_list(
-    request: Request,
+    response: Response,
     page_number: int = Query(
         1, description=APICommonDescription.page_number, ge=1
     ),
@@ -117,6 +237,7 @@ async def film_list(
     genre_uuid: UUID = Query(
         None, description="Фильтр фильмов по uuid жанра", alias="genre"
     ),
+    cursor: str = Query(None, description=APICommonDescription.cursor),
     service: CommonService = Depends(get_film_service),
 ) -> list[FilmShort]:
     """
@@ -126,15 +247,19 @@ async def film_list(
     :param page_size: Количество элементов на странице.
     :param sort: Поле для сортировки (например, imdb_rating).
     :param genre: Фильтр фильмов по id жанра.
+    :param cursor: Курсор страницы вместо ее номера.
     """
     nested_matches = {"genre.uuid": genre_uuid} if genre_uuid else None
-    films = await service.get_list(
+    films = await get_page(
+        service,
+        response,
+        cursor=cursor,
         page_number=page_number,
         page_size=page_size,
         sort=sort,
         nested_matches=nested_matches,
         bool_operator="must",
-        request=request,
+        model=FilmShort,
     )
     if not films:
         raise HTTPException(
@@ -1,18 +1,67 @@
 from http import HTTPStatus
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Path, Request
+from fastapi import APIRouter, Depends, HTTPException, Path
 
+from core.catalogue import (
+    Catalogue,
+    from_catalogue,
+    get_catalogue,
+    load_genre_films,
+)
 from core.enum import (
+    APIGenreBatchDescription,
     APIGenreByUUIDDescription,
+    APIGenreFilmsCountDescription,
     APIGenreMainDescription,
     ErrorMessage,
 )
+from core.routing import CachedResponseRoute
 from core.service import CommonService
-from models.genre import GenreShort
+from core.storage import AbstractStorage, get_storage_service
+from models.genre import GenreFilmsCount, GenreShort
+from schemas.batch import BatchRequest
 from services.genre import get_genre_service
 
-router = APIRouter()
+router = APIRouter(route_class=CachedResponseRoute)
+
+
+@router.get(
+    "/counts",
+    response_model=list[GenreFilmsCount],
+    summary=APIGenreFilmsCountDescription.summary,
+    description=APIGenreFilmsCountDescription.description,
+    response_description=APIGenreFilmsCountDescription.response_description,
+)
+@from_catalogue
+async def genre_counts(
+    service: CommonService = Depends(get_genre_service),
+    storage: AbstractStorage = Depends(get_storage_service),
+    catalogue: Catalogue = Depends(get_catalogue),
+) -> list[GenreFilmsCount]:
+    """
+    Выдает список всех жанров с числом кинопроизведений каждого из снимка
+    каталога в памяти (пока он не загружен - из elasticsearch)
+    """
+    genres = catalogue.genres
+    if genres is None:
+        genres = await service.get_list()
+    counts = catalogue.genre_films
+    if counts is None:
+        counts = await load_genre_films(storage) or {}
+    if not genres:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail=ErrorMessage.genres_not_found,
+        )
+    return [
+        GenreFilmsCount(
+            uuid=genre.uuid,
+            name=genre.name,
+            films_count=counts.get(genre.uuid, 0),
+        )
+        for genre in genres
+    ]
 
 
 @router.get(
@@ -23,7 +72,6 @@ router = APIRouter()
     response_description=APIGenreByUUIDDescription.response_description,
 )
 async def genre_details(
-    request: Request,
     genre_uuid: UUID = Path(description="uuid жанра"),
     service: CommonService = Depends(get_genre_service),
 ) -> GenreShort | None:
@@ -33,7 +81,7 @@ async def genre_details(
 
     :param genre_uuid: uuid жанра
     """
-    genre = await service.get_by_uuid(uuid=genre_uuid, request=request)
+    genre = await service.get_by_uuid(uuid=genre_uuid)
     if not genre:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
@@ -42,6 +90,30 @@ async def genre_details(
     return genre
 
 
+@router.post(
+    "/batch",
+    response_model=list[GenreShort],
+    summary=APIGenreBatchDescription.summary,
+    description=APIGenreBatchDescription.description,
+    response_description=APIGenreBatchDescription.response_description,
+)
+async def genre_batch(
+    batch: BatchRequest,
+    service: CommonService = Depends(get_genre_service),
+) -> list[GenreShort]:
+    """
+    Выдает информацию из elasticsearch (или из кэша redis) по нескольким
+    жанрам в порядке их uuid. Ненайденные жанры пропускаются.
+    """
+    genres = await service.get_by_uuids(uuids=batch.ids)
+    if not genres:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail=ErrorMessage.genres_not_found,
+        )
+    return genres
+
+
 @router.get(
     "/",
     response_model=list[GenreShort],
@@ -49,17 +121,19 @@ async def genre_details(
     description=APIGenreMainDescription.description,
     response_description=APIGenreMainDescription.response_description,
 )
+@from_catalogue
 async def genre_list(
-    request: Request,
     service: CommonService = Depends(get_genre_service),
+    catalogue: Catalogue = Depends(get_catalogue),
 ) -> list[GenreShort] | None:
     """
-    Выдает список всех жанров из elasticsearch (или из кэша redis)
+    Выдает список всех жанров из снимка каталога в памяти (пока он не
+    загружен - из elasticsearch или из кэша redis)
 
     """
-    genres = await service.get_list(
-        request=request,
-    )
+    genres = catalogue.genres
+    if genres is None:
+        genres = await service.get_list()
     if not genres:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
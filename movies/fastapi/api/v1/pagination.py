@@ -0,0 +1,42 @@
+"""Постраничная выдача списков по номеру страницы или по курсору."""
+from http import HTTPStatus
+
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+
+from core.cursor import NEXT_CURSOR_HEADER
+from core.enum import ErrorMessage
+from core.exceptions import InvalidCursorError
+from core.service import CommonService
+
+
+async def get_page(
+    service: CommonService,
+    response: Response,
+    cursor: str | None,
+    page_number: int,
+    page_size: int,
+    **params,
+) -> list[BaseModel] | None:
+    """
+    Страница списка по номеру или, если передан курсор, после курсора.
+    Курсор следующей страницы возвращается в заголовке X-Next-Cursor.
+    Ответ по курсору не кэшируется.
+    """
+    if cursor is None:
+        return await service.get_list(
+            page_number=page_number, page_size=page_size, **params
+        )
+    try:
+        instances, next_cursor = await service.get_page_after(
+            cursor=cursor, page_size=page_size, **params
+        )
+    except InvalidCursorError:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail=ErrorMessage.invalid_cursor,
+        )
+    response.headers["Cache-Control"] = "no-store"
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return instances
@@ -1,21 +1,26 @@
 from http import HTTPStatus
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Response
 
+from api.v1.pagination import get_page
+from core.catalogue import Catalogue, from_catalogue, get_catalogue
 from core.config import settings
 from core.enum import (
     APICommonDescription,
+    APIPersonBatchDescription,
     APIPersonByUUIDDescription,
     APIPersonFilmsByUUID,
     APIPersonSearchDescription,
     ErrorMessage,
 )
+from core.routing import CachedResponseRoute
 from core.service import CommonService
 from models.person import InnerPersonFilmsByUUID, PersonFilms
+from schemas.batch import BatchRequest
 from services.person import get_person_service
 
-router = APIRouter()
+router = APIRouter(route_class=CachedResponseRoute)
 
 
 @router.get(
@@ -26,7 +31,7 @@ router = APIRouter()
     response_description=APIPersonSearchDescription.response_description,
 )
 async def person_search(
-    request: Request,
+    response: Response,
     query: str = Query(None, description=APICommonDescription.query),
     page_number: int = Query(
         1, description=APICommonDescription.page_number, ge=1
@@ -36,6 +41,7 @@ async def person_search(
         description=APICommonDescription.page_size,
         ge=1,
     ),
+    cursor: str = Query(None, description=APICommonDescription.cursor),
     service: CommonService = Depends(get_person_service),
 ) -> list[PersonFilms]:
     """
@@ -44,13 +50,17 @@ async def person_search(
     :param page_number: Номер страницы (начиная с 1).
     :param page_size: Количество элементов на странице.
     :param query: Строка для поиска по имени персоны
+    :param cursor: Курсор страницы вместо ее номера
     """
     matches = {"full_name": query} if query else None
-    persons = await service.get_list(
+    persons = await get_page(
+        service,
+        response,
+        cursor=cursor,
         matches=matches,
-        request=request,
         page_number=page_number,
         page_size=page_size,
+        model=PersonFilms,
     )
     if not persons:
         raise HTTPException(
@@ -60,6 +70,30 @@ async def person_search(
     return persons
 
 
+@router.post(
+    "/batch",
+    response_model=list[PersonFilms],
+    summary=APIPersonBatchDescription.summary,
+    description=APIPersonBatchDescription.description,
+    response_description=APIPersonBatchDescription.response_description,
+)
+async def person_batch(
+    batch: BatchRequest,
+    service: CommonService = Depends(get_person_service),
+) -> list[PersonFilms]:
+    """
+    Выдает информацию о нескольких персонах в порядке их uuid.
+    Ненайденные персоны пропускаются.
+    """
+    persons = await service.get_by_uuids(uuids=batch.ids)
+    if not persons:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail=ErrorMessage.persons_not_found,
+        )
+    return persons
+
+
 @router.get(
     "/{uuid}",
     response_model=PersonFilms,
@@ -68,11 +102,10 @@ async def person_search(
     response_description=APIPersonByUUIDDescription.response_description,
 )
 async def person_details(
-    request: Request,
     uuid: UUID = Path(description="uuid персоны"),
     service: CommonService = Depends(get_person_service),
 ) -> PersonFilms:
-    person = await service.get_by_uuid(uuid=uuid, request=request)
+    person = await service.get_by_uuid(uuid=uuid)
     if not person:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
@@ -88,12 +121,19 @@ async def person_details(
     description=APIPersonFilmsByUUID.description,
     response_description=APIPersonFilmsByUUID.response_description,
 )
+@from_catalogue
 async def person_films(
-    request: Request,
     uuid: UUID = Path(description="uuid персоны"),
     service: CommonService = Depends(get_person_service),
+    catalogue: Catalogue = Depends(get_catalogue),
 ) -> list[InnerPersonFilmsByUUID] | None:
-    person = await service.get_by_uuid(uuid=uuid, request=request)
+    """
+    Выдает фильмы персоны из снимка каталога в памяти. Персона, которой
+    еще нет в снимке, ищется в elasticsearch (или в кэше redis)
+    """
+    if (films := catalogue.films_of(uuid)) is not None:
+        return films
+    person = await service.get_by_uuid(uuid=uuid)
     if not person:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
@@ -0,0 +1,62 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, Query
+
+from core.config import settings
+from core.enum import APICommonDescription, APISuggestDescription
+from core.routing import CachedResponseRoute
+from core.service import CommonService
+from models.film import FilmShort
+from models.person import PersonShort
+from models.suggest import Suggestions
+from services.film import get_film_service
+from services.person import get_person_service
+
+router = APIRouter(route_class=CachedResponseRoute)
+
+# Поля completion в индексах, по которым строятся подсказки
+FILM_SUGGEST_FIELD = "title.suggest"
+PERSON_SUGGEST_FIELD = "full_name.suggest"
+
+
+@router.get(
+    "",
+    response_model=Suggestions,
+    summary=APISuggestDescription.summary,
+    description=APISuggestDescription.description,
+    response_description=APISuggestDescription.response_description,
+)
+async def suggest(
+    query: str = Query(
+        description=APICommonDescription.prefix, min_length=1, max_length=50
+    ),
+    size: int = Query(
+        settings.SUGGEST_SIZE,
+        description=APICommonDescription.suggest_size,
+        ge=1,
+        le=settings.SUGGEST_MAX_SIZE,
+    ),
+    film_service: CommonService = Depends(get_film_service),
+    person_service: CommonService = Depends(get_person_service),
+) -> Suggestions:
+    """
+    Выдает из elasticsearch (или из кэша redis) кинопроизведения и персоны,
+    название или имя которых начинается с введенной строки. Подсказки
+    ищутся в обоих индексах одновременно; ответ кэшируется для каждого
+    префикса.
+
+    :param query: начало названия или имени
+    :param size: количество подсказок каждого вида
+    """
+    films, persons = await asyncio.gather(
+        film_service.get_suggestions(
+            field=FILM_SUGGEST_FIELD, prefix=query, size=size, model=FilmShort
+        ),
+        person_service.get_suggestions(
+            field=PERSON_SUGGEST_FIELD,
+            prefix=query,
+            size=size,
+            model=PersonShort,
+        ),
+    )
+    return Suggestions(films=films or [], persons=persons or [])
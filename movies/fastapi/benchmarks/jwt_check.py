@@ -0,0 +1,68 @@
+"""Бенчмарк проверки токена доступа: проверок в секунду на одно ядро.
+
+"uncached" - на каждую проверку вычисляется HMAC-SHA256 подписи,
+разбирается payload и создается AccessTokenPayload.
+"cached" - payload уже проверенного токена берется из кэша процесса.
+Токен подписывается так же, как в сервисе auth.
+
+Запуск из папки fastapi:
+    python -m benchmarks.jwt_check --checks 100000
+"""
+import argparse
+import base64
+import uuid
+from time import perf_counter, time
+
+from Cryptodome.Hash import HMAC, SHA256
+
+from core.config import settings
+from schemas.token import AccessTokenPayload
+from util.JWT_helper import JWTHelper, TokenCache
+
+
+def make_token() -> str:
+    def encode(json: str) -> str:
+        return base64.b64encode(json.encode(settings.JWT_CODE)).decode()
+
+    payload = AccessTokenPayload(
+        sub=str(uuid.uuid4()),
+        device_id=uuid.uuid4(),
+        roles=["subscriber"],
+        exp=str(time() + 3600),
+    )
+    header = '{"alg": "HS256", "typ": "JWT"}'
+    signed = f"{encode(header)}.{encode(payload.model_dump_json())}"
+    hasher = HMAC.new(
+        settings.JWT_SECRET.encode(settings.JWT_CODE), digestmod=SHA256
+    )
+    hasher.update(signed.encode(settings.JWT_CODE))
+    return f"{signed}.{hasher.hexdigest()}"
+
+
+def measure(name: str, helper: JWTHelper, token: str, checks: int) -> None:
+    for _ in range(checks // 10):
+        helper.check_token(token)
+    started = perf_counter()
+    for _ in range(checks):
+        helper.check_token(token)
+    elapsed = perf_counter() - started
+    print(
+        f"{name:>8}: {checks / elapsed:>10.0f} проверок/с, "
+        f"{elapsed / checks * 1e6:.2f} мкс на проверку"
+    )
+
+
+def main(checks: int) -> None:
+    token = make_token()
+    helper = JWTHelper()
+    helper.cache = TokenCache(max_size=0)
+    measure("uncached", helper, token, checks)
+    helper.cache = TokenCache(max_size=settings.JWT_CACHE_MAX_SIZE)
+    measure("cached", helper, token, checks)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--checks", type=int, default=100000)
+    args = parser.parse_args()
+    main(args.checks)
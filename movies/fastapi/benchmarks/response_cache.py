@@ -0,0 +1,139 @@
+"""Бенчмарк задержки ответа на закэшированную страницу из 50 FilmShort.
+
+"objects" - кэш объектов: из локального кэша берутся модели FilmShort,
+затем FastAPI проверяет и сериализует их по response_model.
+"response" - кэш ответов: из локального кэша берется готовое тело ответа.
+Оба варианта обслуживаются из памяти процесса, без обращений к Redis и
+Elasticsearch; запросы передаются приложению напрямую через ASGI.
+
+Запуск из папки fastapi:
+    python -m benchmarks.response_cache --requests 5000
+"""
+import argparse
+import asyncio
+import uuid
+from statistics import quantiles
+from time import perf_counter, time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
+
+from api.v1 import films
+from core.cache import CacheEntry, cache_key, local_cache
+from core.config import settings
+from core.enum import IndexName
+from models.film import FilmShort
+
+ENDPOINT = "/api/v1/films"
+PAGE_SIZE = 50
+
+
+def make_app(response_cache: bool) -> FastAPI:
+    """
+    Приложение с маршрутами фильмов. Обработчики маршрутов создаются при
+    подключении роутера, поэтому настройка учитывается здесь.
+    """
+    settings.RESPONSE_CACHE_ENABLED = response_cache
+    app = FastAPI(default_response_class=ORJSONResponse)
+    app.include_router(films.router, prefix=ENDPOINT)
+    return app
+
+
+def make_scope() -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "server": ("testserver", 80),
+        "client": ("testclient", 50000),
+        "root_path": "",
+        "path": ENDPOINT,
+        "raw_path": ENDPOINT.encode(),
+        "query_string": f"page_number=1&page_size={PAGE_SIZE}".encode(),
+        "headers": [(b"host", b"testserver")],
+        "path_params": {},
+    }
+
+
+def make_films() -> list[FilmShort]:
+    return [
+        FilmShort(uuid=uuid.uuid4(), title=f"Film {i}", imdb_rating=7.5)
+        for i in range(PAGE_SIZE)
+    ]
+
+
+async def call(app: FastAPI, scope: dict) -> bytes:
+    """Выполнение запроса к ASGI-приложению, возвращает тело ответа."""
+    body = []
+
+    async def receive() -> dict:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict) -> None:
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200, message
+        elif message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+async def measure(name: str, app: FastAPI, scope: dict, requests: int):
+    for _ in range(requests // 10):
+        await call(app, scope)
+    timings = []
+    for _ in range(requests):
+        started = perf_counter()
+        await call(app, scope)
+        timings.append((perf_counter() - started) * 1000)
+    percentiles = quantiles(timings, n=100)
+    print(
+        f"{name:>8}: p50 {percentiles[49]:.3f} мс, "
+        f"p99 {percentiles[98]:.3f} мс"
+    )
+
+
+async def main(requests: int) -> None:
+    scope = make_scope()
+    local_cache.enable()
+    version = local_cache.version
+    # Ключ объектов, который сервис фильмов строит для film_list.
+    key = cache_key(
+        "objects",
+        index=IndexName.movies,
+        model=FilmShort.__name__,
+        page_number=1,
+        page_size=PAGE_SIZE,
+        sort="-imdb_rating",
+        matches=None,
+        nested_matches=None,
+        bool_operator="must",
+    )
+    entry = CacheEntry(
+        instances=make_films(),
+        expires=time() + settings.CACHE_EXPIRE_IN_SECONDS,
+        delta=0,
+    )
+    local_cache.put(key, entry, 0, version)
+    objects_app = make_app(response_cache=False)
+    body = await call(objects_app, scope)
+    response_app = make_app(response_cache=True)
+    route = next(
+        route
+        for route in response_app.routes
+        if getattr(route, "path_format", None) == ENDPOINT
+    )
+    key = route.response_key(Request(scope))
+    local_cache.put(key, body, len(body), version)
+    await measure("objects", objects_app, scope, requests)
+    await measure("response", response_app, scope, requests)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
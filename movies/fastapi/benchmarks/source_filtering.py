@@ -0,0 +1,94 @@
+"""Бенчмарк страницы списка фильмов из ответа Elasticsearch.
+
+"full" - ответ с полным _source: разбор JSON и создание моделей Film.
+"source" - ответ с _source, ограниченным полями FilmShort (source_fields):
+разбор JSON и создание FilmShort. Ответ строится так же, как его
+отфильтровал бы Elasticsearch; сеть и сам поиск не измеряются.
+
+Запуск из папки fastapi:
+    python -m benchmarks.source_filtering --repeat 2000
+"""
+import argparse
+import uuid
+from statistics import quantiles
+from time import perf_counter
+
+import orjson
+
+from core.es_queries import source_fields
+from models.film import Film, FilmShort
+
+PAGE_SIZE = 50
+PERSONS_PER_ROLE = 10
+DESCRIPTION = (
+    "The Imperial Forces, under orders from cruel Darth Vader... " * 5
+)
+
+
+def make_document(i: int) -> dict:
+    def persons() -> list[dict]:
+        return [
+            {"uuid": str(uuid.uuid4()), "full_name": f"Person {j}"}
+            for j in range(PERSONS_PER_ROLE)
+        ]
+
+    return {
+        "uuid": str(uuid.uuid4()),
+        "title": f"Film {i}",
+        "imdb_rating": 7.5,
+        "description": DESCRIPTION,
+        "genre": [
+            {"uuid": str(uuid.uuid4()), "name": f"Genre {j}"} for j in range(3)
+        ],
+        "actors": persons(),
+        "writers": persons(),
+        "directors": persons(),
+    }
+
+
+def make_response(documents: list[dict], fields: tuple[str, ...] | None):
+    """Тело ответа на поиск с _source, ограниченным полями fields."""
+    hits = [
+        {
+            "_id": doc["uuid"],
+            "_source": (
+                doc
+                if fields is None
+                else {key: doc[key] for key in fields if key in doc}
+            ),
+        }
+        for doc in documents
+    ]
+    return orjson.dumps({"hits": {"hits": hits}})
+
+
+def measure(name: str, body: bytes, model, repeat: int) -> None:
+    timings = []
+    for _ in range(repeat):
+        started = perf_counter()
+        result = orjson.loads(body)
+        [model(**hit["_source"]) for hit in result["hits"]["hits"]]
+        timings.append((perf_counter() - started) * 1000)
+    percentiles = quantiles(timings, n=100)
+    print(
+        f"{name:>6}: {len(body):>7} байт, p50 {percentiles[49]:.3f} мс, "
+        f"p99 {percentiles[98]:.3f} мс"
+    )
+
+
+def main(repeat: int) -> None:
+    documents = [make_document(i) for i in range(PAGE_SIZE)]
+    measure("full", make_response(documents, None), Film, repeat)
+    measure(
+        "source",
+        make_response(documents, source_fields(FilmShort)),
+        FilmShort,
+        repeat,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.repeat)
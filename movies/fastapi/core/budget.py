@@ -0,0 +1,69 @@
+"""Бюджет времени на обработку запроса к API."""
+import asyncio
+from contextvars import ContextVar
+from time import monotonic
+from typing import Any, Awaitable, Callable, TypeVar
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from core.exceptions import LatencyBudgetExceededError
+
+T = TypeVar("T")
+
+# Момент (monotonic), к которому обращения к хранилищам должны завершиться.
+request_deadline: ContextVar[float | None] = ContextVar(
+    "request_deadline", default=None
+)
+
+
+def remaining_budget() -> float | None:
+    """Остаток бюджета текущего запроса в секундах (None - без бюджета)."""
+    if (deadline := request_deadline.get()) is None:
+        return None
+    return deadline - monotonic()
+
+
+async def within_budget(
+    call: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any
+) -> T:
+    """
+    Обращение к хранилищу, ограниченное остатком бюджета. Бюджет
+    проверяется и отсчитывается снаружи клиента хранилища: его
+    исчерпание - ошибка запроса к API, а не узла, поэтому клиент не
+    повторяет запрос и не помечает узел недоступным.
+    """
+    budget = remaining_budget()
+    if budget is None:
+        return await call(*args, **kwargs)
+    if budget <= 0:
+        raise LatencyBudgetExceededError()
+    try:
+        async with asyncio.timeout(budget) as timeout:
+            return await call(*args, **kwargs)
+    except TimeoutError as e:
+        if timeout.expired():
+            raise LatencyBudgetExceededError() from e
+        raise
+
+
+class LatencyBudgetMiddleware:
+    """
+    Установка бюджета времени запроса. Обращения к хранилищам через
+    within_budget не длятся дольше его остатка, поэтому повторные попытки
+    не растягивают ответ сверх бюджета. Загрузки в фоне, запущенные
+    запросом, наследуют его бюджет.
+    """
+
+    def __init__(self, app: ASGIApp, budget: float) -> None:
+        self.app = app
+        self.budget = budget
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = request_deadline.set(monotonic() + self.budget)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_deadline.reset(token)
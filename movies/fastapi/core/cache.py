@@ -1,69 +1,625 @@
+import asyncio
+import hashlib
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
 from functools import lru_cache
+from math import log
+from random import random
+from time import monotonic, time
+from typing import Any, Awaitable, Callable, Iterable
 
 import orjson
-from fastapi import Depends, Request
+from fastapi import Depends
 from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from redis.asyncio.lock import Lock
+from redis.exceptions import RedisError
 from pydantic import BaseModel
 
 from core.config import settings
+from core.logger import logger
+from core.metrics import metrics
 from db.redis import get_redis_instance
 
+# Канал, в который Redis присылает сообщения об изменении отслеживаемых
+# ключей (client-side caching).
+INVALIDATION_CHANNEL = "__redis__:invalidate"
+CACHE_TIERS = ("local", "redis")
+# Пространство имен ключей кэша. Версия меняется вместе с форматом ключей
+# или значений: записи прежнего формата не читаются и истекают сами.
+KEY_PREFIX = f"{settings.CACHE_KEY_NAMESPACE}:v{settings.CACHE_KEY_VERSION}:"
+# Префикс ключей блокировок загрузки значений кэша.
+LOCK_KEY_PREFIX = "lock:"
+# Префикс множеств ключей кэша по тегам: индекс, документ индекса, списки
+# индекса. По тегам кэш сбрасывается при изменении данных в ETL.
+TAG_KEY_PREFIX = "tag:" + KEY_PREFIX
+# Значение хранится дольше срока свежести, чтобы его можно было отдавать во
+# время обновления. Множество тегов хранится не меньше самых долгоживущих
+# значений.
+ENTRY_EXPIRE_IN_SECONDS = (
+    settings.CACHE_EXPIRE_IN_SECONDS + settings.CACHE_STALE_IN_SECONDS
+)
+TAG_EXPIRE_IN_SECONDS = ENTRY_EXPIRE_IN_SECONDS
+
+# Теги значений кэша, из которых собирается ответ на текущий запрос.
+request_tags: ContextVar[set[str] | None] = ContextVar(
+    "request_tags", default=None
+)
+
+metrics.describe(
+    "cache_requests_total",
+    "counter",
+    "Обращения к уровням кэша (tier) с результатом hit или miss.",
+)
+metrics.describe(
+    "cache_hit_ratio", "gauge", "Доля попаданий в уровень кэша (tier)."
+)
+metrics.describe(
+    "cache_local_bytes", "gauge", "Объем данных в локальном кэше процесса."
+)
+metrics.describe(
+    "cache_loads_total",
+    "counter",
+    "Загрузки значений кэша из хранилища (reason: miss, stale, early, "
+    "batch).",
+)
+metrics.describe(
+    "cache_coalesced_total",
+    "counter",
+    "Запросы, дождавшиеся уже идущей загрузки того же значения.",
+)
+metrics.describe(
+    "cache_purged_keys_total",
+    "counter",
+    "Ключи кэша, удаленные по сообщениям ETL об изменении индекса.",
+)
+
+
+@dataclass
+class CacheEntry:
+    """
+    Значение кэша: объекты, момент окончания свежести (unix-время) и время
+    их загрузки из хранилища в секундах.
+    """
+
+    instances: list[BaseModel]
+    expires: float
+    delta: float
+
+    def is_stale(self) -> bool:
+        """Свежесть истекла: значение отдается, пока загружается новое."""
+        return time() >= self.expires
+
+    def should_refresh(self) -> bool:
+        """
+        Вероятностное раннее обновление (XFetch): чем ближе окончание
+        свежести и чем дольше загрузка, тем вероятнее обновление. Так
+        значение обновляет один из запросов до его устаревания, а не все
+        запросы разом после.
+        """
+        beta = settings.CACHE_EARLY_REFRESH_BETA
+        return time() - self.delta * beta * log(1 - random()) >= self.expires
+
 
 class AbstractCacheService(ABC):
     """Абстрактный класс-интерфейс для сервисов кэширования"""
 
     @abstractmethod
-    async def get_instances_from_cache(
-        self, request: Request, model: BaseModel
-    ) -> list[BaseModel | None]:
-        """Абстрактый метод получения списка объектов, хранящихся в кэше"""
+    async def get_entry_from_cache(
+        self, key: str, model: BaseModel
+    ) -> CacheEntry | None:
+        """Абстрактый метод получения значения, хранящегося в кэше"""
 
     @abstractmethod
-    async def put_instances_to_cache(
-        self, request: Request, instances: list[BaseModel]
+    async def put_entry_to_cache(
+        self, key: str, entry: CacheEntry, tags: Iterable[str]
     ) -> None:
-        """Абстрактный метод сохранения списка объектов в кэш"""
+        """Абстрактный метод сохранения значения в кэш с тегами"""
 
+    @abstractmethod
+    async def get_entries_from_cache(
+        self, keys: list[str], model: BaseModel
+    ) -> list[CacheEntry | None]:
+        """
+        Абстрактный метод получения значений по нескольким ключам за одно
+        обращение к кэшу
+        """
 
-class ExtractKeyFromRequest:
-    @staticmethod
-    def _calc_key(request: Request) -> str:
-        """Общий метод получения параметра key для сервисов кэширования"""
-        return str(request.url)
+    @abstractmethod
+    async def put_entries_to_cache(
+        self, items: Iterable[tuple[str, CacheEntry, Iterable[str]]]
+    ) -> None:
+        """
+        Абстрактный метод сохранения нескольких значений (ключ, значение,
+        теги) за одно обращение к кэшу
+        """
+
+    @abstractmethod
+    def lock(self, key: str) -> Lock:
+        """Абстрактный метод получения блокировки загрузки значения"""
+
+
+def cache_key(namespace: str, **params: Any) -> str:
+    """
+    Ключ кэша логического запроса. Типизированные параметры приводятся к
+    JSON с сортировкой ключей и хэшируются, поэтому порядок параметров,
+    явно указанные значения по умолчанию и вид URL на ключ не влияют.
+    """
+    digest = hashlib.blake2b(
+        orjson.dumps(params, default=str, option=orjson.OPT_SORT_KEYS),
+        digest_size=16,
+    ).hexdigest()
+    return f"{KEY_PREFIX}{namespace}:{digest}"
+
+
+def index_tags(index: str, uuid: Any | None = None) -> list[str]:
+    """Теги значения из индекса: документа uuid или списка документов."""
+    return [index, f"{index}:{uuid}" if uuid else f"{index}:lists"]
+
+
+def change_tags(index: str, ids: Iterable[str] | None) -> list[str]:
+    """
+    Теги значений, устаревших при изменении документов ids индекса:
+    карточки документов и все списки индекса (None - весь индекс).
+    """
+    if ids is None:
+        return [index]
+    return [f"{index}:lists", *(f"{index}:{uuid}" for uuid in ids)]
+
+
+def add_request_tags(tags: Iterable[str]) -> None:
+    """Учет тегов значения, использованного в ответе на текущий запрос."""
+    if (current := request_tags.get()) is not None:
+        current.update(tags)
 
 
-class RedisService(AbstractCacheService, ExtractKeyFromRequest):
+def queue_tagged(
+    pipe: Pipeline, key: str, value: bytes, ex: int, tags: Iterable[str]
+) -> None:
+    """Команды сохранения значения и добавления ключа в множества тегов."""
+    pipe.set(name=key, value=value, ex=ex)
+    for tag in tags:
+        pipe.sadd(TAG_KEY_PREFIX + tag, key)
+        pipe.expire(TAG_KEY_PREFIX + tag, TAG_EXPIRE_IN_SECONDS)
+
+
+async def set_tagged(
+    redis: Redis, key: str, value: bytes, ex: int, tags: Iterable[str]
+) -> None:
+    """Сохранение значения с добавлением ключа в множества тегов."""
+    async with redis.pipeline(transaction=False) as pipe:
+        queue_tagged(pipe, key, value, ex, tags)
+        await pipe.execute()
+
+
+async def purge_tags(redis: Redis, tags: Iterable[str]) -> int:
+    """Удаление значений с указанными тегами. Возвращает число ключей."""
+    tag_keys = [TAG_KEY_PREFIX + tag for tag in tags]
+    if not tag_keys:
+        return 0
+    async with redis.pipeline(transaction=True) as pipe:
+        for tag_key in tag_keys:
+            pipe.smembers(tag_key)
+        pipe.delete(*tag_keys)
+        *members, _ = await pipe.execute()
+    keys = set().union(*members)
+    if keys:
+        await redis.unlink(*keys)
+    return len(keys)
+
+
+class RedisService(AbstractCacheService):
     def __init__(self, redis_instance: Redis) -> None:
         self.redis = redis_instance
 
-    async def get_instances_from_cache(
-        self, request: Request, model: BaseModel
-    ) -> list[BaseModel | None]:
-        """Метод получения списка объектов, хранящихся в кэше Redis"""
-        key = self._calc_key(request)
-        instances = []
+    async def get_entry_from_cache(
+        self, key: str, model: BaseModel
+    ) -> CacheEntry | None:
+        """Метод получения значения, хранящегося в кэше Redis"""
         json_data = await self.redis.get(key)
         if json_data:
-            for data in orjson.loads(json_data):
-                instances.append(model.parse_raw(data))
-        return instances
+            return self._deserialize(json_data, model)
+        return None
+
+    @staticmethod
+    def _deserialize(json_data: bytes, model: BaseModel) -> CacheEntry:
+        """Преобразование сохраненного значения в объекты."""
+        data = orjson.loads(json_data)
+        return CacheEntry(
+            instances=[model.parse_raw(item) for item in data["instances"]],
+            expires=data["expires"],
+            delta=data["delta"],
+        )
+
+    @staticmethod
+    def _serialize(entry: CacheEntry) -> bytes:
+        """Преобразование значения в JSON для сохранения."""
+        return orjson.dumps(
+            {
+                "instances": [instance.json() for instance in entry.instances],
+                "expires": entry.expires,
+                "delta": entry.delta,
+            }
+        )
+
+    async def get_entries_from_cache(
+        self, keys: list[str], model: BaseModel
+    ) -> list[CacheEntry | None]:
+        """Метод получения значений по ключам одной командой MGET"""
+        if not keys:
+            return []
+        return [
+            self._deserialize(json_data, model) if json_data else None
+            for json_data in await self.redis.mget(keys)
+        ]
+
+    async def put_entry_to_cache(
+        self, key: str, entry: CacheEntry, tags: Iterable[str]
+    ) -> None:
+        """
+        Метод сохранения значения в кэш Redis. Значение хранится дольше
+        срока свежести, чтобы его можно было отдавать во время обновления.
+        """
+        await set_tagged(
+            self.redis,
+            key,
+            self._serialize(entry),
+            ENTRY_EXPIRE_IN_SECONDS,
+            tags,
+        )
+
+    async def put_entries_to_cache(
+        self, items: Iterable[tuple[str, CacheEntry, Iterable[str]]]
+    ) -> None:
+        """Метод сохранения нескольких значений в кэш Redis одним конвейером"""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, entry, tags in items:
+                queue_tagged(
+                    pipe,
+                    key,
+                    self._serialize(entry),
+                    ENTRY_EXPIRE_IN_SECONDS,
+                    tags,
+                )
+            if len(pipe):
+                await pipe.execute()
+
+    def lock(self, key: str) -> Lock:
+        """Блокировка загрузки значения в Redis, общая для процессов."""
+        return self.redis.lock(
+            LOCK_KEY_PREFIX + key,
+            timeout=settings.CACHE_LOCK_TIMEOUT_IN_SECONDS,
+        )
+
+
+class LocalCache:
+    """
+    Кэш в памяти процесса: LRU с TTL и ограничением общего объема записей.
+    Работает, только пока подключен слушатель инвалидаций Redis, иначе
+    изменения в Redis не дошли бы до него.
+    """
 
-    async def put_instances_to_cache(
-        self, request: Request, instances: list[BaseModel]
+    def __init__(self, max_bytes: int, ttl: float) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = False
+        self.size = 0
+        # Растет при каждой инвалидации: значение, прочитанное из Redis до
+        # инвалидации, не должно попасть в кэш после нее.
+        self.version = 0
+        # Ключ -> (момент устаревания, объем, значение).
+        self._items: OrderedDict[str, tuple[float, int, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Any | None:
+        """Значение по ключу или None, если его нет или оно устарело."""
+        if not (item := self._items.get(key)):
+            return None
+        if item[0] < monotonic():
+            self.delete([key])
+            return None
+        self._items.move_to_end(key)
+        return item[2]
+
+    def put(self, key: str, value: Any, size: int, version: int) -> None:
+        """
+        Сохранение значения, прочитанного при версии version, с вытеснением
+        давно не используемых.
+        """
+        if (
+            not self.enabled
+            or version != self.version
+            or size > self.max_bytes
+        ):
+            return
+        self.delete([key])
+        self._items[key] = (monotonic() + self.ttl, size, value)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted_size, _) = self._items.popitem(last=False)
+            self.size -= evicted_size
+
+    def invalidate(self, keys: Iterable[str] | None) -> None:
+        """Инвалидация ключей (None - всех ключей)."""
+        self.version += 1
+        if keys is None:
+            self.clear()
+        else:
+            self.delete(keys)
+
+    def delete(self, keys: Iterable[str]) -> None:
+        """Удаление значений по ключам."""
+        for key in keys:
+            if item := self._items.pop(key, None):
+                self.size -= item[1]
+
+    def clear(self) -> None:
+        """Удаление всех значений."""
+        self._items.clear()
+        self.size = 0
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+        self.invalidate(None)
+
+
+class TwoTierCacheService(AbstractCacheService):
+    """
+    Двухуровневый кэш: готовые объекты в памяти процесса перед Redis.
+    Попадание в локальный кэш не требует обращения к Redis и разбора JSON.
+    Локальный кэш заполняется при чтении из Redis и сбрасывается по
+    сообщениям Redis об изменении ключей, в том числе из других процессов.
+    """
+
+    def __init__(self, redis_instance: Redis, local: LocalCache) -> None:
+        self.remote = RedisService(redis_instance)
+        self.local = local
+
+    async def get_entry_from_cache(
+        self, key: str, model: BaseModel
+    ) -> CacheEntry | None:
+        """Метод получения значения из локального кэша или Redis"""
+        if (entry := self.local.get(key)) is not None:
+            _count("local", "hit")
+            return entry
+        _count("local", "miss")
+        version = self.local.version
+        json_data = await self.remote.redis.get(key)
+        if not json_data:
+            _count("redis", "miss")
+            return None
+        _count("redis", "hit")
+        entry = self.remote._deserialize(json_data, model)
+        self.local.put(key, entry, len(json_data), version)
+        return entry
+
+    async def get_entries_from_cache(
+        self, keys: list[str], model: BaseModel
+    ) -> list[CacheEntry | None]:
+        """
+        Метод получения значений по ключам: из локального кэша, а
+        недостающих - одной командой MGET из Redis
+        """
+        entries = [self.local.get(key) for key in keys]
+        misses = [i for i, entry in enumerate(entries) if entry is None]
+        _count("local", "hit", len(keys) - len(misses))
+        _count("local", "miss", len(misses))
+        if not misses:
+            return entries
+        version = self.local.version
+        values = await self.remote.redis.mget([keys[i] for i in misses])
+        for i, json_data in zip(misses, values):
+            if not json_data:
+                continue
+            entries[i] = self.remote._deserialize(json_data, model)
+            self.local.put(keys[i], entries[i], len(json_data), version)
+        found = sum(1 for i in misses if entries[i] is not None)
+        _count("redis", "hit", found)
+        _count("redis", "miss", len(misses) - found)
+        return entries
+
+    async def put_entry_to_cache(
+        self, key: str, entry: CacheEntry, tags: Iterable[str]
+    ) -> None:
+        """
+        Метод сохранения значения в Redis. В локальный кэш значение
+        попадет при следующем чтении: запись в Redis все равно вызовет
+        сообщение об изменении ключа.
+        """
+        await self.remote.put_entry_to_cache(key, entry, tags)
+
+    async def put_entries_to_cache(
+        self, items: Iterable[tuple[str, CacheEntry, Iterable[str]]]
+    ) -> None:
+        await self.remote.put_entries_to_cache(items)
+
+    def lock(self, key: str) -> Lock:
+        return self.remote.lock(key)
+
+
+class ResponseCacheService:
+    """
+    Кэш готовых тел ответов API. Тело хранится в Redis и в локальном кэше
+    процесса как есть и при попадании отдается клиенту без разбора JSON,
+    создания моделей и повторной сериализации.
+    """
+
+    def __init__(self, redis_instance: Redis, local: LocalCache) -> None:
+        self.redis = redis_instance
+        self.local = local
+
+    async def get_response(self, key: str) -> bytes | None:
+        """Тело ответа из локального кэша или Redis."""
+        if (body := self.local.get(key)) is not None:
+            _count("local", "hit")
+            return body
+        _count("local", "miss")
+        version = self.local.version
+        body = await self.redis.get(key)
+        if body is None:
+            _count("redis", "miss")
+            return None
+        _count("redis", "hit")
+        self.local.put(key, body, len(body), version)
+        return body
+
+    async def put_response(
+        self, key: str, body: bytes, tags: Iterable[str]
     ) -> None:
-        """Метод сохранения списка объектов в кэш Redis"""
-        key = self._calc_key(request)
-        json = orjson.dumps(
-            [instance.json() for instance in instances]
-        ).decode()
-        await self.redis.set(
-            name=key, value=json, ex=settings.CACHE_EXPIRE_IN_SECONDS
+        """Сохранение тела ответа в Redis с тегами использованных значений."""
+        await set_tagged(
+            self.redis, key, body, settings.CACHE_EXPIRE_IN_SECONDS, tags
+        )
+
+
+class SingleFlight:
+    """
+    Объединение одновременных загрузок одного ключа в процессе: первая
+    загрузка выполняется в задаче, остальные запросы ждут ее результата.
+    Отмена одного из ожидающих запросов не прерывает загрузку.
+    """
+
+    def __init__(self) -> None:
+        self._flights: dict[str, asyncio.Task] = {}
+
+    def start(
+        self, key: str, load: Callable[[], Awaitable[Any]]
+    ) -> asyncio.Task:
+        """Задача загрузки ключа: уже идущая или новая."""
+        if (task := self._flights.get(key)) is not None:
+            metrics.inc("cache_coalesced_total")
+            return task
+        task = asyncio.create_task(load())
+        self._flights[key] = task
+        task.add_done_callback(lambda task: self._finish(key, task))
+        return task
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        """
+        Удаление завершенной загрузки. Ошибка записывается в лог: у фонового
+        обновления может не быть ожидающих запросов.
+        """
+        self._flights.pop(key, None)
+        if not task.cancelled() and (error := task.exception()) is not None:
+            logger.error(f"Ошибка загрузки значения кэша {key}: {error}")
+
+    async def run(self, key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+        """Результат загрузки ключа."""
+        return await asyncio.shield(self.start(key, load))
+
+
+def _count(tier: str, result: str, value: int = 1) -> None:
+    if value:
+        metrics.inc(
+            "cache_requests_total", {"tier": tier, "result": result}, value
+        )
+
+
+def _cache_ratios():
+    """Доли попаданий по уровням кэша для метрик."""
+    for tier in CACHE_TIERS:
+        hits = metrics.get(
+            "cache_requests_total", {"tier": tier, "result": "hit"}
+        )
+        misses = metrics.get(
+            "cache_requests_total", {"tier": tier, "result": "miss"}
         )
+        total = hits + misses
+        yield "cache_hit_ratio", {"tier": tier}, hits / total if total else 0
+    yield "cache_local_bytes", {}, local_cache.size
+
+
+async def listen_invalidations(redis: Redis, local: LocalCache) -> None:
+    """
+    Сброс локального кэша по сообщениям Redis об изменении ключей
+    (CLIENT TRACKING в режиме BCAST с перенаправлением в отдельное
+    подключение). Отслеживаются только ключи пространства имен кэша.
+    FLUSHALL/FLUSHDB очищают локальный кэш целиком. Пока
+    слушатель не подключен, локальный кэш отключен.
+    """
+    while True:
+        pubsub = redis.pubsub()
+        tracker = redis.client()
+        try:
+            await pubsub.connect()
+            await pubsub.connection.send_command("CLIENT", "ID")
+            client_id = await pubsub.connection.read_response()
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            await tracker.execute_command(
+                "CLIENT",
+                "TRACKING",
+                "ON",
+                "REDIRECT",
+                client_id,
+                "BCAST",
+                "PREFIX",
+                KEY_PREFIX,
+            )
+            local.enable()
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                keys = message["data"]
+                local.invalidate(
+                    None if keys is None else [key.decode() for key in keys]
+                )
+        except RedisError as e:
+            logger.error(f"Ошибка подписки на инвалидацию кэша: {e}")
+        finally:
+            local.disable()
+            await pubsub.aclose()
+            await tracker.aclose()
+        await asyncio.sleep(settings.CACHE_INVALIDATION_RETRY_IN_SECONDS)
+
+
+async def listen_changes(redis: Redis) -> None:
+    """
+    Сброс кэша по сообщениям ETL об изменении документов индексов: значений
+    с карточками измененных документов и всех списков и результатов поиска
+    по индексу. Сообщение без id сбрасывает весь кэш индекса.
+    """
+    while True:
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                try:
+                    change = orjson.loads(message["data"])
+                    index, ids = change["index"], change["ids"]
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.error(f"Некорректное сообщение об изменениях: {e}")
+                    continue
+                purged = await purge_tags(redis, change_tags(index, ids))
+                metrics.inc(
+                    "cache_purged_keys_total", {"index": index}, purged
+                )
+        except RedisError as e:
+            logger.error(f"Ошибка подписки на изменения индексов: {e}")
+        finally:
+            await pubsub.aclose()
+        await asyncio.sleep(settings.CACHE_INVALIDATION_RETRY_IN_SECONDS)
+
+
+single_flight = SingleFlight()
+local_cache = LocalCache(
+    max_bytes=settings.LOCAL_CACHE_MAX_BYTES,
+    ttl=settings.LOCAL_CACHE_EXPIRE_IN_SECONDS,
+)
+metrics.add_collector(_cache_ratios)
 
 
 @lru_cache()
 def get_cache_service(
     redis_instance: Redis = Depends(get_redis_instance),
 ) -> AbstractCacheService:
-    return RedisService(redis_instance)
+    return TwoTierCacheService(redis_instance, local_cache)
+
+
+async def get_response_cache_service() -> ResponseCacheService:
+    return ResponseCacheService(await get_redis_instance(), local_cache)
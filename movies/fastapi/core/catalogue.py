@@ -0,0 +1,226 @@
+"""
+Снимок небольших часто запрашиваемых коллекций в памяти процесса: все
+жанры, число фильмов каждого жанра и фильмы каждой персоны. Снимок
+загружается при запуске и обновляется по сообщениям ETL об изменении
+индексов, поэтому ответы из него не обращаются ни к Redis, ни к
+Elasticsearch. Пока часть снимка не загружена, эндпоинты берут данные из
+хранилища.
+"""
+import asyncio
+from typing import Callable
+from uuid import UUID
+
+import orjson
+from elasticsearch import ElasticsearchException
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from core.config import settings
+from core.enum import IndexName
+from core.es_queries import nested_counts, nested_counts_query, search_query
+from core.exceptions import InvalidCursorError
+from core.logger import logger
+from core.metrics import metrics
+from core.storage import AbstractStorage
+from models.genre import GenreShort
+from models.person import InnerPersonFilmsByUUID, PersonFIlmsByUUID
+
+metrics.describe(
+    "catalogue_loads_total",
+    "counter",
+    "Загрузки частей снимка каталога (part) из Elasticsearch.",
+)
+metrics.describe(
+    "catalogue_load_errors_total",
+    "counter",
+    "Ошибки обновления снимка каталога.",
+)
+
+GENRES = IndexName.genre.value
+MOVIES = IndexName.movies.value
+PERSONS = IndexName.persons.value
+
+PersonFilms = dict[UUID, list[InnerPersonFilmsByUUID]]
+
+
+async def load_genres(storage: AbstractStorage) -> list[GenreShort] | None:
+    """Все жанры в порядке выдачи списка жанров."""
+    return await storage.get_list_by_search(
+        index=GENRES,
+        model_class=GenreShort,
+        query=search_query(
+            size=settings.CATALOGUE_MAX_GENRES, model=GenreShort
+        ),
+    )
+
+
+async def load_genre_films(storage: AbstractStorage) -> dict[UUID, int] | None:
+    """Число фильмов каждого жанра."""
+    aggregations = await storage.get_aggregations(
+        index=MOVIES,
+        query=nested_counts_query("genre.uuid", settings.CATALOGUE_MAX_GENRES),
+    )
+    if aggregations is None:
+        return None
+    return {
+        UUID(uuid): count
+        for uuid, count in nested_counts(aggregations).items()
+    }
+
+
+async def load_person_films(storage: AbstractStorage) -> PersonFilms:
+    """
+    Фильмы всех персон. Персоны читаются страницами из одного снимка
+    индекса (point-in-time) по search_after.
+    """
+    query = search_query(
+        size=settings.CATALOGUE_PAGE_SIZE, model=PersonFIlmsByUUID
+    )
+    query["sort"] = [{"_shard_doc": {"order": "asc"}}]
+    person_films = {}
+    pit_id = await storage.open_point_in_time(PERSONS)
+    search_after = None
+    try:
+        while True:
+            persons, pit_id, search_after = await storage.get_page_after(
+                model_class=PersonFIlmsByUUID,
+                query=query,
+                pit_id=pit_id,
+                search_after=search_after,
+            )
+            for person in persons:
+                person_films[person.uuid] = person.films or []
+            if len(persons) < settings.CATALOGUE_PAGE_SIZE:
+                return person_films
+    finally:
+        await storage.close_point_in_time(pit_id)
+
+
+class Catalogue:
+    """
+    Снимок каталога. Изменения индексов накапливаются и применяются одной
+    фоновой задачей: жанры и число фильмов по жанрам загружаются заново
+    целиком, фильмы персон - только для измененных персон.
+    """
+
+    def __init__(self) -> None:
+        self.genres: list[GenreShort] | None = None
+        self.genre_films: dict[UUID, int] | None = None
+        self.person_films: PersonFilms | None = None
+        self.storage: AbstractStorage | None = None
+        # Изменения индексов, еще не примененные к снимку: id документов
+        # или None - изменен весь индекс.
+        self._changes: dict[str, set[str] | None] = {}
+        self._refresh: asyncio.Task | None = None
+
+    def films_of(
+        self, person_uuid: UUID
+    ) -> list[InnerPersonFilmsByUUID] | None:
+        """Фильмы персоны из снимка (None - персоны в снимке нет)."""
+        if self.person_films is None:
+            return None
+        return self.person_films.get(person_uuid)
+
+    def change(self, index: str, ids: list[str] | None) -> None:
+        """Учет изменения документов ids индекса (None - весь индекс)."""
+        if index not in (GENRES, MOVIES, PERSONS):
+            return
+        if ids is None:
+            self._changes[index] = None
+        elif (pending := self._changes.setdefault(index, set())) is not None:
+            pending.update(ids)
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self._apply_changes())
+
+    async def listen(self, redis: Redis, storage: AbstractStorage) -> None:
+        """
+        Обновление снимка по сообщениям ETL. После каждой подписки снимок
+        загружается целиком: так он заполняется при запуске и не теряет
+        изменений, опубликованных, пока подписки не было.
+        """
+        self.storage = storage
+        while True:
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+                for index in (GENRES, MOVIES, PERSONS):
+                    self.change(index, None)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    # Некорректные сообщения журналирует listen_changes.
+                    try:
+                        change = orjson.loads(message["data"])
+                        self.change(change["index"], change["ids"])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+            except RedisError as e:
+                logger.error(f"Ошибка подписки на изменения каталога: {e}")
+            finally:
+                await pubsub.aclose()
+            await asyncio.sleep(settings.CATALOGUE_RETRY_IN_SECONDS)
+
+    def close(self) -> None:
+        """Остановка обновления снимка."""
+        if self._refresh is not None:
+            self._refresh.cancel()
+
+    async def _apply_changes(self) -> None:
+        """
+        Применение накопленных изменений. При ошибке снимок остается
+        прежним, а изменения применяются повторно.
+        """
+        while self._changes:
+            await asyncio.sleep(settings.CATALOGUE_REFRESH_DELAY_IN_SECONDS)
+            changes, self._changes = self._changes, {}
+            try:
+                await self._load(changes)
+            except (ElasticsearchException, InvalidCursorError) as e:
+                metrics.inc("catalogue_load_errors_total")
+                logger.error(f"Ошибка обновления снимка каталога: {e}")
+                for index, ids in changes.items():
+                    self.change(index, None if ids is None else list(ids))
+                await asyncio.sleep(settings.CATALOGUE_RETRY_IN_SECONDS)
+
+    async def _load(self, changes: dict[str, set[str] | None]) -> None:
+        if GENRES in changes:
+            self._set("genres", await load_genres(self.storage))
+        if MOVIES in changes:
+            self._set("genre_films", await load_genre_films(self.storage))
+        if PERSONS not in changes:
+            return
+        if (ids := changes[PERSONS]) is None or self.person_films is None:
+            self._set("person_films", await load_person_films(self.storage))
+            return
+        uuids = [UUID(uuid) for uuid in ids]
+        persons = await self.storage.get_many_by_ids(
+            index=PERSONS, model_class=PersonFIlmsByUUID, uuids=uuids
+        )
+        metrics.inc("catalogue_loads_total", {"part": "person_films"})
+        for uuid in uuids:
+            if (person := persons.get(uuid)) is None:
+                self.person_films.pop(uuid, None)
+            else:
+                self.person_films[uuid] = person.films or []
+
+    def _set(self, part: str, value) -> None:
+        """Замена части снимка; None (ошибка загрузки) ее не меняет."""
+        if value is not None:
+            setattr(self, part, value)
+            metrics.inc("catalogue_loads_total", {"part": part})
+
+
+def from_catalogue(endpoint: Callable) -> Callable:
+    """
+    Отметка эндпоинта, который отвечает из снимка: готовые ответы ему
+    кэшировать не нужно, пока снимок включен.
+    """
+    endpoint.response_cache = not settings.CATALOGUE_ENABLED
+    return endpoint
+
+
+catalogue = Catalogue()
+
+
+def get_catalogue() -> Catalogue:
+    return catalogue
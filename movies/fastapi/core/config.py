@@ -17,11 +17,79 @@ class Settings(BaseSettings):
     # Настройки Redis
     REDIS_HOST: str = Field(default="127.0.0.1")
     REDIS_PORT: int = Field(default=6379)
+    # Пул соединений Redis: при занятых REDIS_MAX_CONNECTIONS запрос ждет
+    # свободного соединения не дольше REDIS_POOL_TIMEOUT_IN_SECONDS. Ошибки
+    # соединения и тайм-ауты повторяются REDIS_RETRIES раз; простаивающее
+    # соединение проверяется PING перед использованием.
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT_IN_SECONDS: float = 1
+    REDIS_SOCKET_TIMEOUT_IN_SECONDS: float = 1
+    REDIS_CONNECT_TIMEOUT_IN_SECONDS: float = 1
+    REDIS_HEALTH_CHECK_INTERVAL_IN_SECONDS: int = 30
+    REDIS_RETRIES: int = 2
     CACHE_EXPIRE_IN_SECONDS: int = 60 * 5  # 5 минут
+    # Пространство имен и версия ключей кэша
+    CACHE_KEY_NAMESPACE: str = "api"
+    CACHE_KEY_VERSION: int = 1
+    # Защита от одновременных промахов кэша: устаревшее значение отдается
+    # еще CACHE_STALE_IN_SECONDS, пока загружается новое; значение
+    # обновляется заранее с вероятностью, зависящей от
+    # CACHE_EARLY_REFRESH_BETA (0 - без раннего обновления). Блокировка в
+    # Redis объединяет загрузки одного значения разными процессами.
+    CACHE_STALE_IN_SECONDS: int = 60
+    CACHE_EARLY_REFRESH_BETA: float = 1.0
+    CACHE_LOCK_ENABLED: bool = False
+    CACHE_LOCK_TIMEOUT_IN_SECONDS: int = 10
+    CACHE_LOCK_WAIT_IN_SECONDS: float = 5
+    CACHE_LOCK_POLL_IN_SECONDS: float = 0.05
+    # Локальный кэш процесса перед Redis
+    LOCAL_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    LOCAL_CACHE_EXPIRE_IN_SECONDS: int = 30
+    CACHE_INVALIDATION_RETRY_IN_SECONDS: int = 5
+    # Канал сообщений ETL об изменении документов индексов. Кэш сбрасывается
+    # по ним, поэтому CACHE_EXPIRE_IN_SECONDS можно увеличить до часов.
+    CACHE_INVALIDATION_CHANNEL: str = "cache:invalidate"
+    # Кэширование готовых тел ответов списков и карточек без проверки токена
+    RESPONSE_CACHE_ENABLED: bool = True
     # Настройки Elasticsearch
     ELASTIC_HOST: str = Field(default="127.0.0.1", alias="ES_HOST")
     ELASTIC_PORT: int = Field(default=9200, alias="ES_PORT")
+    # Соединений на узел, тайм-аут и повторы запроса (в том числе по
+    # тайм-ауту на другом узле). Узел с ошибкой исключается на
+    # ELASTIC_DEAD_TIMEOUT_IN_SECONDS. С ELASTIC_SNIFF список узлов
+    # кластера запрашивается при запуске, при ошибке соединения и каждые
+    # ELASTIC_SNIFF_INTERVAL_IN_SECONDS.
+    ELASTIC_MAX_CONNECTIONS: int = 10
+    ELASTIC_TIMEOUT_IN_SECONDS: float = 2
+    ELASTIC_MAX_RETRIES: int = 2
+    ELASTIC_DEAD_TIMEOUT_IN_SECONDS: int = 30
+    ELASTIC_SNIFF: bool = False
+    ELASTIC_SNIFF_INTERVAL_IN_SECONDS: int = 60
+    # Бюджет времени запроса к API: тайм-ауты обращений к Elasticsearch с
+    # повторами не превышают его остатка
+    REQUEST_BUDGET_IN_SECONDS: float = 5
     STANDART_PAGE_SIZE: int = 50
+    # Время жизни point-in-time выдачи по курсору между запросами страниц
+    CURSOR_KEEP_ALIVE: str = "1m"
+    # Наибольшее число uuid в одном запросе /batch
+    BATCH_MAX_SIZE: int = 100
+    # Снимок жанров, числа фильмов по жанрам и фильмов персон в памяти
+    # процесса. Загружается при запуске и обновляется по сообщениям ETL из
+    # CACHE_INVALIDATION_CHANNEL; сообщения за
+    # CATALOGUE_REFRESH_DELAY_IN_SECONDS объединяются в одно обновление.
+    # Персоны загружаются страницами по CATALOGUE_PAGE_SIZE.
+    CATALOGUE_ENABLED: bool = True
+    CATALOGUE_REFRESH_DELAY_IN_SECONDS: float = 1
+    CATALOGUE_RETRY_IN_SECONDS: int = 5
+    CATALOGUE_PAGE_SIZE: int = 1000
+    CATALOGUE_MAX_GENRES: int = 1000
+    # Фасеты поиска фильмов: границы интервалов рейтинга и наибольшее
+    # число значений фасета
+    FACET_RATING_BOUNDS: list[float] = [5, 6, 7, 8, 9]
+    FACET_MAX_VALUES: int = 100
+    # Число подсказок /suggest по умолчанию и наибольшее
+    SUGGEST_SIZE: int = 5
+    SUGGEST_MAX_SIZE: int = 20
     DESCRIPTION: str = (
         "Информация о фильмах, жанрах и людях, участвовавших в создании"
         "кинопроизведения"
@@ -33,6 +101,16 @@ class Settings(BaseSettings):
     # JWT
     JWT_SECRET: str = Field(default="Secret encode token")
     JWT_CODE: str = "utf-8"
+    # Число проверенных токенов, хранимых в памяти процесса (0 - без кэша)
+    JWT_CACHE_MAX_SIZE: int = 10000
+    # Redis сервиса auth: отозванные при выходе токены. Их хэши хранятся в
+    # памяти процесса, новые приходят через канал REVOKED_TOKENS_CHANNEL,
+    # а при подключении загружаются из множества REVOKED_TOKENS_KEY.
+    AUTH_REDIS_HOST: str = Field(default="127.0.0.1")
+    AUTH_REDIS_PORT: int = Field(default=5379)
+    REVOKED_TOKENS_KEY: str = "tokens:revoked"
+    REVOKED_TOKENS_CHANNEL: str = "tokens:revoked"
+    TOKEN_REVOCATION_RETRY_IN_SECONDS: int = 5
 
 
 settings = Settings()
@@ -0,0 +1,51 @@
+"""Курсор постраничной выдачи по search_after внутри point-in-time."""
+import base64
+import binascii
+from dataclasses import dataclass
+from typing import Any
+
+import orjson
+
+from core.exceptions import InvalidCursorError
+
+# Значение курсора, начинающее новую выдачу.
+FIRST_CURSOR = "*"
+# Заголовок ответа с курсором следующей страницы.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+@dataclass
+class Cursor:
+    """
+    Положение в выдаче: point-in-time индекса, значения сортировки
+    последнего отданного документа и отпечаток параметров запроса, для
+    которых курсор выдан.
+    """
+
+    pit_id: str
+    search_after: list[Any] | None
+    query: str
+
+    def encode(self) -> str:
+        """Непрозрачное для клиента значение курсора."""
+        return base64.urlsafe_b64encode(
+            orjson.dumps(
+                {
+                    "pit": self.pit_id,
+                    "after": self.search_after,
+                    "query": self.query,
+                }
+            )
+        ).decode()
+
+    @classmethod
+    def decode(cls, token: str) -> "Cursor":
+        try:
+            data = orjson.loads(base64.urlsafe_b64decode(token))
+            return cls(
+                pit_id=data["pit"],
+                search_after=data["after"],
+                query=data["query"],
+            )
+        except (binascii.Error, ValueError, KeyError, TypeError) as e:
+            raise InvalidCursorError(token) from e
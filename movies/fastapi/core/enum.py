@@ -2,7 +2,10 @@ from enum import Enum
 
 
 class IndexName(str, Enum):
-    """Модель названий индексов в Elasticsearch."""
+    """
+    Модель названий индексов в Elasticsearch. Это псевдонимы: ETL собирает
+    новую версию индекса и атомарно переключает на нее псевдоним.
+    """
 
     genre = "genres"
     movies = "movies"
@@ -27,6 +30,14 @@ class APIFilmByUUIDDescription(str, Enum):
     response_description = "Описание кинопроизведения"
 
 
+class APIFilmBatchDescription(str, Enum):
+    """Модель описания запроса фильмов по нескольким UUID"""
+
+    summary = "Информация о нескольких кинопроизведениях"
+    description = "Детальная информация о кинопроизведениях по списку UUID"
+    response_description = "Описания найденных кинопроизведений"
+
+
 class APIFilmSearchDescription(str, Enum):
     """Модель описания запроса поиска фильма по имени."""
 
@@ -51,6 +62,14 @@ class APIGenreByUUIDDescription(str, Enum):
     response_description = "Возвращает информацию о жанре"
 
 
+class APIGenreBatchDescription(str, Enum):
+    """Модель описания запроса жанров по нескольким UUID"""
+
+    summary = "Информация о нескольких жанрах"
+    description = "Детальная информация о жанрах по списку uuid"
+    response_description = "Возвращает информацию о найденных жанрах"
+
+
 class APIGenreMainDescription(str, Enum):
     """Модель описания запроса выдачи списка жанров."""
 
@@ -59,6 +78,14 @@ class APIGenreMainDescription(str, Enum):
     response_description = "Список всех жанров"
 
 
+class APIGenreFilmsCountDescription(str, Enum):
+    """Модель описания запроса числа кинопроизведений по жанрам."""
+
+    summary = "Жанры с числом кинопроизведений"
+    description = "Каталог жанров с числом кинопроизведений каждого жанра"
+    response_description = "Список всех жанров с числом кинопроизведений"
+
+
 class APICommonDescription(str, Enum):
     """Модель описания общих полей-параметров к энпоинтам API."""
 
@@ -66,6 +93,17 @@ class APICommonDescription(str, Enum):
     page_size = "Количество результатов на странице"
     query = "Строка запроса для поиска по наименованию"
     sort = "Поле сортировки (например, -name)"
+    prefix = "Начало названия или имени"
+    suggest_size = "Количество подсказок каждого вида"
+    genre = "Фильтр фильмов по uuid жанра"
+    facets = (
+        "Вернуть вместе со страницей число фильмов по жанрам, интервалам "
+        "рейтинга и доступности только подписчикам"
+    )
+    cursor = (
+        "Курсор страницы: * - первая страница, далее значение заголовка "
+        "X-Next-Cursor предыдущего ответа. Заменяет номер страницы"
+    )
 
 
 class APIPersonByUUIDDescription(str, Enum):
@@ -78,6 +116,16 @@ class APIPersonByUUIDDescription(str, Enum):
     )
 
 
+class APIPersonBatchDescription(str, Enum):
+    """Модель описания запроса персон по нескольким UUID"""
+
+    summary = "Данные по нескольким персонам"
+    description = "Детальная информация о персонах по списку uuid"
+    response_description = (
+        "Информация о найденных персонах и списки фильмов с их участием"
+    )
+
+
 class APIPersonSearchDescription(str, Enum):
     """Модель описания запроса поиска персон по имени."""
 
@@ -94,6 +142,17 @@ class APIPersonFilmsByUUID(str, Enum):
     response_description = "Краткая информация по фильмам"
 
 
+class APISuggestDescription(str, Enum):
+    """Модель описания запроса подсказок для поисковой строки."""
+
+    summary = "Подсказки поиска"
+    description = (
+        "Кинопроизведения и персоны, название или имя которых начинается "
+        "с введенной строки"
+    )
+    response_description = "Списки подходящих кинопроизведений и персон"
+
+
 class ErrorMessage(str, Enum):
     """Модель ответов, отдаваемых при ошибке."""
 
@@ -103,6 +162,9 @@ class ErrorMessage(str, Enum):
     genres_not_found = "Жанры не найдены"
     person_not_found = "Персона не найдена"
     persons_not_found = "Персоны не найдены"
+    invalid_cursor = "Курсор недействителен, начните выдачу заново"
+    facets_with_cursor = "Фасеты не выдаются при выдаче по курсору"
+    budget_exceeded = "Время обработки запроса истекло"
 
     def __str__(self) -> str:
         return str.__str__(self)
@@ -1,44 +1,281 @@
-# шаблон для поиска по вложенным документам (nested type в elasticsearch)
-# значения передаются nested_path: str, nested_match: dict''
-NESTED_QUERY = """
-            {
-                "nested": {
-                    "path": "%(key_path)s",
-                    "query": {
-                        "bool": {
-                            "filter": [
-                                {"term": {"%(key)s": "%(value)s"}}
-                            ]
-                        }
-                    }
+"""
+Построение тел поисковых запросов в Elasticsearch в виде словарей.
+
+Форма запроса (сортировка, поля полнотекстового поиска, поля фильтров по
+вложенным документам, оператор bool) компилируется в шаблон один раз и
+кэшируется; на каждый запрос в шаблон подставляются только значения.
+Значения не интерполируются в текст JSON, поэтому кавычки в них не ломают
+запрос.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, get_args, get_origin
+
+from pydantic import BaseModel
+
+from core.models import SortOrder
+
+Query = dict[str, Any]
+
+# Используется, если условий поиска нет.
+MATCH_ALL: Query = {"match_all": {}}
+# Имя подсказки в запросе и ответе suggest_query.
+SUGGESTION = "suggestion"
+# Имя агрегации в запросе и ответе nested_counts_query.
+NESTED_COUNTS = "nested_counts"
+
+
+def match_query(key: str, value: Any) -> Query:
+    """Полнотекстовый поиск значения в поле key."""
+    return {"match": {key: value}}
+
+
+def nested_filter(key: str, value: Any) -> Query:
+    """
+    Точное совпадение поля вложенного документа (nested type), например
+    genre.uuid. Условие не влияет на оценку релевантности.
+    """
+    return {
+        "nested": {
+            "path": key.split(".")[0],
+            "query": {"bool": {"filter": [{"term": {key: str(value)}}]}},
+        }
+    }
+
+
+def sort_clause(sort: str | None) -> list[Query]:
+    """Сортировка по полю: "-поле" - по убыванию, None - по релевантности."""
+    if not sort:
+        return []
+    direction = SortOrder.ascending
+    if sort.startswith("-"):
+        sort = sort[1:]
+        direction = SortOrder.descending
+    return [{sort: {"order": direction.value}}]
+
+
+@lru_cache(maxsize=None)
+def source_fields(model: type[BaseModel]) -> tuple[str, ...]:
+    """
+    Поля _source, из которых строится модель, включая поля вложенных
+    моделей (genre.uuid, genre.name...). Остальные поля документа
+    Elasticsearch не возвращает.
+    """
+    fields = []
+    for name, field in model.model_fields.items():
+        if (nested := _nested_model(field.annotation)) is None:
+            fields.append(name)
+        else:
+            fields.extend(f"{name}.{sub}" for sub in source_fields(nested))
+    return tuple(fields)
+
+
+def _nested_model(annotation: Any) -> type[BaseModel] | None:
+    """Модель в аннотации поля: Model, list[Model], Model | None..."""
+    if get_origin(annotation) is None:
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            return annotation
+        return None
+    for arg in get_args(annotation):
+        if (model := _nested_model(arg)) is not None:
+            return model
+    return None
+
+
+@dataclass(frozen=True)
+class SearchTemplate:
+    """
+    Скомпилированная форма поискового запроса. Точные фильтры по вложенным
+    документам при операторе must попадают в контекст filter: они не
+    влияют на оценку, и Elasticsearch кэширует их результат. Части
+    шаблона общие для всех запросов и не должны изменяться.
+    """
+
+    sort: list[Query]
+    match_keys: tuple[str, ...]
+    nested_keys: tuple[str, ...]
+    bool_operator: str
+    source: list[str] | None = None
+
+    def render(
+        self,
+        size: int,
+        from_: int | None = None,
+        match_values: tuple[Any, ...] = (),
+        nested_values: tuple[Any, ...] = (),
+    ) -> Query:
+        """Тело запроса со значениями условий (from_=None - без смещения)."""
+        clauses = [
+            match_query(key, value)
+            for key, value in zip(self.match_keys, match_values)
+        ]
+        filters = [
+            nested_filter(key, value)
+            for key, value in zip(self.nested_keys, nested_values)
+        ]
+        if self.bool_operator != "must":
+            clauses.extend(filters)
+            filters = []
+        if clauses:
+            bool_query = {self.bool_operator: clauses}
+        elif filters:
+            bool_query = {}
+        else:
+            bool_query = {"must": MATCH_ALL}
+        if filters:
+            bool_query["filter"] = filters
+        query = {
+            "size": size,
+            "sort": self.sort,
+            "query": {"bool": bool_query},
+        }
+        if from_ is not None:
+            query["from"] = from_
+        if self.source is not None:
+            query["_source"] = self.source
+        return query
+
+
+@lru_cache(maxsize=256)
+def search_template(
+    sort: str | None,
+    match_keys: tuple[str, ...],
+    nested_keys: tuple[str, ...],
+    bool_operator: str,
+    source: tuple[str, ...] | None = None,
+) -> SearchTemplate:
+    """Шаблон запроса заданной формы (кэшируется)."""
+    return SearchTemplate(
+        sort=sort_clause(sort),
+        match_keys=match_keys,
+        nested_keys=nested_keys,
+        bool_operator=bool_operator,
+        source=None if source is None else list(source),
+    )
+
+
+def search_query(
+    size: int,
+    from_: int | None = None,
+    sort: str | None = None,
+    matches: dict | None = None,
+    nested_matches: dict | None = None,
+    bool_operator: str = "should",
+    model: type[BaseModel] | None = None,
+) -> Query:
+    """
+    Тело поискового запроса: matches - {поле: строка полнотекстового
+    поиска}, nested_matches - {поле вложенного документа: точное значение},
+    model - модель, поля которой запрашиваются из _source (None - все
+    поля документа).
+    """
+    matches = matches or {}
+    nested_matches = nested_matches or {}
+    template = search_template(
+        sort,
+        tuple(matches),
+        tuple(nested_matches),
+        bool_operator,
+        None if model is None else source_fields(model),
+    )
+    return template.render(
+        size=size,
+        from_=from_,
+        match_values=tuple(matches.values()),
+        nested_values=tuple(nested_matches.values()),
+    )
+
+
+def suggest_query(
+    field: str,
+    prefix: str,
+    size: int,
+    model: type[BaseModel] | None = None,
+) -> Query:
+    """
+    Тело запроса подсказок completion: size документов, у которых значение
+    поля field начинается с prefix. Поиск документов (hits) не выполняется.
+    """
+    query = {
+        "size": 0,
+        "suggest": {
+            SUGGESTION: {
+                "prefix": prefix,
+                "completion": {"field": field, "size": size},
+            }
+        },
+    }
+    if model is not None:
+        query["_source"] = list(source_fields(model))
+    return query
+
+
+def terms_facet(field: str, size: int) -> Query:
+    """Агрегация числа документов по значениям поля (не больше size)."""
+    return {"terms": {"field": field, "size": size}}
+
+
+def nested_terms_facet(field: str, size: int) -> Query:
+    """
+    Агрегация числа документов по значениям поля вложенного документа,
+    например фильмов каждого жанра по genre.uuid (не больше size значений).
+    """
+    return {
+        "nested": {"path": field.split(".")[0]},
+        "aggs": {
+            "values": {
+                **terms_facet(field, size),
+                "aggs": {"documents": {"reverse_nested": {}}},
+            }
+        },
+    }
+
+
+def range_facet(field: str, bounds: list[float]) -> Query:
+    """
+    Агрегация числа документов по интервалам значений поля между
+    границами bounds (первый и последний интервалы открыты).
+    """
+    edges = [None, *bounds, None]
+    return {
+        "range": {
+            "field": field,
+            "ranges": [
+                {
+                    key: value
+                    for key, value in (("from", start), ("to", end))
+                    if value is not None
                 }
-            }"""
-
-# используется если matches отсутствует
-MATCH_ALL = """"must": {"match_all": {}}"""
-
-# значения передаются параметрами matches: dict
-# {поле в индексе: значение по которому ищем}
-MATCH_QUERY = """{"match": {"%(key)s": "%(value)s"}}"""
-
-# передаем (bool_operator "must"|"should"|"must_not",
-# bool_base|bool_nested MATCH_ALL|MATCH_QUERY|NESTED_QUERY)
-BOOL = """"%(bool_operator)s": [%(bool)s]"""
-
-# значения передаются параметром sorts: dict
-SORT = """{"%(key)s": {"order": "%(value)s"}}"""
-
-# шаблон верхнего уровня
-# значения передаются параметрами from_: int, size: int, sort: str, bool: str
-# sort = "SORT, SORT..."
-# bool_ = "BOOL, BOOL..."
-QUERY_BASE = """{
-    "from": %(from_)d,
-    "size": %(page_size)d,
-    "sort": [%(sort)s],
-    "query": {
-        "bool": {
-            %(bool)s
+                for start, end in zip(edges, edges[1:])
+            ],
+        }
+    }
+
+
+def facet_counts(aggregation: Query) -> dict[str, int]:
+    """Число документов по значениям из ответа на агрегацию *_facet."""
+    if "values" in aggregation:
+        return {
+            str(bucket["key"]): bucket["documents"]["doc_count"]
+            for bucket in aggregation["values"]["buckets"]
         }
+    return {
+        str(bucket.get("key_as_string", bucket["key"])): bucket["doc_count"]
+        for bucket in aggregation["buckets"]
     }
-}"""
+
+
+def nested_counts_query(field: str, size: int) -> Query:
+    """
+    Тело запроса числа документов по значениям поля вложенного документа
+    (nested_terms_facet). Документы не возвращаются.
+    """
+    return {
+        "size": 0,
+        "aggs": {NESTED_COUNTS: nested_terms_facet(field, size)},
+    }
+
+
+def nested_counts(aggregations: Query) -> dict[str, int]:
+    """Число документов по значениям из ответа на nested_counts_query."""
+    return facet_counts(aggregations[NESTED_COUNTS])
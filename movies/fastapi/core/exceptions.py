@@ -3,3 +3,11 @@
 
 class ElasticsearchError(Exception):
     pass
+
+
+class InvalidCursorError(Exception):
+    """Курсор выдачи поврежден, истек или выдан для других параметров."""
+
+
+class LatencyBudgetExceededError(Exception):
+    """Бюджет времени запроса к API исчерпан до ответа хранилища."""
@@ -0,0 +1,67 @@
+"""Метрики API в текстовом формате Prometheus."""
+from typing import Callable, Iterable
+
+# Значение метрики, вычисляемое при выдаче: имя, метки, значение.
+Sample = tuple[str, dict[str, str], float]
+
+
+class Metrics:
+    """Реестр счетчиков и значений процесса API."""
+
+    def __init__(self) -> None:
+        self._descriptions: dict[str, tuple[str, str]] = {}
+        self._values: dict[tuple, float] = {}
+        self._collectors: list[Callable[[], Iterable[Sample]]] = []
+
+    @staticmethod
+    def _key(name: str, labels: dict[str, str] | None) -> tuple:
+        return name, tuple(sorted((labels or {}).items()))
+
+    def describe(self, name: str, kind: str, description: str) -> None:
+        """Описание метрики: тип (counter, gauge) и назначение."""
+        self._descriptions[name] = (kind, description)
+
+    def inc(
+        self, name: str, labels: dict[str, str] | None = None, value=1
+    ) -> None:
+        """Увеличение счетчика."""
+        key = self._key(name, labels)
+        self._values[key] = self._values.get(key, 0) + value
+
+    def set(
+        self, name: str, labels: dict[str, str] | None, value: float
+    ) -> None:
+        """Установка значения."""
+        self._values[self._key(name, labels)] = value
+
+    def get(self, name: str, labels: dict[str, str] | None = None) -> float:
+        """Текущее значение метрики."""
+        return self._values.get(self._key(name, labels), 0)
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        """Регистрация функции, вычисляющей значения при выдаче метрик."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Метрики в текстовом формате Prometheus."""
+        values = dict(self._values)
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                values[self._key(name, labels)] = value
+        lines = []
+        for name, (kind, description) in self._descriptions.items():
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: tuple) -> str:
+    """Метки метрики в формате Prometheus."""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+metrics = Metrics()
@@ -0,0 +1,80 @@
+"""Маршруты API с кэшированием готовых ответов."""
+from http import HTTPStatus
+from typing import Any, Callable, Coroutine
+
+from fastapi import Request, Response
+from fastapi.dependencies.utils import (
+    get_flat_dependant,
+    request_params_to_args,
+)
+from fastapi.routing import APIRoute
+
+from core.cache import cache_key, get_response_cache_service, request_tags
+from core.config import settings
+
+
+class CachedResponseRoute(APIRoute):
+    """
+    Маршрут, кэширующий тело успешного ответа на GET-запрос по ключу
+    запроса. При попадании тело отдается как есть: без обращения к
+    сервисам, создания моделей и их сериализации по response_model.
+    Маршруты с проверкой токена не кэшируются: их ответ зависит от прав
+    пользователя. Не кэшируются эндпоинты с атрибутом response_cache =
+    False и ответы с Cache-Control: no-store. Ответ
+    получает теги значений кэша сервисов, из которых он собран, и
+    сбрасывается вместе с ними.
+    """
+
+    def get_route_handler(
+        self,
+    ) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+        self.flat_dependant = get_flat_dependant(self.dependant)
+        if (
+            not settings.RESPONSE_CACHE_ENABLED
+            or "GET" not in self.methods
+            or self.flat_dependant.security_requirements
+            or not getattr(self.endpoint, "response_cache", True)
+        ):
+            return handler
+
+        async def cached_handler(request: Request) -> Response:
+            if (key := self.response_key(request)) is None:
+                return await handler(request)
+            cache = await get_response_cache_service()
+            if (body := await cache.get_response(key)) is not None:
+                return Response(content=body, media_type="application/json")
+            tags = request_tags.set(set())
+            try:
+                response = await handler(request)
+                if response.status_code == HTTPStatus.OK and (
+                    "no-store" not in response.headers.get("cache-control", "")
+                ):
+                    await cache.put_response(
+                        key, response.body, request_tags.get()
+                    )
+            finally:
+                request_tags.reset(tags)
+            return response
+
+        return cached_handler
+
+    def response_key(self, request: Request) -> str | None:
+        """
+        Ключ ответа из шаблона пути и проверенных значений параметров пути
+        и запроса (с учетом значений по умолчанию). Необъявленные параметры
+        не учитываются. При ошибке проверки ответ не кэшируется.
+        """
+        path_values, path_errors = request_params_to_args(
+            self.flat_dependant.path_params, request.path_params
+        )
+        query_values, query_errors = request_params_to_args(
+            self.flat_dependant.query_params, request.query_params
+        )
+        if path_errors or query_errors:
+            return None
+        return cache_key(
+            "response",
+            path=self.path_format,
+            params={**path_values, **query_values},
+        )
@@ -1,22 +1,36 @@
 """Общие сервисы для эндроинтов API."""
+import asyncio
+from contextlib import suppress
+from time import monotonic, time
+from typing import Awaitable, Callable
 from uuid import UUID
 
-from fastapi import Request
 from pydantic import BaseModel
+from redis.exceptions import LockError
 
-from core.cache import AbstractCacheService
+from core.cache import (
+    AbstractCacheService,
+    CacheEntry,
+    add_request_tags,
+    cache_key,
+    index_tags,
+    single_flight,
+)
 from core.config import settings
+from core.cursor import FIRST_CURSOR, Cursor
+from core.enum import IndexName
 from core.es_queries import (
-    BOOL,
-    MATCH_ALL,
-    MATCH_QUERY,
-    NESTED_QUERY,
-    QUERY_BASE,
-    SORT,
+    Query,
+    facet_counts,
+    search_query,
+    suggest_query,
 )
-from core.models import SortOrder
+from core.exceptions import InvalidCursorError
+from core.metrics import metrics
 from core.storage import ElasticService
 
+Loader = Callable[[], Awaitable[list[BaseModel] | None]]
+
 
 class CommonService:
     def __init__(
@@ -30,41 +44,95 @@ class CommonService:
         self.elastic = elastic
         self.model = model
         self.index = index
+        # Имя индекса в тегах кэша совпадает с именем в сообщениях ETL.
+        self.tag = IndexName(index).value
 
-    async def get_by_uuid(
-        self, uuid: UUID, request: Request
-    ) -> BaseModel | None:
+    async def get_by_uuid(self, uuid: UUID) -> BaseModel | None:
         """Метод поиска в индексе по UUID."""
-        if instances := await self.cache.get_instances_from_cache(
-            request=request, model=self.model
-        ):
+
+        async def load() -> list[BaseModel]:
+            instance = await self.elastic.get_one_by_id(
+                index=self.index, model_class=self.model, uuid=uuid
+            )
+            return [instance] if instance else []
+
+        key = self._cache_key(uuid=uuid)
+        tags = index_tags(self.tag, uuid)
+        if instances := await self._get_cached(key, tags, load):
             return instances[-1]
-        if instance := await self.elastic.get_one_by_id(
-            index=self.index, model_class=self.model, uuid=uuid
-        ):
-            await self.cache.put_instances_to_cache(
-                request=request, instances=[instance]
+
+    async def get_by_uuids(self, uuids: list[UUID]) -> list[BaseModel]:
+        """
+        Метод поиска в индексе по нескольким UUID. Значения берутся из кэша
+        одним MGET, недостающие и устаревшие загружаются одним mget из
+        хранилища и сохраняются в кэш одним конвейером. Ключи общие с
+        get_by_uuid. Порядок совпадает с uuids, ненайденные пропускаются.
+        """
+        uuids = list(dict.fromkeys(uuids))
+        keys = {uuid: self._cache_key(uuid=uuid) for uuid in uuids}
+        tags = {uuid: index_tags(self.tag, uuid) for uuid in uuids}
+        for uuid_tags in tags.values():
+            add_request_tags(uuid_tags)
+        entries = await self.cache.get_entries_from_cache(
+            keys=list(keys.values()), model=self.model
+        )
+        found = {
+            uuid: entry.instances[-1]
+            for uuid, entry in zip(uuids, entries)
+            if entry is not None and not entry.is_stale()
+        }
+        if misses := [uuid for uuid in uuids if uuid not in found]:
+            metrics.inc("cache_loads_total", {"reason": "batch"}, len(misses))
+            started = monotonic()
+            loaded = await self.elastic.get_many_by_ids(
+                index=self.index, model_class=self.model, uuids=misses
+            )
+            expires = time() + settings.CACHE_EXPIRE_IN_SECONDS
+            delta = monotonic() - started
+            await self.cache.put_entries_to_cache(
+                (
+                    keys[uuid],
+                    CacheEntry([instance], expires=expires, delta=delta),
+                    tags[uuid],
+                )
+                for uuid, instance in loaded.items()
             )
-            return instance
+            found.update(loaded)
+        return [found[uuid] for uuid in uuids if uuid in found]
 
     async def get_list(
         self,
-        request: Request,
         page_number: int = 1,
         page_size: int = settings.STANDART_PAGE_SIZE,
         sort: str = None,
         matches: dict = None,
         nested_matches: dict = None,
         bool_operator: str = "should",
+        model: BaseModel | None = None,
     ) -> list[BaseModel | None]:
-        """Метод получения списка из индекса по заданным параметрам."""
-        if instances := await self.cache.get_instances_from_cache(
-            request=request, model=self.model
-        ):
-            return instances
-        if sort:
-            sort = self._get_sort(sort=sort)
-        es_query = self._get_es_query(
+        """
+        Метод получения списка из индекса по заданным параметрам. Модель
+        model (по умолчанию модель сервиса) строится прямо из полей
+        документа, запрошенных через _source.
+        """
+        model = model or self.model
+
+        async def load() -> list[BaseModel] | None:
+            es_query = search_query(
+                size=page_size,
+                from_=(page_number - 1) * page_size,
+                sort=sort,
+                matches=matches,
+                nested_matches=nested_matches,
+                bool_operator=bool_operator,
+                model=model,
+            )
+            return await self.elastic.get_list_by_search(
+                index=self.index, model_class=model, query=es_query
+            )
+
+        key = self._cache_key(
+            model=model,
             page_number=page_number,
             page_size=page_size,
             sort=sort,
@@ -72,68 +140,269 @@ class CommonService:
             nested_matches=nested_matches,
             bool_operator=bool_operator,
         )
-        list_instances = await self.elastic.get_list_by_search(
-            index=self.index, model_class=self.model, query=es_query
-        )
-        if list_instances:
-            await self.cache.put_instances_to_cache(
-                request=request, instances=list_instances
-            )
-        return list_instances
+        return await self._get_cached(key, index_tags(self.tag), load, model)
 
-    @staticmethod
-    def _get_es_query(
-        sort: str,
+    async def get_faceted_list(
+        self,
+        facets: dict[str, Query],
+        facets_model: BaseModel,
         page_number: int = 1,
         page_size: int = settings.STANDART_PAGE_SIZE,
+        sort: str = None,
         matches: dict = None,
         nested_matches: dict = None,
         bool_operator: str = "should",
-    ):
-        """Метод получения тела запроса в Elasticsearch."""
-        if sort is None:
-            sort = ""
-        bool_base = ""
-        bool_nested = ""
-        from_ = (page_number - 1) * page_size
-        if matches:
-            bool_base = ",".join(
-                (MATCH_QUERY % {"key": key, "value": value})
-                for key, value in matches.items()
+        model: BaseModel | None = None,
+    ) -> tuple[list[BaseModel] | None, BaseModel | None]:
+        """
+        Метод получения страницы списка (как get_list) и фасетов - числа
+        документов по значениям агрегаций facets для тех же условий - за
+        одно обращение к хранилищу. Фасеты не зависят от страницы и
+        кэшируются отдельно как объект facets_model с полями {имя фасета:
+        {значение: число}}: при попадании страница берется через get_list,
+        а при промахе загруженная вместе с фасетами страница сохраняется в
+        кэш get_list.
+        """
+        model = model or self.model
+        params = {
+            "sort": sort,
+            "matches": matches,
+            "nested_matches": nested_matches,
+            "bool_operator": bool_operator,
+        }
+        tags = index_tags(self.tag)
+        list_key = self._cache_key(
+            model=model, page_number=page_number, page_size=page_size, **params
+        )
+        loaded = {}
+
+        async def load() -> list[BaseModel] | None:
+            es_query = search_query(
+                size=page_size,
+                from_=(page_number - 1) * page_size,
+                model=model,
+                **params,
             )
-        if nested_matches:
-            bool_nested = ",".join(
-                (
-                    NESTED_QUERY
-                    % {
-                        "key_path": key.split(".")[0],
-                        "key": key,
-                        "value": value,
+            es_query["aggs"] = facets
+            started = monotonic()
+            result = await self.elastic.get_list_with_aggregations(
+                index=self.index, model_class=model, query=es_query
+            )
+            if result is None:
+                return None
+            instances, aggregations = result
+            loaded["instances"] = instances
+            if instances:
+                entry = CacheEntry(
+                    instances=instances,
+                    expires=time() + settings.CACHE_EXPIRE_IN_SECONDS,
+                    delta=monotonic() - started,
+                )
+                await self.cache.put_entry_to_cache(
+                    key=list_key, entry=entry, tags=tags
+                )
+            return [
+                facets_model(
+                    **{
+                        name: facet_counts(aggregations[name])
+                        for name in facets
                     }
-                )  # noqa: F811
-                for key, value in nested_matches.items()
+                )
+            ]
+
+        facets_key = self._cache_key(
+            model=facets_model, facets=facets, **params
+        )
+        counts = await self._get_cached(facets_key, tags, load, facets_model)
+        if "instances" in loaded:
+            return loaded["instances"], counts[-1] if counts else None
+        instances = await self.get_list(
+            page_number=page_number, page_size=page_size, model=model, **params
+        )
+        return instances, counts[-1] if counts else None
+
+    async def get_page_after(
+        self,
+        cursor: str,
+        page_size: int = settings.STANDART_PAGE_SIZE,
+        sort: str = None,
+        matches: dict = None,
+        nested_matches: dict = None,
+        bool_operator: str = "should",
+        model: BaseModel | None = None,
+    ) -> tuple[list[BaseModel], str | None]:
+        """
+        Метод получения страницы списка после курсора (FIRST_CURSOR - первая
+        страница). Возвращает страницу и курсор следующей (None - страниц
+        больше нет). Страницы читаются из одного снимка индекса по
+        search_after, поэтому их стоимость не зависит от номера. Выдача по
+        курсору не кэшируется.
+        """
+        model = model or self.model
+        query_key = cache_key(
+            "cursor",
+            index=self.index,
+            model=model.__name__,
+            page_size=page_size,
+            sort=sort,
+            matches=matches,
+            nested_matches=nested_matches,
+            bool_operator=bool_operator,
+        )
+        if cursor == FIRST_CURSOR:
+            pit_id = await self.elastic.open_point_in_time(
+                IndexName(self.index).value
             )
-        if not bool_base and not bool_nested:
-            bool = MATCH_ALL
+            search_after = None
         else:
-            bool = ",".join((bool_base, bool_nested)).strip(",")
-            bool = BOOL % {"bool_operator": bool_operator, "bool": bool}
-        es_query = QUERY_BASE % {
-            "from_": from_,
-            "page_size": page_size,
-            "sort": sort,
-            "bool": bool,
-        }
-        return es_query
-
-    @staticmethod
-    def _get_sort(sort: str):
-        """Метод получения параметра sort для запроса в Elasticsearch."""
-        direction = SortOrder.ascending
-        if sort.startswith("-"):
-            sort = sort[1:]
-            direction = SortOrder.descending
-        sorts = {sort: direction}
-        for key, value in sorts.items():
-            sort = SORT % {"key": key, "value": value.value}
-        return sort
+            position = Cursor.decode(cursor)
+            if position.query != query_key:
+                raise InvalidCursorError(cursor)
+            pit_id, search_after = position.pit_id, position.search_after
+        # Смещение заменяет search_after; _shard_doc делает порядок
+        # документов снимка однозначным.
+        es_query = search_query(
+            size=page_size,
+            sort=sort,
+            matches=matches,
+            nested_matches=nested_matches,
+            bool_operator=bool_operator,
+            model=model,
+        )
+        es_query["sort"] = [
+            *(es_query["sort"] or [{"_score": {"order": "desc"}}]),
+            {"_shard_doc": {"order": "asc"}},
+        ]
+        instances, pit_id, search_after = await self.elastic.get_page_after(
+            model_class=model,
+            query=es_query,
+            pit_id=pit_id,
+            search_after=search_after,
+        )
+        if len(instances) < page_size:
+            await self.elastic.close_point_in_time(pit_id)
+            return instances, None
+        return instances, Cursor(pit_id, search_after, query_key).encode()
+
+    async def get_suggestions(
+        self,
+        field: str,
+        prefix: str,
+        size: int = settings.SUGGEST_SIZE,
+        model: BaseModel | None = None,
+    ) -> list[BaseModel] | None:
+        """
+        Метод получения подсказок: до size объектов, у которых значение
+        поля field (поле completion) начинается с prefix. Регистр и
+        лишние пробелы в prefix не учитываются, поэтому такие префиксы
+        получают общее значение кэша.
+        """
+        model = model or self.model
+        prefix = " ".join(prefix.lower().split())
+
+        async def load() -> list[BaseModel] | None:
+            return await self.elastic.get_suggestions(
+                index=self.index,
+                model_class=model,
+                query=suggest_query(field, prefix, size, model),
+            )
+
+        key = self._cache_key(
+            model=model, suggest=field, prefix=prefix, size=size
+        )
+        return await self._get_cached(key, index_tags(self.tag), load, model)
+
+    def _cache_key(self, model: BaseModel | None = None, **params) -> str:
+        """Ключ кэша запроса к индексу с заданными параметрами."""
+        return cache_key(
+            "objects",
+            index=self.index,
+            model=(model or self.model).__name__,
+            **params,
+        )
+
+    async def _get_cached(
+        self,
+        key: str,
+        tags: list[str],
+        load: Loader,
+        model: BaseModel | None = None,
+    ) -> list[BaseModel] | None:
+        """
+        Объекты из кэша или из хранилища. Одновременные промахи одного
+        ключа объединяются в одну загрузку. Устаревшее значение отдается
+        сразу и обновляется в фоне; свежее с некоторой вероятностью
+        обновляется в фоне заранее. Теги значения учитываются в ответе на
+        запрос. Значение кэша - объекты модели model (по умолчанию модели
+        сервиса).
+        """
+        model = model or self.model
+        add_request_tags(tags)
+        entry = await self.cache.get_entry_from_cache(key=key, model=model)
+        if entry is None:
+            return await single_flight.run(
+                key, lambda: self._load(key, tags, load, "miss", model)
+            )
+        if entry.is_stale():
+            single_flight.start(
+                key, lambda: self._load(key, tags, load, "stale", model)
+            )
+        elif entry.should_refresh():
+            single_flight.start(
+                key, lambda: self._load(key, tags, load, "early", model)
+            )
+        return entry.instances
+
+    async def _load(
+        self,
+        key: str,
+        tags: list[str],
+        load: Loader,
+        reason: str,
+        model: BaseModel,
+    ) -> list[BaseModel] | None:
+        """
+        Загрузка объектов из хранилища в кэш. С блокировкой в Redis значение
+        загружает один процесс, остальные ждут, пока оно появится в кэше.
+        """
+        if not settings.CACHE_LOCK_ENABLED:
+            return await self._load_to_cache(key, tags, load, reason)
+        lock = self.cache.lock(key)
+        if not await lock.acquire(blocking=False):
+            if entry := await self._wait_for_entry(key, model):
+                return entry.instances
+            return await self._load_to_cache(key, tags, load, reason)
+        try:
+            return await self._load_to_cache(key, tags, load, reason)
+        finally:
+            with suppress(LockError):
+                await lock.release()
+
+    async def _load_to_cache(
+        self, key: str, tags: list[str], load: Loader, reason: str
+    ) -> list[BaseModel] | None:
+        metrics.inc("cache_loads_total", {"reason": reason})
+        started = monotonic()
+        instances = await load()
+        if instances:
+            entry = CacheEntry(
+                instances=instances,
+                expires=time() + settings.CACHE_EXPIRE_IN_SECONDS,
+                delta=monotonic() - started,
+            )
+            await self.cache.put_entry_to_cache(
+                key=key, entry=entry, tags=tags
+            )
+        return instances
+
+    async def _wait_for_entry(
+        self, key: str, model: BaseModel
+    ) -> CacheEntry | None:
+        """Ожидание свежего значения, которое загружает другой процесс."""
+        deadline = monotonic() + settings.CACHE_LOCK_WAIT_IN_SECONDS
+        while monotonic() < deadline:
+            await asyncio.sleep(settings.CACHE_LOCK_POLL_IN_SECONDS)
+            entry = await self.cache.get_entry_from_cache(key=key, model=model)
+            if entry is not None and not entry.is_stale():
+                return entry
+        return None
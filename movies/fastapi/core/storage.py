@@ -7,7 +7,10 @@ from elasticsearch import AsyncElasticsearch, NotFoundError
 from fastapi import Depends
 from pydantic import BaseModel
 
-from core.exceptions import ElasticsearchError
+from core.budget import within_budget
+from core.config import settings
+from core.es_queries import SUGGESTION
+from core.exceptions import ElasticsearchError, InvalidCursorError
 from core.logger import logger
 from db.elastic import get_elastic_instance
 
@@ -23,16 +26,70 @@ class AbstractStorage(ABC):
         по id документа в хранилище
         """
 
+    @abstractmethod
+    async def get_many_by_ids(
+        self, index: str, model_class: BaseModel, uuids: list[UUID]
+    ) -> dict[UUID, BaseModel]:
+        """Абстрактный метод получения инстансов указанной модели
+        по нескольким id документов в хранилище за один запрос
+        """
+
     @abstractmethod
     async def get_list_by_search(
-        self, index: str, model_class: BaseModel, query: str
+        self, index: str, model_class: BaseModel, query: dict
     ) -> list[BaseModel] | None:
         """Абстрактный метод получения списка инстансов указанной модели
         по заданным параметрам поиска
         """
 
+    @abstractmethod
+    async def open_point_in_time(self, index: str) -> str:
+        """Абстрактный метод открытия снимка индекса для выдачи по курсору"""
+
+    @abstractmethod
+    async def close_point_in_time(self, pit_id: str) -> None:
+        """Абстрактный метод закрытия снимка индекса"""
+
+    @abstractmethod
+    async def get_page_after(
+        self,
+        model_class: BaseModel,
+        query: dict,
+        pit_id: str,
+        search_after: list[Any] | None,
+    ) -> tuple[list[BaseModel], str, list[Any] | None]:
+        """Абстрактный метод получения страницы снимка индекса после
+        документа со значениями сортировки search_after. Возвращает
+        инстансы, id снимка и значения сортировки последнего документа
+        """
+
+    @abstractmethod
+    async def get_list_with_aggregations(
+        self, index: str, model_class: BaseModel, query: dict
+    ) -> tuple[list[BaseModel], dict] | None:
+        """Абстрактный метод получения списка инстансов указанной модели
+        и результатов агрегаций запроса за одно обращение
+        """
+
+    @abstractmethod
+    async def get_aggregations(self, index: str, query: dict) -> dict | None:
+        """Абстрактный метод получения результатов агрегаций запроса"""
+
+    @abstractmethod
+    async def get_suggestions(
+        self, index: str, model_class: BaseModel, query: dict
+    ) -> list[BaseModel] | None:
+        """Абстрактный метод получения инстансов указанной модели из
+        подсказок по началу значения поля
+        """
+
 
 class ElasticService(AbstractStorage):
+    """
+    Хранилище на основе Elasticsearch. Индексы адресуются псевдонимами
+    (IndexName), поэтому чтение не прерывается при пересборке индексов.
+    """
+
     def __init__(self, elastic: AsyncElasticsearch) -> None:
         self.elastic = elastic
 
@@ -40,16 +97,39 @@ class ElasticService(AbstractStorage):
         self, index: str, model_class: Any, uuid: UUID
     ) -> BaseModel | None:
         try:
-            doc = await self.elastic.get(index=index, id=str(uuid))
+            doc = await within_budget(
+                self.elastic.get, index=index, id=str(uuid)
+            )
             return model_class(**doc["_source"])
         except NotFoundError:
             return None
 
+    async def get_many_by_ids(
+        self, index: str, model_class: Any, uuids: list[UUID]
+    ) -> dict[UUID, BaseModel]:
+        if not uuids:
+            return {}
+        try:
+            result = await within_budget(
+                self.elastic.mget,
+                index=index,
+                body={"ids": [str(uuid) for uuid in uuids]},
+            )
+        except NotFoundError:
+            return {}
+        return {
+            UUID(doc["_id"]): model_class(**doc["_source"])
+            for doc in result["docs"]
+            if doc.get("found")
+        }
+
     async def get_list_by_search(
-        self, index: str, model_class: Any, query: str
+        self, index: str, model_class: Any, query: dict
     ) -> list[BaseModel] | None:
         try:
-            search_result = await self.elastic.search(index=index, body=query)
+            search_result = await within_budget(
+                self.elastic.search, index=index, body=query
+            )
             list_instances = [
                 model_class(**doc["_source"])
                 for doc in search_result["hits"]["hits"]
@@ -59,6 +139,98 @@ class ElasticService(AbstractStorage):
             logger.error(f"Ошибка Elasticsearch: {e}")
             return None
 
+    async def open_point_in_time(self, index: str) -> str:
+        response = await within_budget(
+            self.elastic.transport.perform_request,
+            "POST",
+            f"/{index}/_pit",
+            params={"keep_alive": settings.CURSOR_KEEP_ALIVE},
+        )
+        return response["id"]
+
+    async def close_point_in_time(self, pit_id: str) -> None:
+        try:
+            await within_budget(
+                self.elastic.transport.perform_request,
+                "DELETE",
+                "/_pit",
+                body={"id": pit_id},
+            )
+        except NotFoundError:
+            pass
+
+    async def get_page_after(
+        self,
+        model_class: Any,
+        query: dict,
+        pit_id: str,
+        search_after: list[Any] | None,
+    ) -> tuple[list[BaseModel], str, list[Any] | None]:
+        # Индекс задан снимком; итоговое число документов не считается.
+        query = {
+            **query,
+            "pit": {"id": pit_id, "keep_alive": settings.CURSOR_KEEP_ALIVE},
+            "track_total_hits": False,
+        }
+        if search_after is not None:
+            query["search_after"] = search_after
+        try:
+            search_result = await within_budget(
+                self.elastic.search, body=query
+            )
+        except NotFoundError as e:
+            raise InvalidCursorError(pit_id) from e
+        hits = search_result["hits"]["hits"]
+        return (
+            [model_class(**doc["_source"]) for doc in hits],
+            search_result.get("pit_id", pit_id),
+            hits[-1]["sort"] if hits else search_after,
+        )
+
+    async def get_list_with_aggregations(
+        self, index: str, model_class: Any, query: dict
+    ) -> tuple[list[BaseModel], dict] | None:
+        try:
+            search_result = await within_budget(
+                self.elastic.search, index=index, body=query
+            )
+        except ElasticsearchError as e:
+            logger.error(f"Ошибка Elasticsearch: {e}")
+            return None
+        return (
+            [
+                model_class(**doc["_source"])
+                for doc in search_result["hits"]["hits"]
+            ],
+            search_result["aggregations"],
+        )
+
+    async def get_aggregations(self, index: str, query: dict) -> dict | None:
+        try:
+            search_result = await within_budget(
+                self.elastic.search, index=index, body=query
+            )
+        except ElasticsearchError as e:
+            logger.error(f"Ошибка Elasticsearch: {e}")
+            return None
+        return search_result["aggregations"]
+
+    async def get_suggestions(
+        self, index: str, model_class: Any, query: dict
+    ) -> list[BaseModel] | None:
+        try:
+            search_result = await within_budget(
+                self.elastic.search, index=index, body=query
+            )
+        except ElasticsearchError as e:
+            logger.error(f"Ошибка Elasticsearch: {e}")
+            return None
+        return [
+            model_class(**option["_source"])
+            for suggestion in search_result["suggest"][SUGGESTION]
+            for option in suggestion["options"]
+        ]
+
 
 @lru_cache()
 def get_storage_service(
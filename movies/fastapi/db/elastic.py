@@ -1,7 +1,73 @@
-from elasticsearch import AsyncElasticsearch
+import asyncio
+from time import monotonic
+
+from elasticsearch import AIOHttpConnection, AsyncElasticsearch
+
+from core.metrics import metrics
+from db.pool import PoolStats
 
 es: AsyncElasticsearch | None = None
 
+elastic_pool = PoolStats("elastic")
+
+metrics.describe(
+    "elastic_requests_total", "counter", "Запросы к узлам Elasticsearch."
+)
+metrics.describe(
+    "elastic_request_seconds_total",
+    "counter",
+    "Время ответа узлов Elasticsearch без ожидания соединения.",
+)
+
+
+class MeteredConnection(AIOHttpConnection):
+    """
+    Подключение к узлу Elasticsearch с учетом насыщения пула: не больше
+    maxsize одновременных запросов, остальные ждут свободного соединения.
+    Бюджет времени запроса к API здесь не учитывается: тайм-аут по нему
+    транспорт счел бы отказом узла (см. within_budget).
+    """
+
+    def __init__(self, *args, maxsize: int = 10, **kwargs) -> None:
+        super().__init__(*args, maxsize=maxsize, **kwargs)
+        self.max_connections = maxsize
+        self.in_use = 0
+        self._slots = asyncio.Semaphore(maxsize)
+        elastic_pool.members.add(self)
+
+    async def perform_request(
+        self,
+        method,
+        url,
+        params=None,
+        body=None,
+        timeout=None,
+        ignore=(),
+        headers=None,
+    ):
+        timeout = self.timeout if timeout is None else timeout
+        async with elastic_pool.wait():
+            await self._slots.acquire()
+        self.in_use += 1
+        started = monotonic()
+        try:
+            return await super().perform_request(
+                method,
+                url,
+                params=params,
+                body=body,
+                timeout=timeout,
+                ignore=ignore,
+                headers=headers,
+            )
+        finally:
+            self.in_use -= 1
+            self._slots.release()
+            metrics.inc("elastic_requests_total")
+            metrics.inc(
+                "elastic_request_seconds_total", value=monotonic() - started
+            )
+
 
 async def get_elastic_instance() -> AsyncElasticsearch:
     return es
@@ -0,0 +1,77 @@
+"""Учет насыщения пулов соединений с Redis и Elasticsearch."""
+import weakref
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import AsyncIterator, Iterator
+
+from core.metrics import Sample, metrics
+
+metrics.describe(
+    "pool_connections_max",
+    "gauge",
+    "Наибольшее число соединений в пулах клиента (client).",
+)
+metrics.describe(
+    "pool_connections_in_use",
+    "gauge",
+    "Соединения клиента (client), занятые запросами.",
+)
+metrics.describe(
+    "pool_waiting_requests",
+    "gauge",
+    "Запросы, ожидающие свободного соединения клиента (client).",
+)
+metrics.describe(
+    "pool_waits_total",
+    "counter",
+    "Получения соединения из пула клиента (client).",
+)
+metrics.describe(
+    "pool_wait_seconds_total",
+    "counter",
+    "Время ожидания свободного соединения клиента (client).",
+)
+
+
+class PoolStats:
+    """
+    Насыщение пулов соединений клиента: занятые соединения, запросы в
+    очереди за свободным соединением и время ожидания в ней. Рост времени
+    ожидания при неизменном времени ответа хранилища означает, что
+    запросам не хватает соединений, а не что хранилище отвечает медленно.
+    Пулы (members) сообщают max_connections и in_use.
+    """
+
+    def __init__(self, client: str) -> None:
+        self.labels = {"client": client}
+        self.members = weakref.WeakSet()
+        self.waiting = 0
+        metrics.add_collector(self.samples)
+
+    @asynccontextmanager
+    async def wait(self) -> AsyncIterator[None]:
+        """Ожидание свободного соединения."""
+        self.waiting += 1
+        started = monotonic()
+        try:
+            yield
+        finally:
+            self.waiting -= 1
+            metrics.inc("pool_waits_total", self.labels)
+            metrics.inc(
+                "pool_wait_seconds_total", self.labels, monotonic() - started
+            )
+
+    def samples(self) -> Iterator[Sample]:
+        members = list(self.members)
+        yield (
+            "pool_connections_max",
+            self.labels,
+            sum(member.max_connections for member in members),
+        )
+        yield (
+            "pool_connections_in_use",
+            self.labels,
+            sum(member.in_use for member in members),
+        )
+        yield "pool_waiting_requests", self.labels, self.waiting
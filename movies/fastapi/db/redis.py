@@ -1,7 +1,30 @@
-from redis.asyncio import Redis
+from redis.asyncio import BlockingConnectionPool, Redis
+
+from db.pool import PoolStats
 
 redis: Redis | None = None
 
+redis_pool = PoolStats("redis")
+
+
+class MeteredConnectionPool(BlockingConnectionPool):
+    """
+    Пул соединений Redis с учетом насыщения: при занятых max_connections
+    соединениях запрос ждет свободного не дольше timeout.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        redis_pool.members.add(self)
+
+    @property
+    def in_use(self) -> int:
+        return len(self._in_use_connections)
+
+    async def get_connection(self, *args, **kwargs):
+        async with redis_pool.wait():
+            return await super().get_connection(*args, **kwargs)
+
 
 async def get_redis_instance() -> Redis:
     return redis
@@ -1,28 +1,106 @@
+import asyncio
 from contextlib import asynccontextmanager
+from http import HTTPStatus
 
 from elasticsearch import AsyncElasticsearch
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.responses import ORJSONResponse
 from redis.asyncio import Redis
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError, TimeoutError
 
-from api.v1 import films, genres, persons
+from api import metrics
+from api.v1 import films, genres, persons, suggest
+from core.budget import LatencyBudgetMiddleware
+from core.cache import listen_changes, listen_invalidations, local_cache
+from core.catalogue import catalogue
 from core.config import settings
+from core.enum import ErrorMessage
+from core.exceptions import LatencyBudgetExceededError
 from core.logger import logger
+from core.storage import ElasticService
 from db import elastic, redis
+from db.elastic import MeteredConnection
+from db.redis import MeteredConnectionPool
+from util.JWT_helper import get_jwt_helper, listen_revocations
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Определение логики работы (запуска и остановки) приложения."""
     # Логика при запуске приложения.
-    redis.redis = Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+    health_check_interval = settings.REDIS_HEALTH_CHECK_INTERVAL_IN_SECONDS
+    redis.redis = Redis(
+        connection_pool=MeteredConnectionPool(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT_IN_SECONDS,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT_IN_SECONDS,
+            socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT_IN_SECONDS,
+            socket_keepalive=True,
+            health_check_interval=health_check_interval,
+            retry=Retry(ExponentialBackoff(), settings.REDIS_RETRIES),
+            retry_on_error=[ConnectionError, TimeoutError],
+        )
+    )
+    # Подписки ждут сообщений дольше тайм-аута чтения, поэтому у них свой
+    # клиент без него.
+    listener_redis = Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT_IN_SECONDS,
+        socket_keepalive=True,
+        health_check_interval=health_check_interval,
+    )
+    auth_redis = Redis(
+        host=settings.AUTH_REDIS_HOST,
+        port=settings.AUTH_REDIS_PORT,
+        socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT_IN_SECONDS,
+        socket_keepalive=True,
+        health_check_interval=health_check_interval,
+    )
     elastic.es = AsyncElasticsearch(
-        hosts=[f"{settings.ELASTIC_HOST}:{settings.ELASTIC_PORT}"]
+        hosts=[f"{settings.ELASTIC_HOST}:{settings.ELASTIC_PORT}"],
+        connection_class=MeteredConnection,
+        maxsize=settings.ELASTIC_MAX_CONNECTIONS,
+        timeout=settings.ELASTIC_TIMEOUT_IN_SECONDS,
+        max_retries=settings.ELASTIC_MAX_RETRIES,
+        retry_on_timeout=True,
+        dead_timeout=settings.ELASTIC_DEAD_TIMEOUT_IN_SECONDS,
+        sniff_on_start=settings.ELASTIC_SNIFF,
+        sniff_on_connection_fail=settings.ELASTIC_SNIFF,
+        sniffer_timeout=(
+            settings.ELASTIC_SNIFF_INTERVAL_IN_SECONDS
+            if settings.ELASTIC_SNIFF
+            else None
+        ),
     )
+    invalidation_listener = asyncio.create_task(
+        listen_invalidations(listener_redis, local_cache)
+    )
+    changes_listener = asyncio.create_task(listen_changes(listener_redis))
+    revocation_listener = asyncio.create_task(
+        listen_revocations(auth_redis, get_jwt_helper().revoked)
+    )
+    catalogue_listener = None
+    if settings.CATALOGUE_ENABLED:
+        catalogue_listener = asyncio.create_task(
+            catalogue.listen(listener_redis, ElasticService(elastic.es))
+        )
     logger.info("Приложение запущено")
     yield
     # Логика при завершении приложения.
-    await redis.redis.close()
+    invalidation_listener.cancel()
+    changes_listener.cancel()
+    revocation_listener.cancel()
+    if catalogue_listener is not None:
+        catalogue_listener.cancel()
+        catalogue.close()
+    await listener_redis.close()
+    await auth_redis.close()
+    await redis.redis.close(close_connection_pool=True)
     await elastic.es.close()
     logger.info("Приложение остановлено")
 
@@ -36,9 +114,28 @@ app = FastAPI(
     openapi_url=settings.OPENAPI_URL,
     default_response_class=ORJSONResponse,
 )
+app.add_middleware(
+    LatencyBudgetMiddleware, budget=settings.REQUEST_BUDGET_IN_SECONDS
+)
+
+
+@app.exception_handler(LatencyBudgetExceededError)
+async def latency_budget_exceeded(
+    request: Request, exc: LatencyBudgetExceededError
+) -> ORJSONResponse:
+    """Ответ на запрос, не уложившийся в бюджет времени."""
+    return ORJSONResponse(
+        status_code=HTTPStatus.GATEWAY_TIMEOUT,
+        content={"detail": ErrorMessage.budget_exceeded},
+    )
+
 
 app.include_router(
     films.router, prefix="/api/v1/films", tags=["Кинопроизведения"]
 )
 app.include_router(persons.router, prefix="/api/v1/persons", tags=["Персоны"])
 app.include_router(genres.router, prefix="/api/v1/genres", tags=["Жанры"])
+app.include_router(
+    suggest.router, prefix="/api/v1/suggest", tags=["Подсказки"]
+)
+app.include_router(metrics.router, prefix="/metrics")
@@ -1,4 +1,4 @@
-from core.models import Base
+from core.models import Base, OrjsonDumps
 from models.genre import GenreShort
 from models.person import PersonShort
 
@@ -19,3 +19,39 @@ class Film(FilmShort):
     writers: list[PersonShort] | None = []
     directors: list[PersonShort] | None = []
     subscribers_only: bool | None = False
+
+
+class FilmFacetCounts(OrjsonDumps):
+    """Модель числа кинопроизведений по значениям фасетов для кэша."""
+
+    genre: dict[str, int] = {}
+    rating: dict[str, int] = {}
+    subscribers_only: dict[str, int] = {}
+
+
+class FacetBucket(OrjsonDumps):
+    """Модель значения фасета с числом кинопроизведений."""
+
+    key: str
+    count: int
+
+
+class GenreFacetBucket(GenreShort):
+    """Модель жанра в фасетах с числом кинопроизведений."""
+
+    count: int
+
+
+class FilmFacets(OrjsonDumps):
+    """Модель фасетов поиска кинопроизведений."""
+
+    genre: list[GenreFacetBucket] = []
+    rating: list[FacetBucket] = []
+    subscribers_only: list[FacetBucket] = []
+
+
+class FilmSearchPage(OrjsonDumps):
+    """Модель ответа API на поиск кинопроизведений с фасетами."""
+
+    films: list[FilmShort]
+    facets: FilmFacets
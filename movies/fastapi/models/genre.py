@@ -9,3 +9,9 @@ class GenreShort(Base):
 
 class Genre(GenreShort):
     description: str | None
+
+
+class GenreFilmsCount(GenreShort):
+    """Модель ответа API по жанру с числом кинопроизведений."""
+
+    films_count: int = 0
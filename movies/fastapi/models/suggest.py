@@ -0,0 +1,10 @@
+from core.models import OrjsonDumps
+from models.film import FilmShort
+from models.person import PersonShort
+
+
+class Suggestions(OrjsonDumps):
+    """Модель ответа API с подсказками для поисковой строки."""
+
+    films: list[FilmShort] = []
+    persons: list[PersonShort] = []
@@ -0,0 +1,13 @@
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+
+from core.config import settings
+
+
+class BatchRequest(BaseModel):
+    ids: list[UUID] = Field(
+        min_length=1,
+        max_length=settings.BATCH_MAX_SIZE,
+        description="uuid объектов (порядок ответа совпадает с порядком uuid)",
+    )
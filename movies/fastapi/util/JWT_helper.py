@@ -1,17 +1,94 @@
+import asyncio
 import base64
+import hashlib
 import http
 import json
+from collections import OrderedDict
 from datetime import datetime, timezone
 from functools import lru_cache
+from time import time
 from typing import Annotated
 
 from argon2.exceptions import VerifyMismatchError
 from core.config import settings
+from core.logger import logger
 from Cryptodome.Hash import HMAC, SHA256
 from fastapi import Depends, HTTPException, Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
 from schemas.token import AccessTokenPayload
 
+# Size of the revoked token set that triggers pruning of expired tokens
+REVOKED_TOKENS_PRUNE_SIZE = 1024
+
+
+def token_digest(token: str) -> bytes:
+    """Token digest, the same as the one published by the auth service."""
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+class TokenCache:
+    """Bounded LRU cache of verified token payloads.
+
+    Entries are keyed by the token digest, so tokens themselves are not kept
+    in memory, and expire at the token exp time."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: OrderedDict[
+            bytes, tuple[float, AccessTokenPayload]
+        ] = OrderedDict()
+
+    def get(self, key: bytes) -> AccessTokenPayload | None:
+        """Returns the cached payload of a verified unexpired token."""
+        if (item := self._items.get(key)) is None:
+            return None
+        if item[0] < time():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return item[1]
+
+    def put(self, key: bytes, payload: AccessTokenPayload) -> None:
+        """Caches the payload of a verified token, evicting the oldest."""
+        if self.max_size <= 0:
+            return
+        self._items[key] = (float(payload.exp), payload)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+
+class RevokedTokens:
+    """Digests of tokens revoked on logout with their exp times.
+
+    A token stays revoked only until it expires, so expired digests are
+    pruned whenever the set doubles in size."""
+
+    def __init__(self):
+        self._items: dict[bytes, float] = {}
+        self._prune_size = REVOKED_TOKENS_PRUNE_SIZE
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, key: bytes, expires: float) -> None:
+        """Adds a revoked token digest."""
+        self._items[key] = expires
+        if len(self._items) < self._prune_size:
+            return
+        now = time()
+        self._items = {
+            key: expires
+            for key, expires in self._items.items()
+            if expires >= now
+        }
+        self._prune_size = max(2 * len(self._items), REVOKED_TOKENS_PRUNE_SIZE)
+
 
 class JWTHelper:
     """JWTHelper provides methods to encode, decode and verify the token."""
@@ -19,6 +96,27 @@ class JWTHelper:
     def __init__(self):
         self.encoding = settings.JWT_CODE
         self.key = settings.JWT_SECRET.encode(self.encoding)
+        self.cache = TokenCache(max_size=settings.JWT_CACHE_MAX_SIZE)
+        self.revoked = RevokedTokens()
+
+    def check_token(self, token: str) -> AccessTokenPayload:
+        """Verifies the token and returns its payload.
+
+        Revoked tokens are rejected by a lookup in the local revocation set.
+        Payloads of verified tokens are cached, so repeated requests with
+        the same token skip the signature check and payload parsing."""
+        key = token_digest(token)
+        if key in self.revoked:
+            raise HTTPException(
+                status_code=http.HTTPStatus.UNAUTHORIZED,
+                detail="Access token has been revoked",
+            )
+        if (payload := self.cache.get(key)) is not None:
+            return payload
+        self.verify_token(token=token)
+        payload = self.decode_payload(token=token)
+        self.cache.put(key, payload)
+        return payload
 
     def decode_payload(
         self,
@@ -94,15 +192,39 @@ class JWTBearer(HTTPBearer):
                 status_code=http.HTTPStatus.UNAUTHORIZED,
                 detail="Only Bearer token might be accepted",
             )
-        access_token = credentials.credentials
-        jwthelper.verify_token(token=access_token)
-        token_payload = jwthelper.decode_payload(token=access_token)
-        return token_payload
+        return jwthelper.check_token(token=credentials.credentials)
 
 
 security_jwt = JWTBearer()
 
 
+async def listen_revocations(redis: Redis, revoked: RevokedTokens) -> None:
+    """Keeps the revoked token set current from the auth service Redis.
+
+    The channel is subscribed before the stored unexpired revocations are
+    loaded, so none are lost in between; both repeat after reconnecting.
+    While disconnected, tokens revoked meanwhile are still accepted."""
+    while True:
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(settings.REVOKED_TOKENS_CHANNEL)
+            stored = await redis.zrangebyscore(
+                settings.REVOKED_TOKENS_KEY, time(), "+inf", withscores=True
+            )
+            for digest, expires in stored:
+                revoked.add(bytes.fromhex(digest.decode()), expires)
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                digest, expires = message["data"].decode().split()
+                revoked.add(bytes.fromhex(digest), float(expires))
+        except (RedisError, ValueError) as e:
+            logger.error(f"Ошибка подписки на отзыв токенов: {e}")
+        finally:
+            await pubsub.aclose()
+        await asyncio.sleep(settings.TOKEN_REVOCATION_RETRY_IN_SECONDS)
+
+
 # class TokenChecker:
 #     def __init__(self, auto_error: bool):
 #         self.auto_error = auto_error
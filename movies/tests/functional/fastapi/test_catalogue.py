@@ -0,0 +1,163 @@
+"""
+Тесты снимка каталога в памяти (CATALOGUE_ENABLED=true): жанры, число
+фильмов по жанрам и фильмы персон обновляются по сообщениям ETL в канале
+cache:invalidate, а не при каждом изменении индексов.
+"""
+import asyncio
+from http import HTTPStatus
+
+from elasticsearch import AsyncElasticsearch
+
+from functional.settings import IndexName
+from functional.testdata.film_data import get_films_to_load
+from functional.testdata.genre_data import (
+    genre_test_data,
+    genre_test_modify,
+    genre_test_response_data,
+    genre_test_response_modified,
+)
+from functional.testdata.person_answer_data import person_uuid_film
+from functional.testdata.person_data import persons_to_load
+
+GENRES_ENDPOINT = "/api/v1/genres/"
+COUNTS_ENDPOINT = "/api/v1/genres/counts"
+PERSON_FILMS_ENDPOINT = "/api/v1/persons/%s/film"
+
+# Снимок обновляется в фоне: ответ опрашивается, пока не совпадет.
+ATTEMPTS = 50
+ATTEMPT_DELAY = 0.2
+
+
+async def wait_for(make_request, endpoint: str, check) -> dict:
+    """Ответ эндпоинта, как только он удовлетворяет check."""
+    for _ in range(ATTEMPTS):
+        response = await make_request(endpoint)
+        if check(response):
+            break
+        await asyncio.sleep(ATTEMPT_DELAY)
+    return response
+
+
+def with_body(body):
+    return lambda response: response["body"] == body
+
+
+def genre_counts(count: int) -> list[dict]:
+    return [
+        {**genre, "films_count": count} for genre in genre_test_response_data
+    ]
+
+
+async def test_genre_list_follows_changes(
+    es_load, make_catalogue_get_request, publish_change
+):
+    """Список жанров меняется по сообщению об изменении жанров."""
+    genres = IndexName.GENRES.value
+    await es_load(genres, genre_test_data)
+    await publish_change(genres, [genre["uuid"] for genre in genre_test_data])
+    response = await wait_for(
+        make_catalogue_get_request,
+        GENRES_ENDPOINT,
+        with_body(genre_test_response_data),
+    )
+    assert response["status"] == HTTPStatus.OK
+    assert response["body"] == genre_test_response_data
+
+    # Без сообщения ответ дается из снимка, а не из elasticsearch.
+    await es_load(genres, genre_test_modify)
+    response = await make_catalogue_get_request(GENRES_ENDPOINT)
+    assert response["body"] == genre_test_response_data
+
+    await publish_change(genres, [genre_test_modify[0]["uuid"]])
+    response = await wait_for(
+        make_catalogue_get_request,
+        GENRES_ENDPOINT,
+        with_body(genre_test_response_modified),
+    )
+    assert response["body"] == genre_test_response_modified
+
+
+async def test_genre_counts_follow_changes(
+    es_load, make_catalogue_get_request, publish_change
+):
+    """Число фильмов по жанрам меняется по сообщению об изменении фильмов."""
+    genres, movies = IndexName.GENRES.value, IndexName.MOVIES.value
+    films = get_films_to_load(7)
+    await es_load(genres, genre_test_data)
+    await es_load(movies, films)
+    await publish_change(genres, None)
+    await publish_change(movies, [film["uuid"] for film in films])
+    response = await wait_for(
+        make_catalogue_get_request, COUNTS_ENDPOINT, with_body(genre_counts(7))
+    )
+    assert response["status"] == HTTPStatus.OK
+    assert response["body"] == genre_counts(7)
+
+    new_films = get_films_to_load(3)
+    await es_load(movies, new_films)
+    response = await make_catalogue_get_request(COUNTS_ENDPOINT)
+    assert response["body"] == genre_counts(7)
+
+    await publish_change(movies, [film["uuid"] for film in new_films])
+    response = await wait_for(
+        make_catalogue_get_request,
+        COUNTS_ENDPOINT,
+        with_body(genre_counts(10)),
+    )
+    assert response["body"] == genre_counts(10)
+
+
+async def test_person_films_follow_changes(
+    es_load, make_catalogue_get_request, publish_change
+):
+    """Фильмы персоны меняются по сообщению об изменении персоны."""
+    persons = IndexName.PERSONS.value
+    person = persons_to_load[1]
+    endpoint = PERSON_FILMS_ENDPOINT % person["uuid"]
+    await es_load(persons, persons_to_load)
+    await publish_change(persons, [person["uuid"]])
+    response = await wait_for(
+        make_catalogue_get_request, endpoint, with_body(person_uuid_film)
+    )
+    assert response["status"] == HTTPStatus.OK
+    assert response["body"] == person_uuid_film
+
+    await es_load(persons, [{**person, "films": person["films"][:1]}])
+    response = await make_catalogue_get_request(endpoint)
+    assert response["body"] == person_uuid_film
+
+    await publish_change(persons, [person["uuid"]])
+    response = await wait_for(
+        make_catalogue_get_request, endpoint, with_body(person_uuid_film[:1])
+    )
+    assert response["body"] == person_uuid_film[:1]
+
+
+async def test_deleted_person_falls_back_to_elastic(
+    es_load,
+    es_client: AsyncElasticsearch,
+    make_catalogue_get_request,
+    publish_change,
+):
+    """
+    Удаленная персона убирается из снимка, а ее поиск в elasticsearch
+    дает 404.
+    """
+    persons = IndexName.PERSONS.value
+    person_uuid = persons_to_load[1]["uuid"]
+    endpoint = PERSON_FILMS_ENDPOINT % person_uuid
+    await es_load(persons, persons_to_load)
+    await publish_change(persons, [person_uuid])
+    response = await wait_for(
+        make_catalogue_get_request, endpoint, with_body(person_uuid_film)
+    )
+    assert response["status"] == HTTPStatus.OK
+
+    await es_client.delete(index=persons, id=person_uuid, refresh=True)
+    await publish_change(persons, [person_uuid])
+    response = await wait_for(
+        make_catalogue_get_request,
+        endpoint,
+        lambda response: response["status"] == HTTPStatus.NOT_FOUND,
+    )
+    assert response["status"] == HTTPStatus.NOT_FOUND
@@ -256,3 +256,43 @@ async def test_film_list_cache(
     response = await make_get_request(endpoint, params)
 
     assert len(response["body"]) == length_films + add_number
+
+
+async def test_film_list_cursor(
+    es_load,
+    make_get_request,
+):
+    """Проверяем выдачу по курсору: страницы из одного снимка индекса."""
+
+    number = 75
+    film_data_in = get_films_to_load(number)
+    endpoint = "/api/v1/films"
+    params = {"page_size": 30, "cursor": "*"}
+
+    await es_load(INDEX_NAME, film_data_in)
+    response = await make_get_request(
+        endpoint, {"page_number": 1, "page_size": number}
+    )
+    expected = [film["uuid"] for film in response["body"]]
+
+    received = []
+    while True:
+        response = await make_get_request(endpoint, params)
+        assert response["status"] == HTTPStatus.OK
+        received.extend(film["uuid"] for film in response["body"])
+        if "X-Next-Cursor" not in response["headers"]:
+            break
+        # Документы, добавленные после начала выдачи, в нее не попадают.
+        await es_load(INDEX_NAME, get_films_to_load(1))
+        params["cursor"] = response["headers"]["X-Next-Cursor"]
+
+    assert len(received) == number
+    assert set(received) == set(expected)
+
+
+async def test_film_list_cursor_invalid(make_get_request):
+    """Проверяем ответ на поврежденный курсор."""
+
+    response = await make_get_request("/api/v1/films", {"cursor": "invalid"})
+
+    assert response["status"] == HTTPStatus.BAD_REQUEST
@@ -4,7 +4,8 @@ import pytest
 from redis.asyncio import Redis
 
 from functional.settings import IndexName
-from functional.testdata.film_data import get_films_to_load
+from functional.testdata.film_data import film_to_load, get_films_to_load
+from functional.testdata.genre_data import genre_test_data
 
 INDEX_NAME = IndexName.MOVIES.value
 
@@ -36,6 +37,10 @@ INDEX_NAME = IndexName.MOVIES.value
             {"query": "Sta", "page_size": 100},
             {"found": 0, "status": HTTPStatus.NOT_FOUND},
         ),
+        (
+            {"query": 'The "Star"', "page_size": 100},
+            {"found": 80, "status": HTTPStatus.OK},
+        ),
     ],
 )
 async def test_film_search_count(
@@ -196,3 +201,60 @@ async def test_film_search_cache(
     response = await make_get_request(endpoint, params)
 
     assert len(response["body"]) == length_films + add_number
+
+
+async def test_film_search_facets(es_load, make_get_request):
+    """Проверяем фасеты, посчитанные вместе с выдачей поиска."""
+    await es_load(IndexName.GENRES.value, genre_test_data)
+    await es_load(
+        INDEX_NAME,
+        [*get_films_to_load(5, title="The Star"), film_to_load["film2"]],
+    )
+    endpoint = "/api/v1/films/search"
+
+    response = await make_get_request(
+        endpoint, {"facets": "true", "page_size": 100}
+    )
+    assert response["status"] == HTTPStatus.OK
+    assert len(response["body"]["films"]) == 6
+    facets = response["body"]["facets"]
+    assert {
+        genre["uuid"]: (genre["name"], genre["count"])
+        for genre in facets["genre"]
+    } == {
+        "3d8d9bf5-0d90-4353-88ba-4ccc5d2c07ff": ("Action", 5),
+        "120a21cf-9097-479e-904a-13dd7198c1dd": ("Adventure", 5),
+        "b92ef010-5e4c-4fd0-99d6-41b6456272cd": ("Fantasy", 5),
+        "6c162475-c7ed-4461-9184-001ef3d9f26e": (None, 5),
+    }
+    assert {bucket["key"]: bucket["count"] for bucket in facets["rating"]} == {
+        "*-5.0": 0,
+        "5.0-6.0": 0,
+        "6.0-7.0": 0,
+        "7.0-8.0": 0,
+        "8.0-9.0": 5,
+        "9.0-*": 1,
+    }
+
+    # фасеты с фильтром по жанру считаются по отфильтрованной выдаче
+    response = await make_get_request(
+        endpoint,
+        {"facets": "true", "genre": "3d8d9bf5-0d90-4353-88ba-4ccc5d2c07ff"},
+    )
+    assert response["status"] == HTTPStatus.OK
+    assert len(response["body"]["films"]) == 5
+    rating = {
+        bucket["key"]: bucket["count"]
+        for bucket in response["body"]["facets"]["rating"]
+    }
+    assert rating["8.0-9.0"] == 5
+    assert rating["9.0-*"] == 0
+
+    # без фасетов выдача остается списком
+    response = await make_get_request(endpoint, {"query": "Star"})
+    assert len(response["body"]) == 5
+
+    response = await make_get_request(
+        endpoint, {"facets": "true", "cursor": "*"}
+    )
+    assert response["status"] == HTTPStatus.BAD_REQUEST
@@ -0,0 +1,74 @@
+from http import HTTPStatus
+
+import pytest
+
+from functional.settings import IndexName
+from functional.testdata.genre_data import (
+    genre_test_data,
+    genre_test_modify,
+    genre_test_response_data,
+)
+
+ENDPOINT = "/api/v1/genres/batch"
+
+
+@pytest.mark.parametrize(
+    "query_data, expected_response",
+    [
+        (
+            {
+                "ids": [
+                    "b92ef010-5e4c-4fd0-99d6-41b6456272cd",
+                    "00000000-0000-0000-0000-000000000000",
+                    "3d8d9bf5-0d90-4353-88ba-4ccc5d2c07ff",
+                ]
+            },
+            {
+                "status": HTTPStatus.OK,
+                "body": [
+                    genre_test_response_data[2],
+                    genre_test_response_data[0],
+                ],
+            },
+        ),
+        (
+            {"ids": ["00000000-0000-0000-0000-000000000000"]},
+            {"status": HTTPStatus.NOT_FOUND},
+        ),
+        (
+            {"ids": []},
+            {"status": HTTPStatus.UNPROCESSABLE_ENTITY},
+        ),
+        (
+            {"ids": ["incorrect uuid"]},
+            {"status": HTTPStatus.UNPROCESSABLE_ENTITY},
+        ),
+    ],
+)
+@pytest.mark.asyncio
+async def test_genre_batch(
+    es_load, make_post_request, query_data, expected_response
+):
+    """Тест выдачи нескольких жанров по UUID в порядке запроса"""
+    await es_load(IndexName.GENRES.value, genre_test_data)
+    response = await make_post_request(ENDPOINT, query_data)
+    assert response["status"] == expected_response["status"]
+    if "body" in expected_response:
+        assert response["body"] == expected_response["body"]
+
+
+@pytest.mark.asyncio
+async def test_genre_batch_cache(es_load, make_post_request, make_get_request):
+    """Тест общего кэша выдачи жанров по одному и нескольким UUID"""
+    genre_uuid = genre_test_modify[0]["uuid"]
+
+    # кэшируем жанр через /batch
+    await es_load(IndexName.GENRES.value, genre_test_data)
+    response = await make_post_request(ENDPOINT, {"ids": [genre_uuid]})
+    assert response["body"] == [genre_test_response_data[0]]
+
+    # после корректировки в elasticsearch жанр по UUID отдается из кэша
+    await es_load(IndexName.GENRES.value, genre_test_modify)
+    response = await make_get_request(f"/api/v1/genres/{genre_uuid}")
+    assert response["status"] == HTTPStatus.OK
+    assert response["body"] == genre_test_response_data[0]
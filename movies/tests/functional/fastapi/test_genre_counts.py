@@ -0,0 +1,38 @@
+from http import HTTPStatus
+
+import pytest
+
+from functional.settings import IndexName
+from functional.testdata.film_data import film_to_load, get_films_to_load
+from functional.testdata.genre_data import (
+    genre_test_data,
+    genre_test_response_data,
+)
+
+ENDPOINT = "/api/v1/genres/counts"
+
+
+@pytest.mark.asyncio
+async def test_genre_counts(es_load, make_get_request):
+    """Тест выдачи жанров с числом кинопроизведений каждого жанра"""
+    await es_load(IndexName.GENRES.value, genre_test_data)
+    await es_load(
+        IndexName.MOVIES.value,
+        [*get_films_to_load(7), film_to_load["film2"]],
+    )
+    response = await make_get_request(ENDPOINT)
+    assert response["status"] == HTTPStatus.OK
+    assert response["body"] == [
+        {**genre, "films_count": 7} for genre in genre_test_response_data
+    ]
+
+
+@pytest.mark.asyncio
+async def test_genre_counts_without_films(es_load, make_get_request):
+    """Тест выдачи жанров без кинопроизведений"""
+    await es_load(IndexName.GENRES.value, genre_test_data)
+    response = await make_get_request(ENDPOINT)
+    assert response["status"] == HTTPStatus.OK
+    assert response["body"] == [
+        {**genre, "films_count": 0} for genre in genre_test_response_data
+    ]
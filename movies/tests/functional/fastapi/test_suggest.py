@@ -0,0 +1,69 @@
+"""Тесты эндпоинта /api/v1/suggest"""
+from http import HTTPStatus
+
+import pytest
+
+from functional.settings import IndexName
+from functional.testdata.film_data import get_films_to_load
+from functional.testdata.person_data import persons_to_load
+
+ENDPOINT = "/api/v1/suggest"
+
+
+@pytest.mark.parametrize(
+    "params, expected_response",
+    [
+        (
+            {"query": "Sta"},
+            {"films": ["Star Wars"] * 5, "persons": []},
+        ),
+        (
+            {"query": "the s", "size": 10},
+            {"films": ["The Star"] * 3 + ["The Sun"] * 2, "persons": []},
+        ),
+        (
+            {"query": "DES"},
+            {"films": [], "persons": ["Desi Arnaz"]},
+        ),
+        (
+            {"query": "Wars"},
+            {"films": [], "persons": []},
+        ),
+    ],
+)
+async def test_suggest(es_load, make_get_request, params, expected_response):
+    """Проверяем подсказки по началу названия фильма и имени персоны."""
+    await es_load(
+        IndexName.MOVIES.value,
+        [
+            *get_films_to_load(10, title="Star Wars"),
+            *get_films_to_load(3, title="The Star"),
+            *get_films_to_load(2, title="The Sun"),
+        ],
+    )
+    await es_load(IndexName.PERSONS.value, persons_to_load)
+    response = await make_get_request(ENDPOINT, params)
+
+    assert response["status"] == HTTPStatus.OK
+    assert (
+        sorted(film["title"] for film in response["body"]["films"])
+        == (expected_response["films"])
+    )
+    assert [
+        person["full_name"] for person in response["body"]["persons"]
+    ] == expected_response["persons"]
+    assert all(
+        set(film) == {"uuid", "title", "imdb_rating"}
+        for film in response["body"]["films"]
+    )
+
+
+@pytest.mark.parametrize(
+    "params",
+    [{}, {"query": ""}, {"query": "Star", "size": 0}, {"query": "a" * 51}],
+)
+async def test_suggest_validation(make_get_request, params):
+    """Проверяем ответ на некорректные параметры подсказок."""
+    response = await make_get_request(ENDPOINT, params)
+
+    assert response["status"] == HTTPStatus.UNPROCESSABLE_ENTITY
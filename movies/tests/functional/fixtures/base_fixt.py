@@ -50,3 +50,48 @@ def make_get_request(
             }
 
     return inner
+
+
+@pytest.fixture
+def make_post_request(
+    a_client: ClientSession,
+) -> Callable[[str, Any], Coroutine[Any, Any, dict[str, Any]]]:
+    """Делаем POST запрос на определенный endpoint, передавая тело в JSON.
+    Получаем ответ.
+    """
+
+    async def inner(endpoint: str, json: Any = None) -> dict[str, Any]:
+        url = f"{test_settings.app_url}{endpoint}"
+        async with a_client.post(url=url, json=json) as resp:
+            return {
+                "body": await resp.json(),
+                "status": resp.status,
+                "headers": resp.headers,
+                "url": resp.url,
+            }
+
+    return inner
+
+
+@pytest.fixture
+def make_catalogue_get_request(
+    a_client: ClientSession,
+) -> Callable[[str, dict | None], Coroutine[Any, Any, dict[str, Any]]]:
+    """Делаем GET запрос к экземпляру API со снимком каталога в памяти.
+    Получаем ответ.
+    """
+
+    async def inner(
+        endpoint: str, params: dict | None = None
+    ) -> dict[str, Any]:
+        params = params or {}
+        url = f"{test_settings.catalogue_app_url}{endpoint}"
+        async with a_client.get(url=url, params=params) as resp:
+            return {
+                "body": await resp.json(),
+                "status": resp.status,
+                "headers": resp.headers,
+                "url": resp.url,
+            }
+
+    return inner
@@ -1,3 +1,4 @@
+import json
 from typing import AsyncGenerator
 
 import pytest
@@ -19,3 +20,16 @@ async def redis_clear_cache(redis_client: Redis) -> None:
     """Сбрасываем кэш"""
 
     await redis_client.flushall()
+
+
+@pytest.fixture
+def publish_change(redis_client: Redis):
+    """Публикуем сообщение ETL об изменении документов индекса."""
+
+    async def inner(index_name: str, ids: list[str] | None) -> None:
+        await redis_client.publish(
+            test_settings.CACHE_INVALIDATION_CHANNEL,
+            json.dumps({"index": index_name, "ids": ids}),
+        )
+
+    return inner
@@ -41,7 +41,8 @@ class IndexSettings(BaseSettings):
                         "russian_stop",
                         "russian_stemmer",
                     ],
-                }
+                },
+                "suggest": {"tokenizer": "standard", "filter": ["lowercase"]},
             },
         },
     }
@@ -70,7 +71,13 @@ class IndexSettings(BaseSettings):
                 "title": {
                     "type": "text",
                     "analyzer": "ru_en",
-                    "fields": {"raw": {"type": "keyword"}},
+                    "fields": {
+                        "raw": {"type": "keyword"},
+                        "suggest": {
+                            "type": "completion",
+                            "analyzer": "suggest",
+                        },
+                    },
                 },
                 "description": {"type": "text", "analyzer": "ru_en"},
                 "actors": {
@@ -106,7 +113,13 @@ class IndexSettings(BaseSettings):
                 "full_name": {
                     "type": "text",
                     "analyzer": "ru_en",
-                    "fields": {"raw": {"type": "keyword"}},
+                    "fields": {
+                        "raw": {"type": "keyword"},
+                        "suggest": {
+                            "type": "completion",
+                            "analyzer": "suggest",
+                        },
+                    },
                 },
                 "films": {
                     "type": "nested",
@@ -137,10 +150,23 @@ class TestSettings(BaseSettings):
     FASTAPI_HOST: str = Field(default="127.0.0.1")
     FASTAPI_PORT: int = Field(default=8000)
 
+    # Экземпляр API со снимком каталога в памяти (CATALOGUE_ENABLED=true)
+    FASTAPI_CATALOGUE_HOST: str = Field(default="127.0.0.1")
+    FASTAPI_CATALOGUE_PORT: int = Field(default=8001)
+
+    CACHE_INVALIDATION_CHANNEL: str = Field(default="cache:invalidate")
+
     @property
     def app_url(self) -> HttpUrl:
         return f"http://{self.FASTAPI_HOST}:{self.FASTAPI_PORT}"
 
+    @property
+    def catalogue_app_url(self) -> HttpUrl:
+        return (
+            f"http://{self.FASTAPI_CATALOGUE_HOST}:"
+            f"{self.FASTAPI_CATALOGUE_PORT}"
+        )
+
     @property
     def es_url(self) -> HttpUrl:
         return f"http://{self.ES_HOST}:{self.ES_PORT}"